@@ -1,34 +1,36 @@
+import time
+LAUNCHED_AT = time.perf_counter()  # referência do "time to window" (antes dos imports pesados)
+
 import customtkinter as ctk
 import tkinter.messagebox as msgbox
 from tkinter import filedialog 
 import os
 import sys
 import threading
-import time
 import logging
-import re
+import importlib.util
+import queue
+import functools
+from collections import deque
 import numpy as np
-import soundfile as sf
-import torch
-from scipy.io import wavfile
-from scipy import signal
-import shutil 
-
-# Tentativa de importar pydub para suporte a MP3
-try:
-    from pydub import AudioSegment
-    HAS_PYDUB = True
-except ImportError:
-    HAS_PYDUB = False
-
-# Tentativa de importar pygame para o Player de Áudio integrado 
-try:
-    import pygame
-    # CORREÇÃO: Forçar a frequência para 24000Hz (padrão do Kokoro) para eliminar o chiado
-    pygame.mixer.init(frequency=24000)
-    HAS_PYGAME = True
-except ImportError:
-    HAS_PYGAME = False
+
+from studio_engine import LANG_MAP, VOICE_MAP, SynthesisEngine, SynthesisParams, sanitize_filename
+from studio_cache import DEFAULT_CACHE_DIR, DEFAULT_G2P_CACHE
+from studio_text import DEFAULT_CHUNK_BUDGET
+from studio_encode import DEFAULT_MP3_BITRATE, EXPORT_PROFILES, HAS_LAMEENC, HAS_MP3_ENCODER
+from studio_bulk import OK as BULK_OK, BulkRunner, convert_one, default_workers, delete_one, plan_renames, rename_one
+from studio_timing import SUBTITLE_FORMATS, load_index, move_sidecars
+from studio_files import DirectoryIndex
+from studio_inference import resolve_inference_profile
+from studio_meta import format_duration, probe_audio
+from studio_jobs import CANCELLED, DONE, QUEUED, RUNNING, GenerationJob, JobScheduler
+from studio_voices import format_voice_spec, parse_voice_spec
+from studio_trace import span, trace, tracer
+
+# pygame (Player de Áudio integrado) só é importado depois de a janela aparecer: ver init_audio()
+HAS_PYGAME = importlib.util.find_spec("pygame") is not None
+pygame = None
+_audio_lock = threading.Lock()
 
 # Configure Logging
 logging.basicConfig(
@@ -38,49 +40,414 @@ logging.basicConfig(
 )
 logger = logging.getLogger("KokoroStudio")
 
+
+def init_audio():
+    """Imports pygame and opens the mixer on the first call; returns whether playback is available."""
+    global pygame, HAS_PYGAME
+    with _audio_lock:
+        if pygame is None and HAS_PYGAME:
+            try:
+                import pygame as pygame_module
+                # CORREÇÃO: Forçar a frequência para 24000Hz (padrão do Kokoro) para eliminar o chiado
+                pygame_module.mixer.init(frequency=24000)
+                pygame = pygame_module
+            except Exception as e:
+                logger.warning(f"Audio playback unavailable: {e}")
+                HAS_PYGAME = False
+        return pygame is not None
+
 # --- Configuration & Constants ---
 ctk.set_appearance_mode("Dark")  # Modes: "System" (standard), "Dark", "Light"
 ctk.set_default_color_theme("blue")  # Themes: "blue" (standard), "green", "dark-blue"
 
-# Mapping Languages to Kokoro Codes
-LANG_MAP = {
-    "🇺🇸 Inglês (Americano)": "a",
-    "🇬🇧 Inglês (Britânico)": "b",
-    "🇧🇷 Português (Brasil)": "p",
-    "🇪🇸 Espanhol": "e",
-    "🇫🇷 Francês": "f",
-    "🇮🇹 Italiano": "i",
-    "🇯🇵 Japonês": "j",
-    "🇨🇳 Chinês (Mandarim)": "z",
-    "🇮🇳 Hindi": "h"
-}
-
-# Mapping Voices (Based on Kokoro v0.19 specs)
-# Format: {LangCode: {VoiceName: VoiceID}}
-VOICE_MAP = {
-    "a": {
-        "👩 Bella (Narrativa)": "af_bella", "👩 Sarah (Calma)": "af_sarah", 
-        "👩 Nicole (Neutra)": "af_nicole", "👩 Sky (Jovem)": "af_sky",
-        "👨 Michael (Neutro)": "am_michael", "👨 Adam (Profundo)": "am_adam",
-        "👩 Heart (Suave)": "af_heart", "👨 George (Britânico/US Mix)": "bm_george"
-    },
-    "b": {
-        "👩 Emma (Elegante)": "bf_emma", "👩 Isabella (Clássica)": "bf_isabella",
-        "👨 George (Padrão)": "bm_george", "👨 Lewis (Narrador)": "bm_lewis"
-    },
-    "p": {
-        "👨 Alex (Padrão)": "pm_alex", "👩 Dora (Padrão)": "pf_dora",
-        "👨 Santa (Temático)": "pm_santa" 
-    },
-    "e": {"👩 Dora (ES)": "ef_dora", "👨 Alex (ES)": "em_alex", "👨 Santa (ES)": "em_santa"},
-    "f": {"👩 Siwis": "ff_siwis"},
-    "i": {"👨 Nicola": "im_nicola", "👩 Sara": "if_sara"},
-    "j": {"👩 Kokoro (Japonês)": "jf_tebukuro", "👨 Alpha": "jm_kumo"},
-    "z": {"👩 Ling": "zf_xiaobei", "👩 Fan": "zf_xiaoni", "👨 Yun": "zm_yunjian"},
-    "h": {"👩 Amara": "hf_alpha", "👩 Beta": "hf_beta"}
-}
+class UiEventBus:
+    """The only way for worker threads to reach the widgets.
+
+    Threads call post(callback, *args), which is just a thread-safe queue put;
+    the Tk thread drains the queue on a single after() timer and runs the
+    callbacks there. No Tk call ever happens off the Tk thread.
+    """
+
+    def __init__(self, root, poll_ms=40, budget_ms=15):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.budget_ms = budget_ms
+        self._queue = queue.SimpleQueue()
+        self.root.after(self.poll_ms, self._drain)
+
+    def post(self, callback, *args):
+        self._queue.put((callback, args))
+
+    def _drain(self):
+        # Limite de tempo por ciclo: uma rajada de mensagens não congela a interface
+        deadline = time.perf_counter() + self.budget_ms / 1000.0
+        while time.perf_counter() < deadline:
+            try:
+                callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.error(f"UI callback failed: {e}", exc_info=True)
+        self.root.after(self.poll_ms, self._drain)
+
+
+class FilePlayer:
+    """pygame.mixer.music with one after() timer driving the progress bar.
+
+    The timer only runs while a file is playing and is cancelled by pause/stop,
+    so repeated play/stop never stacks trackers and no thread is started.
+    on_progress(fraction) and on_state(state) are called on the Tk thread.
+
+    The position is kept by the player itself (offset of the last play/seek
+    plus the wall clock since then) instead of music.get_pos(), which drifts
+    and resets on every seek; seeking restarts playback at the exact second.
+    When the file has a timing index (studio_timing), jump_segment() moves to
+    the start of the previous/next sentence with one lookup.
+    """
+
+    STOPPED, PLAYING, PAUSED = "stopped", "playing", "paused"
+
+    def __init__(self, root, on_progress, on_state, tick_ms=200):
+        self.root = root
+        self.on_progress = on_progress
+        self.on_state = on_state
+        self.tick_ms = tick_ms
+        self.state = self.STOPPED
+        self.duration = 0.0
+        self.index = None  # TimingIndex do ficheiro a tocar, se existir
+        self._offset = 0.0  # posição (s) no último play/seek/pausa
+        self._clock = None  # perf_counter desde que toca a partir de _offset; None se parado/pausado
+        self._timer = None
+
+    def play(self, filepath):
+        if not init_audio():
+            raise RuntimeError("O mixer de áudio não pôde ser iniciado.")
+        pygame.mixer.music.load(filepath)
+        pygame.mixer.music.play()
+        self.duration = self._probe_duration(filepath)
+        self.index = load_index(filepath)
+        self._offset, self._clock = 0.0, time.perf_counter()
+        self._set_state(self.PLAYING)
+
+    def resume(self):
+        pygame.mixer.music.unpause()
+        self._clock = time.perf_counter()
+        self._set_state(self.PLAYING)
+
+    def pause(self):
+        pygame.mixer.music.pause()
+        self._offset, self._clock = self.position(), None
+        self._set_state(self.PAUSED)
+
+    def stop(self):
+        if pygame is not None:  # sem mixer aberto ainda não tocou nada
+            pygame.mixer.music.stop()
+        self._offset, self._clock = 0.0, None
+        self._set_state(self.STOPPED)
+        self.on_progress(0)
+
+    def position(self):
+        if self._clock is None:
+            return self._offset
+        return self._offset + time.perf_counter() - self._clock
+
+    def seek(self, seconds):
+        target = max(0.0, seconds)
+        if self.duration:
+            target = min(target, self.duration)
+        # play(start=) reposiciona pelo descodificador, também para trás (sem rewind + set_pos)
+        pygame.mixer.music.play(start=target)
+        if self.state == self.PAUSED:
+            pygame.mixer.music.pause()
+        self._offset = target
+        self._clock = time.perf_counter() if self.state == self.PLAYING else None
+        if self.duration > 0:
+            self.on_progress(min(1.0, target / self.duration))
+
+    def jump_segment(self, step):
+        """Seeks to the start of the segment `step` sentences away (-1 = previous, 1 = next)."""
+        if self.index is None or not self.index.segments:
+            return False
+        position = self.position()
+        current = self.index.segment_at(position)
+        # Como nos leitores de música: "anterior" a meio de uma frase volta ao início dela
+        if step < 0 and position - self.index.start_seconds(current) > 1.0:
+            step += 1
+        target = min(max(current + step, 0), len(self.index.segments) - 1)
+        self.seek(self.index.start_seconds(target))
+        return True
+
+    @staticmethod
+    def _probe_duration(filepath):
+        # Só lê os cabeçalhos (WAV/MP3), nunca descodifica o ficheiro inteiro
+        info = probe_audio(filepath)
+        return info.duration if info is not None else 0.0
+
+    def _set_state(self, state):
+        self.state = state
+        if self._timer is not None:
+            self.root.after_cancel(self._timer)
+            self._timer = None
+        if state == self.PLAYING:
+            self._timer = self.root.after(self.tick_ms, self._tick)
+        self.on_state(state)
+
+    def _tick(self):
+        self._timer = None
+        if self.state != self.PLAYING:
+            return
+        if not pygame.mixer.music.get_busy():
+            # Ficheiro chegou ao fim
+            self._set_state(self.STOPPED)
+            self.on_progress(1.0)
+            return
+        if self.duration > 0:
+            self.on_progress(min(1.0, self.position() / self.duration))
+        self._timer = self.root.after(self.tick_ms, self._tick)
+
+
+class StreamPlayer:
+    """Plays audio chunks as they are generated, queued on a pygame mixer Channel.
+
+    Worker threads only call push()/finish() (thread-safe queue); converting
+    chunks to Sounds and feeding the channel happens on the Tk thread via after().
+    """
+
+    def __init__(self, root, poll_ms=30):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.channel = None
+        self.first_audio_at = None  # segundos desde start() até o primeiro som tocar
+        self._incoming = queue.Queue()
+        self._pending = deque()
+        self._active = False
+        self._finished = False
+
+    def start(self):
+        self.stop()
+        self.channel = pygame.mixer.find_channel(True)
+        self.first_audio_at = None
+        self._started = time.perf_counter()
+        self._active = True
+        self._finished = False
+        self.root.after(self.poll_ms, self._pump)
+
+    def push(self, chunk):
+        self._incoming.put(chunk)
+
+    def finish(self):
+        self._incoming.put(None)
+
+    def stop(self):
+        self._active = False
+        if self.channel is not None:
+            self.channel.stop()
+        self._pending.clear()
+        while not self._incoming.empty():
+            self._incoming.get_nowait()
+
+    def _to_sound(self, chunk):
+        # O mixer foi iniciado a 24kHz/16 bits; duplica o canal mono se o mixer for estéreo
+        channels = pygame.mixer.get_init()[2]
+        pcm = (np.clip(chunk, -1.0, 1.0) * 32767).astype(np.int16)
+        if channels > 1:
+            pcm = np.repeat(pcm[:, None], channels, axis=1)
+        return pygame.sndarray.make_sound(pcm)
+
+    def _pump(self):
+        if not self._active:
+            return
+        while True:
+            try:
+                chunk = self._incoming.get_nowait()
+            except queue.Empty:
+                break
+            if chunk is None:
+                self._finished = True
+            else:
+                self._pending.append(self._to_sound(chunk))
+
+        if self._pending:
+            if not self.channel.get_busy():
+                self.channel.play(self._pending.popleft())
+                if self.first_audio_at is None:
+                    self.first_audio_at = time.perf_counter() - self._started
+                    logger.info(f"Streaming playback started after {self.first_audio_at:.3f}s")
+            elif self.channel.get_queue() is None:
+                self.channel.queue(self._pending.popleft())
+        elif self._finished and not self.channel.get_busy():
+            self._active = False
+            return
+        self.root.after(self.poll_ms, self._pump)
+
+class VirtualFileList(ctk.CTkFrame):
+    """File list that only materializes the rows that fit on screen.
+
+    A fixed pool of row widgets (name button + duration label) is rebound to
+    the current slice of `items` when scrolling, so a folder with 10k files
+    costs the same as one with 20.
+
+    Click selects one file, Ctrl+click toggles a file and Shift+click selects
+    the range from the last clicked file; on_select receives the selected
+    names in list order.
+    """
+
+    ROW_HEIGHT = 34
+    SELECTED_COLOR = "#3B8ED0"
+    SHIFT_MASK = 0x0001
+    # Command no macOS chega como Mod1 (0x0008)
+    CTRL_MASK = 0x0004 | (0x0008 if sys.platform == "darwin" else 0)
+
+    def __init__(self, master, on_select, describe=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.on_select = on_select
+        self.describe = describe or (lambda name: "")  # texto da coluna de duração
+        self.items = []
+        self.offset = 0
+        self.selected = None  # último ficheiro clicado (o que o player toca)
+        self.selection = set()
+        self._rows = []
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+        self.rows_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.rows_frame.grid(row=0, column=0, sticky="nsew")
+        self.rows_frame.grid_columnconfigure(0, weight=1)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.rows_frame.bind("<Configure>", self._on_resize)
+        self._bind_wheel(self.rows_frame)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_wheel)
+        widget.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        widget.bind("<Button-5>", lambda e: self.scroll_by(3))
+
+    def _make_row(self, index):
+        btn = ctk.CTkButton(self.rows_frame, text="", anchor="w", fg_color="transparent", border_width=1,
+                            border_color="#333", height=self.ROW_HEIGHT - 4)
+        # bind em vez de command: o command não recebe o estado das teclas modificadoras
+        btn.bind("<Button-1>", lambda event, i=index: self._click(i, event.state))
+        lbl = ctk.CTkLabel(self.rows_frame, text="", text_color="gray", font=ctk.CTkFont(size=11), width=50, anchor="e")
+        self._bind_wheel(btn)
+        self._bind_wheel(lbl)
+        return btn, lbl
+
+    def _on_resize(self, event):
+        wanted = max(1, event.height // self.ROW_HEIGHT)
+        while len(self._rows) < wanted:
+            self._rows.append(self._make_row(len(self._rows)))
+        while len(self._rows) > wanted:
+            btn, lbl = self._rows.pop()
+            btn.destroy()
+            lbl.destroy()
+        self._clamp()
+        self.render()
+
+    def set_items(self, items):
+        self.items = items
+        self._clamp()
+        self.render()
+
+    def _clamp(self):
+        self.offset = max(0, min(self.offset, len(self.items) - len(self._rows)))
+
+    def scroll_by(self, rows):
+        self.offset += rows
+        self._clamp()
+        self.render()
+
+    def scroll_to(self, name):
+        try:
+            index = self.items.index(name)
+        except ValueError:
+            return
+        if not self.offset <= index < self.offset + len(self._rows):
+            self.offset = index - len(self._rows) // 2
+            self._clamp()
+        self.render()
+
+    def _on_wheel(self, event):
+        # Windows: múltiplos de 120; macOS: valores pequenos
+        step = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_by(-step * 3 if step else 0)
+
+    def _on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.offset = int(float(args[0]) * len(self.items))
+        elif action == "scroll":
+            amount, unit = int(args[0]), args[1]
+            self.offset += amount * (len(self._rows) if unit == "pages" else 1)
+        self._clamp()
+        self.render()
+
+    def _click(self, row, state=0):
+        index = self.offset + row
+        if index >= len(self.items):
+            return
+        name = self.items[index]
+        if state & self.SHIFT_MASK and self.selected in self.items:
+            anchor = self.items.index(self.selected)
+            low, high = sorted((anchor, index))
+            self.selection = set(self.items[low:high + 1])
+        elif state & self.CTRL_MASK:
+            self.selection ^= {name}
+        else:
+            self.selection = {name}
+        if not state & self.SHIFT_MASK:
+            self.selected = name
+        self.render()
+        self.on_select(self.selected_items())
+
+    def selected_items(self):
+        """Selected names that are currently listed (the filter may hide others), in list order."""
+        return [name for name in self.items if name in self.selection]
+
+    def select(self, name):
+        """Selects only `name`, without calling on_select."""
+        self.selected = name
+        self.selection = {name}
+        self.render()
+
+    def select_all(self):
+        self.selection = set(self.items)
+        if self.selected not in self.selection:
+            self.selected = self.items[0] if self.items else None
+        self.render()
+        self.on_select(self.selected_items())
+
+    def clear_selection(self):
+        self.selected = None
+        self.selection = set()
+        self.render()
+
+    def render(self):
+        for row, (btn, lbl) in enumerate(self._rows):
+            index = self.offset + row
+            if index < len(self.items):
+                name = self.items[index]
+                btn.configure(text=name, fg_color=self.SELECTED_COLOR if name in self.selection else "transparent")
+                lbl.configure(text=self.describe(name))
+                btn.grid(row=row, column=0, pady=2, sticky="ew")
+                lbl.grid(row=row, column=1, padx=(5, 0), sticky="e")
+            else:
+                btn.grid_remove()
+                lbl.grid_remove()
+        total = len(self.items)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + len(self._rows)) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
 
 class KokoroStudioApp(ctk.CTk):
+    # Rótulo no menu -> chave de DirectoryIndex.view
+    FILE_SORTS = {"Nome": "name", "Tamanho": "size", "Data": "date", "Duração": "duration"}
+    STATS_JOBS = 10  # gerações mostradas no painel de estatísticas
+
     def __init__(self):
         super().__init__()
 
@@ -90,15 +457,47 @@ class KokoroStudioApp(ctk.CTk):
         self.minsize(1000, 600)
 
         # Variables
-        self.pipeline = None
-        self.current_lang_code = None
-        self.is_generating = False
+        # KOKORO_WORKERS > 1 renderiza os segmentos em vários processos (textos longos)
+        # KOKORO_MODEL_BATCH > 1 junta linhas curtas numa só chamada ao modelo (roteiros de diálogo)
+        # O cache de segmentos evita re-sintetizar linhas que não mudaram entre gerações
+        # e o de fonemas (KOKORO_G2P_CACHE, vazio = desligado) evita repetir o G2P de textos já vistos
+        # KOKORO_VOICES_DIR: pasta local com os <voz>.pt (carregados por mmap, sem passar pelo hub)
+        # KOKORO_SUBTITLES=srt (ou vtt) grava legendas ao lado de cada ficheiro gerado
+        subtitles = os.environ.get("KOKORO_SUBTITLES", "").strip().lower()
+        self.engine = SynthesisEngine(device='cpu', workers=int(os.environ.get("KOKORO_WORKERS", "1")),
+                                      cache_dir=os.environ.get("KOKORO_CACHE_DIR", DEFAULT_CACHE_DIR),
+                                      g2p_cache=os.environ.get("KOKORO_G2P_CACHE", DEFAULT_G2P_CACHE),
+                                      chunk_budget=int(os.environ.get("KOKORO_CHUNK_BUDGET", DEFAULT_CHUNK_BUDGET)),
+                                      model_batch=int(os.environ.get("KOKORO_MODEL_BATCH", "1")),
+                                      voices_dir=os.environ.get("KOKORO_VOICES_DIR") or None,
+                                      inference_profile=self.load_inference_profile(),
+                                      subtitles=subtitles if subtitles in SUBTITLE_FORMATS else None)
+        # Misturas de vozes extra no menu (ex: KOKORO_VOICE_BLENDS=af_bella:0.7,af_sarah:0.3;pf_dora,pm_alex)
+        self.voice_blends = self.load_voice_blends(os.environ.get("KOKORO_VOICE_BLENDS", ""))
+        threading.Thread(target=self.warm_voices, daemon=True).start()
+        self.warm_up_done = threading.Event()
+        self.first_render_logged = False
+        # Fila de gerações: o utilizador pode enfileirar vários renders e continuar a editar
+        self.scheduler = JobScheduler(self.engine, on_update=self.post_job_update)
+        self.current_job = None
         self.work_dir = os.getcwd() # Pasta de trabalho padrão
         self.selected_file_path = None # Arquivo selecionado no painel direito
+        self.file_index = DirectoryIndex(self.work_dir)
+        self._probing_durations = False
+        self._file_view_pending = False
+        # Operação em lote (converter/apagar/renomear vários ficheiros) em curso
+        self.bulk_runner = None
+        self.bulk_failures = []
         
+        # Threads de trabalho só falam com os widgets através do event bus
+        self.ui_bus = UiEventBus(self)
+        # Cada geração termina com um trace (tempos por etapa) que alimenta o painel de estatísticas
+        tracer.add_listener(lambda finished: self.ui_bus.post(self.on_trace) if finished.name == "job" else None)
+
         # Variaveis do Player de Audio 
-        self.is_playing = False
-        self.is_paused = False
+        self.file_player = FilePlayer(self, on_progress=self.set_audio_progress,
+                                      on_state=lambda state: self.update_player_buttons()) if HAS_PYGAME else None
+        self.stream_player = StreamPlayer(self) if HAS_PYGAME else None
 
         # --- GUI Layout ---
         self.grid_columnconfigure(1, weight=1)
@@ -123,6 +522,9 @@ class KokoroStudioApp(ctk.CTk):
         # Initialize Default State
         self.update_voice_list("🇺🇸 Inglês (Americano)")
         self.refresh_file_list() # Carrega arquivos iniciais
+        self.after(2000, self.poll_work_dir)
+        # O aquecimento do modelo só arranca depois de a janela estar desenhada
+        self.after_idle(self.on_window_ready)
 
     def setup_sidebar(self):
         # Header (Ícone limpo)
@@ -176,9 +578,16 @@ class KokoroStudioApp(ctk.CTk):
         # Régua de Escala para Pitch 
         self.create_scale_ruler(self.sidebar_frame, row=15, values=["Grave", "Normal", "Agudo"])
         
+        # Streaming: ouvir os trechos enquanto o resto ainda está a ser gerado
+        self.stream_var = ctk.BooleanVar(value=HAS_PYGAME)
+        self.stream_switch = ctk.CTkSwitch(self.sidebar_frame, text="Ouvir durante a geração", variable=self.stream_var)
+        self.stream_switch.grid(row=16, column=0, padx=20, pady=(10, 0), sticky="w")
+        if not HAS_PYGAME:
+            self.stream_switch.configure(state="disabled")
+
         # Info Box
         self.info_box = ctk.CTkTextbox(self.sidebar_frame, height=100, text_color="gray")
-        self.info_box.grid(row=16, column=0, padx=20, pady=20, sticky="ew")
+        self.info_box.grid(row=17, column=0, padx=20, pady=20, sticky="ew")
         self.info_box.insert("0.0", "Info: 'Emoção' no Kokoro é definida pela escolha da Voz. Use os controles deslizantes para refinar o resultado.")
         self.info_box.configure(state="disabled")
 
@@ -227,8 +636,10 @@ class KokoroStudioApp(ctk.CTk):
         # Extension Label -> Agora Format Selection 
         # Substituindo label estático por OptionMenu
         self.format_var = ctk.StringVar(value=".mp3")
-        self.format_menu = ctk.CTkOptionMenu(self.control_bar, values=[".mp3", ".wav"], 
-                                             variable=self.format_var, width=80)
+        # Perfis de exportação com vários ficheiros (ex.: "wav+mp3") saem da mesma síntese
+        export_profiles = [name for name, targets in EXPORT_PROFILES.items() if len(targets) > 1]
+        self.format_menu = ctk.CTkOptionMenu(self.control_bar, values=[".mp3", ".wav"] + export_profiles,
+                                             variable=self.format_var, width=130)
         self.format_menu.grid(row=0, column=2, padx=(0, 20))
 
         # Generate Button (Ícone ajustado para visual limpo)
@@ -238,18 +649,39 @@ class KokoroStudioApp(ctk.CTk):
                                           command=self.start_generation_thread)
         self.generate_btn.grid(row=0, column=3, padx=0)
 
-        # Progress Bar
-        self.progress_bar = ctk.CTkProgressBar(self.main_frame)
-        self.progress_bar.grid(row=3, column=0, padx=20, pady=(0, 20), sticky="ew")
+        # Progress Bar + controlo da fila
+        self.progress_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+        self.progress_frame.grid(row=3, column=0, padx=20, pady=(0, 20), sticky="ew")
+        self.progress_frame.grid_columnconfigure(0, weight=1)
+
+        self.progress_bar = ctk.CTkProgressBar(self.progress_frame)
+        self.progress_bar.grid(row=0, column=0, padx=(0, 10), sticky="ew")
         self.progress_bar.set(0)
 
+        self.cancel_btn = ctk.CTkButton(self.progress_frame, text="■ Cancelar", width=90, fg_color="#b22222",
+                                        hover_color="#8b0000", command=self.action_cancel_job, state="disabled")
+        self.cancel_btn.grid(row=0, column=1, padx=(0, 5))
+
+        self.clear_queue_btn = ctk.CTkButton(self.progress_frame, text="Limpar fila", width=90, fg_color="gray",
+                                             command=self.action_clear_queue, state="disabled")
+        self.clear_queue_btn.grid(row=0, column=2)
+
         # Status Label
         self.status_label = ctk.CTkLabel(self.main_frame, text="Pronto.", text_color="gray")
         self.status_label.grid(row=4, column=0, padx=20, pady=(0, 10), sticky="w")
 
+        # Painel de estatísticas (recolhido por omissão): tempos por etapa das últimas gerações
+        self.stats_toggle = ctk.CTkButton(self.main_frame, text="▸ Estatísticas", width=110, height=24,
+                                          fg_color="transparent", border_width=1, command=self.toggle_stats_panel)
+        self.stats_toggle.grid(row=5, column=0, padx=20, pady=(0, 10), sticky="w")
+        self.stats_box = ctk.CTkTextbox(self.main_frame, height=150, wrap="none",
+                                        font=ctk.CTkFont(family="Courier", size=11))
+        self.stats_box.grid(row=6, column=0, padx=20, pady=(0, 20), sticky="ew")
+        self.stats_box.grid_remove()
+
     def setup_file_manager(self):
         """Configura o painel direito de gerenciamento de arquivos."""
-        self.file_manager_frame.grid_rowconfigure(3, weight=1) # Atualizado weight para a linha 3 (lista)
+        self.file_manager_frame.grid_rowconfigure(5, weight=1) # Linha 5: lista de ficheiros
         self.file_manager_frame.grid_columnconfigure(0, weight=1)
 
         # Título
@@ -266,13 +698,33 @@ class KokoroStudioApp(ctk.CTk):
         self.folder_path_entry.insert(0, self.work_dir)
         self.folder_path_entry.configure(state="readonly")
 
-        # Lista de Arquivos (Scrollable) - Movido para Row 3
-        self.file_list_frame = ctk.CTkScrollableFrame(self.file_manager_frame, label_text="Ficheiros de Áudio")
-        self.file_list_frame.grid(row=3, column=0, padx=10, pady=5, sticky="nsew")
-
-        # Botões de Ação - Movido para Row 4 (Ícones substituídos por Unicode limpo)
+        # Filtro e ordenação da lista
+        list_tools = ctk.CTkFrame(self.file_manager_frame, fg_color="transparent")
+        list_tools.grid(row=3, column=0, padx=10, pady=(0, 5), sticky="ew")
+        list_tools.grid_columnconfigure(0, weight=1)
+        self.file_filter_var = ctk.StringVar()
+        self.file_filter_var.trace_add("write", lambda *args: self.update_file_view())
+        ctk.CTkEntry(list_tools, textvariable=self.file_filter_var, placeholder_text="Filtrar...",
+                     height=26).grid(row=0, column=0, padx=(0, 5), sticky="ew")
+        self.file_sort_var = ctk.StringVar(value="Nome")
+        ctk.CTkOptionMenu(list_tools, values=list(self.FILE_SORTS), variable=self.file_sort_var, width=90, height=26,
+                          command=lambda choice: self.update_file_view()).grid(row=0, column=1, padx=(0, 5))
+        self.file_sort_desc = False
+        self.sort_dir_btn = ctk.CTkButton(list_tools, text="↑", width=26, height=26, command=self.toggle_sort_direction)
+        self.sort_dir_btn.grid(row=0, column=2, padx=(0, 5))
+        ctk.CTkButton(list_tools, text="Todos", width=50, height=26,
+                      command=lambda: self.file_list.select_all()).grid(row=0, column=3)
+
+        # Lista de Arquivos (virtualizada: só as linhas visíveis existem) - Row 4
+        self.file_list_label = ctk.CTkLabel(self.file_manager_frame, text="Ficheiros de Áudio", font=ctk.CTkFont(size=12))
+        self.file_list_label.grid(row=4, column=0, padx=10, sticky="w")
+        self.file_list = VirtualFileList(self.file_manager_frame, on_select=self.on_file_select,
+                                         describe=self.describe_file)
+        self.file_list.grid(row=5, column=0, padx=10, pady=5, sticky="nsew")
+
+        # Botões de Ação - Row 6 (Ícones substituídos por Unicode limpo)
         action_frame = ctk.CTkFrame(self.file_manager_frame, fg_color="transparent")
-        action_frame.grid(row=4, column=0, padx=10, pady=10, sticky="ew")
+        action_frame.grid(row=6, column=0, padx=10, pady=10, sticky="ew")
         action_frame.columnconfigure((0,1,2), weight=1)
 
         self.btn_rename = ctk.CTkButton(action_frame, text="✎", font=ctk.CTkFont(size=16), width=30, command=self.action_rename_file, state="disabled")
@@ -284,9 +736,24 @@ class KokoroStudioApp(ctk.CTk):
         self.btn_delete = ctk.CTkButton(action_frame, text="✖", font=ctk.CTkFont(size=14), width=30, fg_color="red", hover_color="darkred", command=self.action_delete_file, state="disabled")
         self.btn_delete.grid(row=0, column=2, padx=2, sticky="ew")
 
-        # --- NOVO PAINEL DE PLAYER DE ÁUDIO --- Movido para Row 5
+        self.bitrate_var = ctk.StringVar(value=DEFAULT_MP3_BITRATE)
+        ctk.CTkOptionMenu(action_frame, values=["96k", "128k", "192k", "256k", "320k"], variable=self.bitrate_var,
+                          width=70).grid(row=0, column=3, padx=2)
+
+        # Progresso das operações em lote - Row 7 (só visível durante uma operação)
+        self.bulk_frame = ctk.CTkFrame(self.file_manager_frame, fg_color="transparent")
+        self.bulk_frame.grid(row=7, column=0, padx=10, pady=(0, 10), sticky="ew")
+        self.bulk_frame.grid_columnconfigure(0, weight=1)
+        self.bulk_progress = ctk.CTkProgressBar(self.bulk_frame)
+        self.bulk_progress.grid(row=0, column=0, padx=(0, 10), sticky="ew")
+        self.bulk_progress.set(0)
+        ctk.CTkButton(self.bulk_frame, text="Cancelar", width=70, fg_color="gray", hover_color="#555",
+                      command=self.action_cancel_bulk).grid(row=0, column=1)
+        self.bulk_frame.grid_remove()
+
+        # --- NOVO PAINEL DE PLAYER DE ÁUDIO --- Row 8
         self.player_frame = ctk.CTkFrame(self.file_manager_frame, fg_color="transparent")
-        self.player_frame.grid(row=5, column=0, padx=10, pady=(0, 20), sticky="ew")
+        self.player_frame.grid(row=8, column=0, padx=10, pady=(0, 20), sticky="ew")
         
         # Barra de progresso do áudio
         self.audio_progress = ctk.CTkProgressBar(self.player_frame)
@@ -296,22 +763,29 @@ class KokoroStudioApp(ctk.CTk):
         # Container dos botões do Player (Ícones substituídos por caracteres de media padrão)
         player_btns = ctk.CTkFrame(self.player_frame, fg_color="transparent")
         player_btns.pack(fill="x")
-        player_btns.columnconfigure((0,1,2,3,4), weight=1)
+        player_btns.columnconfigure((0,1,2,3,4,5,6), weight=1)
+
+        # ⏮/⏭ saltam de frase em frase (precisam do índice de tempos do ficheiro)
+        self.btn_prev_segment = ctk.CTkButton(player_btns, text="⏮", font=ctk.CTkFont(size=14), width=30, command=lambda: self.audio_jump_segment(-1), state="disabled")
+        self.btn_prev_segment.grid(row=0, column=0, padx=2, sticky="ew")
 
         self.btn_rev = ctk.CTkButton(player_btns, text="<<", font=ctk.CTkFont(size=14, weight="bold"), width=30, command=self.audio_reverse, state="disabled")
-        self.btn_rev.grid(row=0, column=0, padx=2, sticky="ew")
+        self.btn_rev.grid(row=0, column=1, padx=2, sticky="ew")
         
         self.btn_play = ctk.CTkButton(player_btns, text="►", font=ctk.CTkFont(size=16), width=30, command=self.audio_play, state="disabled")
-        self.btn_play.grid(row=0, column=1, padx=2, sticky="ew")
+        self.btn_play.grid(row=0, column=2, padx=2, sticky="ew")
         
         self.btn_pause = ctk.CTkButton(player_btns, text="❚❚", font=ctk.CTkFont(size=12, weight="bold"), width=30, command=self.audio_pause, state="disabled")
-        self.btn_pause.grid(row=0, column=2, padx=2, sticky="ew")
+        self.btn_pause.grid(row=0, column=3, padx=2, sticky="ew")
         
         self.btn_stop = ctk.CTkButton(player_btns, text="■", font=ctk.CTkFont(size=16), width=30, command=self.audio_stop, state="disabled")
-        self.btn_stop.grid(row=0, column=3, padx=2, sticky="ew")
+        self.btn_stop.grid(row=0, column=4, padx=2, sticky="ew")
         
         self.btn_fwd = ctk.CTkButton(player_btns, text=">>", font=ctk.CTkFont(size=14, weight="bold"), width=30, command=self.audio_forward, state="disabled")
-        self.btn_fwd.grid(row=0, column=4, padx=2, sticky="ew")
+        self.btn_fwd.grid(row=0, column=5, padx=2, sticky="ew")
+
+        self.btn_next_segment = ctk.CTkButton(player_btns, text="⏭", font=ctk.CTkFont(size=14), width=30, command=lambda: self.audio_jump_segment(1), state="disabled")
+        self.btn_next_segment.grid(row=0, column=6, padx=2, sticky="ew")
 
     # --- LÓGICA DO PLAYER DE ÁUDIO  ---
     def audio_play(self):
@@ -321,99 +795,69 @@ class KokoroStudioApp(ctk.CTk):
         if not self.selected_file_path or not os.path.exists(self.selected_file_path): 
             return
         
-        if self.is_paused:
-            pygame.mixer.music.unpause()
-            self.is_paused = False
-            self.is_playing = True
+        if self.file_player.state == FilePlayer.PAUSED:
+            self.file_player.resume()
         else:
             try:
-                pygame.mixer.music.load(self.selected_file_path)
-                pygame.mixer.music.play()
-                self.is_playing = True
-                self.is_paused = False
-                # Inicia rastreio da barra de progresso numa Thread para não travar a UI
-                threading.Thread(target=self.track_audio_progress, daemon=True).start()
+                if self.stream_player is not None:
+                    self.stream_player.stop()
+                self.file_player.play(self.selected_file_path)
             except Exception as e:
                 msgbox.showerror("Erro de Reprodução", f"Não foi possível reproduzir o áudio:\n{str(e)}")
                 return
-                
-        self.update_player_buttons()
 
     def audio_pause(self):
-        if HAS_PYGAME and self.is_playing:
-            pygame.mixer.music.pause()
-            self.is_paused = True
-            self.is_playing = False
-            self.update_player_buttons()
+        if HAS_PYGAME and self.file_player.state == FilePlayer.PLAYING:
+            self.file_player.pause()
 
     def audio_stop(self):
         if HAS_PYGAME:
-            pygame.mixer.music.stop()
-            self.is_playing = False
-            self.is_paused = False
-            self.audio_progress.set(0)
-            self.update_player_buttons()
+            self.file_player.stop()
 
     def audio_forward(self):
-        if HAS_PYGAME and self.is_playing:
+        if HAS_PYGAME and self.file_player.state == FilePlayer.PLAYING:
             try:
-                current_pos = pygame.mixer.music.get_pos() / 1000.0
-                pygame.mixer.music.set_pos(current_pos + 5.0)
+                self.file_player.seek(self.file_player.position() + 5.0)
             except Exception as e:
                 logger.warning(f"Avançar não suportado neste formato/sistema: {e}")
 
     def audio_reverse(self):
-        if HAS_PYGAME and self.is_playing:
+        if HAS_PYGAME and self.file_player.state == FilePlayer.PLAYING:
             try:
-                current_pos = pygame.mixer.music.get_pos() / 1000.0
-                new_pos = max(0.0, current_pos - 5.0)
-                pygame.mixer.music.rewind()
-                pygame.mixer.music.set_pos(new_pos)
+                self.file_player.seek(self.file_player.position() - 5.0)
             except Exception as e:
                 logger.warning(f"Retroceder não suportado neste formato/sistema: {e}")
 
-    def track_audio_progress(self):
-        if not HAS_PYGAME: return
-        
-        try:
-            # Obtém a duração total do ficheiro
-            if HAS_PYDUB and self.selected_file_path:
-                audio = AudioSegment.from_file(self.selected_file_path)
-                duration = audio.duration_seconds
-            else:
-                duration = pygame.mixer.Sound(self.selected_file_path).get_length()
-        except:
-            duration = 100 # Prevenção de erro
-            
-        if duration <= 0: return
-
-        while self.is_playing or self.is_paused:
-            if self.is_playing and pygame.mixer.music.get_busy():
-                current_pos = pygame.mixer.music.get_pos() / 1000.0
-                progress = min(1.0, current_pos / duration)
-                self.audio_progress.set(progress)
-            elif self.is_playing and not pygame.mixer.music.get_busy():
-                # Ficheiro chegou ao fim
-                self.is_playing = False
-                self.audio_progress.set(1.0)
-                self.after(0, self.update_player_buttons)
-                break
-            time.sleep(0.1) # Atualiza a barra a cada 100ms
+    def audio_jump_segment(self, step):
+        if HAS_PYGAME and self.file_player.state == FilePlayer.PLAYING:
+            try:
+                self.file_player.jump_segment(step)
+            except Exception as e:
+                logger.warning(f"Salto de frase não suportado neste formato/sistema: {e}")
+
+    def set_audio_progress(self, fraction):
+        self.audio_progress.set(fraction)
 
     def update_player_buttons(self):
         # Atualiza o estado dos botões visualmente
-        if self.is_playing:
+        state = self.file_player.state if self.file_player is not None else FilePlayer.STOPPED
+        if state == FilePlayer.PLAYING:
             self.btn_play.configure(state="disabled")
             self.btn_pause.configure(state="normal")
             self.btn_stop.configure(state="normal")
             self.btn_fwd.configure(state="normal")
             self.btn_rev.configure(state="normal")
-        elif self.is_paused:
+            segment_state = "normal" if self.file_player.index is not None else "disabled"
+            self.btn_prev_segment.configure(state=segment_state)
+            self.btn_next_segment.configure(state=segment_state)
+        elif state == FilePlayer.PAUSED:
             self.btn_play.configure(state="normal")
             self.btn_pause.configure(state="disabled")
             self.btn_stop.configure(state="normal")
             self.btn_fwd.configure(state="disabled")
             self.btn_rev.configure(state="disabled")
+            self.btn_prev_segment.configure(state="disabled")
+            self.btn_next_segment.configure(state="disabled")
         else: # Parado
             if self.selected_file_path:
                 self.btn_play.configure(state="normal")
@@ -421,7 +865,8 @@ class KokoroStudioApp(ctk.CTk):
             self.btn_stop.configure(state="disabled")
             self.btn_fwd.configure(state="disabled")
             self.btn_rev.configure(state="disabled")
-            self.audio_progress.set(0)
+            self.btn_prev_segment.configure(state="disabled")
+            self.btn_next_segment.configure(state="disabled")
 
     # --- FUNÇÕES ORIGINAIS MODIFICADAS PARA INCLUIR ATUALIZAÇÃO DO PLAYER ---
 
@@ -436,53 +881,116 @@ class KokoroStudioApp(ctk.CTk):
             self.folder_path_entry.insert(0, self.work_dir)
             self.folder_path_entry.configure(state="readonly")
             
-            self.refresh_file_list()
             self.audio_stop() # Parar áudio anterior se houver
+            self.clear_file_selection()
+            self.file_index = DirectoryIndex(self.work_dir)
+            self.refresh_file_list()
 
     def refresh_file_list(self):
-        """Atualiza a lista visual de arquivos na pasta de trabalho."""
-        # Limpar lista atual
-        for widget in self.file_list_frame.winfo_children():
-            widget.destroy()
-
-        try:
-            files = [f for f in os.listdir(self.work_dir) if f.lower().endswith(('.wav', '.mp3'))]
-            files.sort()
-            
-            self.file_widgets = {} # Mapeia nome -> botão
-
-            for f in files:
-                btn = ctk.CTkButton(self.file_list_frame, text=f, anchor="w", fg_color="transparent", border_width=1, border_color="#333",
-                                    command=lambda name=f: self.on_file_select(name))
-                btn.pack(fill="x", pady=2)
-                self.file_widgets[f] = btn
-        except Exception as e:
-            logger.error(f"Error listing files: {e}")
-
-    def on_file_select(self, filename):
-        # Resetar visual
-        for btn in self.file_widgets.values():
-            btn.configure(fg_color="transparent")
-        
-        # Destacar selecionado
-        if filename in self.file_widgets:
-            self.file_widgets[filename].configure(fg_color="#3B8ED0")
-        
+        """Full rescan of the work folder (diffed against the index), then redraws the visible rows."""
+        with trace("files.refresh"):
+            try:
+                self.file_index.scan()
+            except OSError as e:
+                logger.error(f"Error listing files: {e}")
+            self.update_file_view()
+
+    def poll_work_dir(self):
+        # Mudanças feitas fora da aplicação: só re-lê a pasta quando o mtime dela muda
+        with trace("files.poll"):
+            if self.file_index.poll():
+                self.update_file_view()
+        self.after(2000, self.poll_work_dir)
+
+    def update_file_view(self):
+        """Re-sorts/filters the index (cached per change) and rebinds the visible rows."""
+        sort_key = self.FILE_SORTS[self.file_sort_var.get()]
+        if sort_key == "duration":
+            self.probe_missing_durations()
+        items = self.file_index.view(sort_key, self.file_sort_desc, self.file_filter_var.get())
+        with span("files.render"):
+            self.file_list.set_items(items)
+        self.file_list_label.configure(text=f"Ficheiros de Áudio ({len(items)})")
+
+    def toggle_sort_direction(self):
+        self.file_sort_desc = not self.file_sort_desc
+        self.sort_dir_btn.configure(text="↓" if self.file_sort_desc else "↑")
+        self.update_file_view()
+
+    def probe_missing_durations(self):
+        """Ordenar por duração precisa de todas: lê os cabeçalhos que faltam numa thread."""
+        names = self.file_index.missing_durations()
+        if not names or self._probing_durations:
+            return
+        self._probing_durations = True
+        folder = self.file_index.path
+
+        def probe():
+            durations = {}
+            for name in names:
+                info = probe_audio(os.path.join(folder, name))
+                durations[name] = info.duration if info is not None else None
+            self.ui_bus.post(apply, durations)
+
+        def apply(durations):
+            self._probing_durations = False
+            if self.file_index.path == folder:
+                self.file_index.set_durations(durations)
+                self.update_file_view()
+
+        threading.Thread(target=probe, daemon=True).start()
+
+    def describe_file(self, name):
+        duration = self.file_index.duration(name)
+        return format_duration(duration) if duration is not None else "?"
+
+    def set_file_actions_state(self, state):
+        for btn in (self.btn_rename, self.btn_delete, self.btn_convert):
+            btn.configure(state=state)
+
+    def clear_file_selection(self):
+        self.selected_file_path = None
+        self.file_list.clear_selection()
+        self.set_file_actions_state("disabled")
+        self.btn_play.configure(state="disabled") # Desativar Play
+
+    def selected_paths(self):
+        return [os.path.join(self.work_dir, name) for name in self.file_list.selected_items()]
+
+    def on_file_select(self, names):
+        if not names:
+            self.audio_stop()
+            self.clear_file_selection()
+            return
+        # O player toca o último ficheiro clicado (ou o primeiro da seleção)
+        filename = self.file_list.selected if self.file_list.selected in names else names[0]
         self.selected_file_path = os.path.join(self.work_dir, filename)
+        if len(names) > 1:
+            self.status_label.configure(text=f"{len(names)} ficheiros selecionados", text_color="gray")
+        else:
+            info = probe_audio(self.selected_file_path)
+            if info is not None:
+                channels = "mono" if info.channels == 1 else f"{info.channels} canais"
+                self.status_label.configure(text=f"{filename}: {format_duration(info.duration)}, {info.samplerate} Hz, {channels}",
+                                            text_color="gray")
         
-        # Habilitar botões
-        self.btn_rename.configure(state="normal")
-        self.btn_delete.configure(state="normal")
-        self.btn_convert.configure(state="normal")
+        # Habilitar botões (exceto durante uma operação em lote)
+        if self.bulk_runner is None:
+            self.set_file_actions_state("normal")
         
         # Atualização do Player
         self.audio_stop()
         self.btn_play.configure(state="normal")
 
     def action_rename_file(self):
-        if not self.selected_file_path or not os.path.exists(self.selected_file_path):
+        paths = self.selected_paths()
+        if len(paths) > 1:
+            self.rename_selected(paths)
+            return
+        if not paths or not os.path.exists(paths[0]):
             return
         
+        self.selected_file_path = paths[0]
         current_name = os.path.basename(self.selected_file_path)
         new_name = ctk.CTkInputDialog(text="Novo nome (com extensão):", title="Renomear").get_input()
         
@@ -491,76 +999,213 @@ class KokoroStudioApp(ctk.CTk):
             try:
                 self.audio_stop() # Parar o player antes de renomear o ficheiro
                 os.rename(self.selected_file_path, new_path)
-                self.refresh_file_list()
+                move_sidecars(self.selected_file_path, new_path)  # índice de tempos e legendas
+                self.file_index.rename(current_name, new_name)
+                self.selected_file_path = new_path
+                self.file_list.select(new_name)
+                self.update_file_view()
+                self.file_list.scroll_to(new_name)
                 self.status_label.configure(text=f"Renomeado para {new_name}")
             except Exception as e:
                 msgbox.showerror("Erro", str(e))
 
+    def rename_selected(self, paths):
+        template = ctk.CTkInputDialog(text="Padrão dos novos nomes, sem extensão\n({name} = nome atual, {n} = número, ex: capitulo_{n:02d}):",
+                                      title=f"Renomear {len(paths)} ficheiros").get_input()
+        if not template:
+            return
+        try:
+            plan = plan_renames(paths, template)
+        except ValueError as e:
+            msgbox.showerror("Erro", str(e))
+            return
+        if not plan:
+            self.status_label.configure(text="Nenhum nome mudou.", text_color="gray")
+            return
+        self.audio_stop() # Parar o player antes de renomear
+        self.start_bulk("Renomeando", rename_one, plan,
+                        on_ok=lambda result: self.file_index.rename(os.path.basename(result.source),
+                                                                    os.path.basename(result.target)))
+
     def action_delete_file(self):
-        if not self.selected_file_path:
+        paths = self.selected_paths()
+        if not paths:
             return
-        if msgbox.askyesno("Confirmar", "Tem certeza que deseja apagar este arquivo?"):
-            try:
-                self.audio_stop() # Parar o player antes de apagar
-                os.remove(self.selected_file_path)
-                self.refresh_file_list()
-                self.selected_file_path = None
-                self.btn_rename.configure(state="disabled")
-                self.btn_delete.configure(state="disabled")
-                self.btn_convert.configure(state="disabled")
-                self.btn_play.configure(state="disabled") # Desativar Play
-            except Exception as e:
-                msgbox.showerror("Erro", str(e))
+        question = ("Tem certeza que deseja apagar este arquivo?" if len(paths) == 1
+                    else f"Tem certeza que deseja apagar {len(paths)} arquivos?")
+        if msgbox.askyesno("Confirmar", question):
+            self.audio_stop() # Parar o player antes de apagar
+            self.start_bulk("Apagando", delete_one, paths,
+                            on_ok=lambda result: self.file_index.remove(os.path.basename(result.source)))
 
     def action_convert_mp3(self):
-        if not self.selected_file_path:
-            return
-        
-        if not HAS_PYDUB:
-            msgbox.showwarning("Aviso", "Biblioteca 'pydub' não encontrada. Instale com 'pip install pydub' e certifique-se de ter o ffmpeg instalado.")
+        if not HAS_MP3_ENCODER:
+            msgbox.showwarning("Aviso", "Nenhum encoder MP3 encontrado. Instale o ffmpeg (ou 'pip install lameenc').")
             return
 
-        target_file = self.selected_file_path
-        if target_file.lower().endswith(".mp3"):
-            msgbox.showinfo("Info", "O arquivo já é MP3.")
+        paths = [path for path in self.selected_paths() if not path.lower().endswith(".mp3")]
+        if not paths:
+            msgbox.showinfo("Info", "Os arquivos selecionados já são MP3.")
             return
 
+        # lameenc codifica dentro do processo: vários ficheiros vão para um pool de processos.
+        # Com ffmpeg cada conversão já é um subprocesso, threads chegam.
+        convert = functools.partial(convert_one, bitrate=self.bitrate_var.get())
+        self.start_bulk("Convertendo", convert, paths, workers=min(default_workers(), len(paths)),
+                        processes=HAS_LAMEENC and len(paths) > 1,
+                        on_ok=lambda result: self.file_index.add(os.path.basename(result.target)))
+
+    # --- Operações em lote ---
+
+    def start_bulk(self, label, func, items, workers=1, processes=False, on_ok=None):
+        """Runs func over items on a BulkRunner; on_ok(result) updates the index for each file that succeeded."""
+        if self.bulk_runner is not None:
+            msgbox.showinfo("Info", "Aguarde o fim da operação em curso (ou cancele-a).")
+            return
+        folder = self.work_dir
+
+        def on_item(result, done, total):
+            self.ui_bus.post(self.on_bulk_item, label, folder, on_ok, result, done, total)
+
+        def on_done(summary):
+            self.ui_bus.post(self.on_bulk_done, label, summary)
+
+        self.bulk_failures = []
+        self.set_file_actions_state("disabled")
+        self.bulk_progress.set(0)
+        self.bulk_frame.grid()
+        self.status_label.configure(text=f"{label} {len(items)} ficheiros...", text_color="gray")
+        self.bulk_runner = BulkRunner(func, items, workers=workers, processes=processes,
+                                      on_item=on_item, on_done=on_done)
+        self.bulk_runner.start()
+
+    def on_bulk_item(self, label, folder, on_ok, result, done, total):
+        name = os.path.basename(result.source)
+        if result.status == BULK_OK and on_ok is not None and folder == self.file_index.path:
+            on_ok(result)
+            self.schedule_file_view()
+        elif result.message and result.status != BULK_OK:
+            self.bulk_failures.append(f"{name}: {result.message}")
+        self.bulk_progress.set(done / total)
+        self.status_label.configure(text=f"{label} {done}/{total}: {name}", text_color="gray")
+
+    def on_bulk_done(self, label, summary):
+        self.bulk_runner = None
+        self.bulk_frame.grid_remove()
+        self.clear_file_selection()
+        self.update_file_view()
+        self.status_label.configure(text=f"{label}: {summary.describe()}",
+                                    text_color="red" if summary.failed else "green")
+        if summary.failed:
+            details = "\n".join(self.bulk_failures[:10])
+            if len(self.bulk_failures) > 10:
+                details += f"\n... e mais {len(self.bulk_failures) - 10}"
+            msgbox.showwarning("Aviso", f"{summary.failed} ficheiro(s) falharam:\n{details}")
+
+    def action_cancel_bulk(self):
+        if self.bulk_runner is not None:
+            self.bulk_runner.cancel()
+            self.status_label.configure(text="Cancelando...", text_color="gray")
+
+    def schedule_file_view(self):
+        # Agrupa as atualizações da lista: com centenas de ficheiros, no máximo um redesenho a cada 200 ms
+        if not self._file_view_pending:
+            self._file_view_pending = True
+            self.after(200, self.flush_file_view)
+
+    def flush_file_view(self):
+        self._file_view_pending = False
+        self.update_file_view()
+
+    @staticmethod
+    def load_voice_blends(value):
+        """'spec;spec;...' -> {lang_code: {menu label: canonical spec}}; the language is the first voice's."""
+        blends = {}
+        for spec in value.split(";"):
+            if not spec.strip():
+                continue
+            try:
+                parts = parse_voice_spec(spec)
+            except ValueError as e:
+                logger.warning(f"Ignoring voice blend {spec!r}: {e}")
+                continue
+            label = "🎚 " + " + ".join(f"{voice_id} {weight:.0%}" for voice_id, weight in parts)
+            blends.setdefault(parts[0][0][0], {})[label] = format_voice_spec(parts)
+        return blends
+
+    def warm_voices(self):
+        # Valida o VOICE_MAP e deixa em memória as vozes já descarregadas e as misturas do menu
+        self.engine.voices.validate(VOICE_MAP)
+        self.engine.voices.preload([spec for voices in self.voice_blends.values() for spec in voices.values()])
+
+    @staticmethod
+    def load_inference_profile():
+        # KOKORO_INFERENCE_PROFILE=int8 (presets de studio_inference) e KOKORO_THREADS=4
         try:
-            self.status_label.configure(text="Convertendo para MP3...")
-            audio = AudioSegment.from_file(target_file)
-            new_filename = os.path.splitext(target_file)[0] + ".mp3"
-            audio.export(new_filename, format="mp3")
-            self.refresh_file_list()
-            self.status_label.configure(text=f"Convertido: {os.path.basename(new_filename)}")
+            return resolve_inference_profile(os.environ.get("KOKORO_INFERENCE_PROFILE") or None,
+                                             int(os.environ.get("KOKORO_THREADS") or 0) or None)
+        except ValueError as e:
+            logger.warning(f"Ignoring inference settings: {e}")
+            return resolve_inference_profile()
+
+    def on_window_ready(self):
+        """First idle moment after the window is drawn: logs the startup time and starts the warm-up."""
+        self.update_idletasks()
+        logger.info(f"Time to window: {time.perf_counter() - LAUNCHED_AT:.2f}s")
+        # Idioma e voz selecionados são lidos aqui, na thread do Tk
+        lang_code = LANG_MAP[self.lang_option.get()]
+        voice = self.voice_choices(lang_code).get(self.voice_option.get())
+        threading.Thread(target=self.warm_up, args=(lang_code, voice), daemon=True).start()
+
+    def warm_up(self, lang_code, voice):
+        # Enquanto o utilizador escreve: abre o mixer, carrega o idioma selecionado e faz uma síntese mínima
+        try:
+            if HAS_PYGAME:
+                init_audio()
+            if os.environ.get("KOKORO_WARMUP", "1") != "0":
+                self.engine.warm_up(lang_code, voice)
+            # Idiomas extra a pré-carregar em segundo plano (ex: KOKORO_PREWARM=p,a,e)
+            prewarm_langs = [code.strip() for code in os.environ.get("KOKORO_PREWARM", "").split(",") if code.strip()]
+            if prewarm_langs:
+                self.engine.prewarm(prewarm_langs)
         except Exception as e:
-            msgbox.showerror("Erro na Conversão", f"Certifique-se que o ffmpeg está instalado.\n{str(e)}")
+            logger.warning(f"Warm-up failed: {e}")
+        finally:
+            self.warm_up_done.set()
+
+    def voice_choices(self, lang_code):
+        """Menu label -> voice spec for a language: the VOICE_MAP voices, then the configured blends."""
+        return {**VOICE_MAP.get(lang_code, {}), **self.voice_blends.get(lang_code, {})}
 
     def update_voice_list(self, choice):
         """Updates the voice dropdown based on selected language."""
         lang_code = LANG_MAP[choice]
-        voices = VOICE_MAP.get(lang_code, {})
+        voices = self.voice_choices(lang_code)
         self.voice_option.configure(values=list(voices.keys()))
         if voices:
             self.voice_option.set(list(voices.keys())[0])
         else:
             self.voice_option.set("Padrão")
 
-    def get_auto_filename(self, extension=".wav"):
-        """Generates audio_kokoro_X.ext filename."""
+    def get_auto_filename(self, extension=".wav", targets=None):
+        """Generates audio_kokoro_X.ext filename (free for every export target too)."""
         base_name = "audio_kokoro"
         counter = 1
+        reserved = self.scheduler.reserved_paths() # Jobs na fila ainda não criaram os seus ficheiros
         while True:
             filename = f"{base_name}_{counter}{extension}"
             full_path = os.path.join(self.work_dir, filename)
-            if not os.path.exists(full_path):
+            if not any(os.path.exists(path) or path in reserved for path in self.output_paths(full_path, targets)):
                 return full_path
             counter += 1
 
+    @staticmethod
+    def output_paths(filepath, targets=None):
+        """Files a render saved as filepath writes: one per export target, or just filepath."""
+        return [target.path_for(filepath) for target in targets] if targets else [filepath]
+
     def start_generation_thread(self):
-        """Starts generation in a separate thread to keep UI responsive."""
-        if self.is_generating:
-            return
-        
+        """Queues a generation job; the scheduler renders it on a worker thread."""
         # UI Validation
         text = self.text_input.get("0.0", "end").strip()
         if not text:
@@ -569,142 +1214,169 @@ class KokoroStudioApp(ctk.CTk):
 
         # Filename Logic
         user_name = self.filename_entry.get().strip()
-        selected_format = self.format_var.get() # .mp3 ou .wav
+        selected_format = self.format_var.get() # .mp3, .wav ou um perfil de exportação
+        targets = EXPORT_PROFILES.get(selected_format)
+        if targets is not None:
+            selected_format = targets[0].extension # o primeiro alvo dá o nome ao ficheiro
 
         if not user_name:
             # Auto filename com caminho completo da pasta de trabalho
-            filepath = self.get_auto_filename(selected_format)
+            filepath = self.get_auto_filename(selected_format, targets)
         else:
             # Sanitize filename
-            user_name = re.sub(r'[\\/*?:"<>|]', "", user_name)
+            user_name = sanitize_filename(user_name)
             if not user_name.lower().endswith(selected_format):
                 user_name += selected_format
             filepath = os.path.join(self.work_dir, user_name)
-            
-            if os.path.exists(filepath):
-                if not msgbox.askyesno("Sobrescrever?", f"O arquivo '{os.path.basename(filepath)}' já existe. Deseja sobrescrever?"):
-                    return
-
-        # Lock UI
-        self.is_generating = True
-        self.generate_btn.configure(state="disabled", text="Gerando...")
-        self.progress_bar.start()
-        
-        # Thread
-        threading.Thread(target=self.generate_audio_process, args=(text, filepath, selected_format), daemon=True).start()
 
-    def generate_audio_process(self, text, filepath, file_format):
-        """Core logic for TTS generation and processing."""
-        try:
-            from kokoro import KPipeline
-            
-            # 1. Get Settings
-            selected_lang_name = self.lang_option.get()
-            lang_code = LANG_MAP[selected_lang_name]
-            
-            selected_voice_name = self.voice_option.get()
-            voice_code = VOICE_MAP[lang_code][selected_voice_name]
-            
-            speed = self.speed_slider.get()
-            volume_gain = self.vol_slider.get()
-            pitch_shift = self.pitch_slider.get()
-
-            self.update_status("Carregando Pipeline Kokoro...")
-            logger.info(f"Loading Pipeline: {lang_code}, Voice: {voice_code}")
-
-            # 2. Initialize Pipeline (Lazy Loading)
-            # Re-initialize only if lang changed or first run
-            if self.pipeline is None or self.current_lang_code != lang_code:
-                 # Force CPU for stability on generic hardware
-                self.pipeline = KPipeline(lang_code=lang_code, device='cpu')
-                self.current_lang_code = lang_code
+            reserved = self.scheduler.reserved_paths()
+            existing = [path for path in self.output_paths(filepath, targets)
+                        if os.path.exists(path) or path in reserved]
+            if existing:
+                names = ", ".join(f"'{os.path.basename(path)}'" for path in existing)
+                if not msgbox.askyesno("Sobrescrever?", f"O arquivo {names} já existe. Deseja sobrescrever?"):
+                    return
 
-            self.update_status("Sintetizando áudio...")
-            
-            # 3. Generate Audio
-            generator = self.pipeline(text, voice=voice_code, speed=speed, split_pattern=r'\n+')
-            
-            audio_segments = []
-            for i, (gs, ps, audio) in enumerate(generator):
-                if audio is not None:
-                    audio_segments.append(audio)
-            
-            if not audio_segments:
-                raise Exception("Nenhum áudio foi gerado pelo modelo.")
+        # Settings are read here, on the Tk thread, and handed to the engine
+        lang_code = LANG_MAP[self.lang_option.get()]
+        params = SynthesisParams(
+            lang_code=lang_code,
+            voice=self.voice_choices(lang_code)[self.voice_option.get()],
+            speed=self.speed_slider.get(),
+            gain_db=self.vol_slider.get(),
+            pitch=self.pitch_slider.get(),
+        )
+
+        # O streaming grava um só ficheiro; perfis com vários alvos usam a renderização normal
+        stream = (not targets and bool(self.stream_var.get()) and self.stream_player is not None
+                  and init_audio())
+
+        job = GenerationJob(text=text, filepath=filepath, params=params, stream=stream,
+                            targets=targets)
+        if stream:
+            job.on_start = self.start_stream_playback
+            job.on_chunk = self.stream_player.push
+        self.scheduler.submit(job)
+
+    def start_stream_playback(self, job):
+        """Runs on the worker thread when a streaming job starts: resets the players on the Tk thread first."""
+        ready = threading.Event()
+
+        def start():
+            self.audio_stop() # O player de ficheiros e o streaming partilham o mixer
+            self.stream_player.start()
+            ready.set()
+
+        self.ui_bus.post(start)
+        ready.wait(timeout=5)
+
+    def post_job_update(self, job, progress):
+        # Chamado nas threads do scheduler: toda a atualização de widgets passa para a thread do Tk
+        self.ui_bus.post(self.on_job_update, job, progress)
+
+    def on_job_update(self, job, progress):
+        """Reflects a job state change or a finished segment in the UI (Tk thread)."""
+        pending = self.scheduler.pending_count()
+        queue_note = f" | {pending} na fila" if pending else ""
+        self.clear_queue_btn.configure(state="normal" if pending else "disabled")
+
+        if job.status == QUEUED:
+            if self.current_job is None:
+                self.status_label.configure(text=f"Na fila: {os.path.basename(job.filepath)}{queue_note}",
+                                            text_color="gray")
+            return
 
-            # Concatenate
-            full_audio = np.concatenate(audio_segments)
+        if job.status == RUNNING:
+            self.current_job = job
+            self.cancel_btn.configure(state="normal")
+            self.progress_bar.set(progress.fraction)
+            message = progress.message
+            if progress.segments_total:
+                message += (f" {progress.segments_done}/{progress.segments_total} segmentos, "
+                            f"{progress.audio_seconds:.1f}s de áudio, RTF {progress.real_time_factor:.2f}")
+            self.status_label.configure(text=message + queue_note, text_color="gray")
+            return
 
-            # 4. Post-Processing (Effects)
-            self.update_status("Aplicando efeitos...")
-            
-            # Apply Pitch Shift (Resampling method)
-            if pitch_shift != 1.0:
-                # Resampling changes speed too, so we compensate speed if needed, 
-                # but simple resampling is often what users perceive as pitch shift in simple tools.
-                new_len = int(len(full_audio) / pitch_shift)
-                full_audio = signal.resample(full_audio, new_len)
-
-            # Apply Volume Gain
-            if volume_gain != 0:
-                # DB to linear conversion: 10^(db/20)
-                gain_factor = 10 ** (volume_gain / 20)
-                full_audio = full_audio * gain_factor
-
-            # Clipping protection
-            max_val = np.max(np.abs(full_audio))
-            if max_val > 1.0:
-                full_audio = full_audio / max_val
-                logger.warning("Audio normalized to prevent clipping.")
-
-            # 5. Save File
-            self.update_status(f"Salvando {os.path.basename(filepath)}...")
-            
-            # Se for MP3, primeiro salvamos como WAV temporário, depois convertemos com pydub
-            if file_format == ".mp3":
-                if not HAS_PYDUB:
-                    # Fallback se não tiver pydub: Salva como wav e avisa
-                    filepath = filepath.replace(".mp3", ".wav")
-                    sf.write(filepath, full_audio, 24000)
-                    raise Exception("PyDub não instalado. Salvo como .wav.")
-                else:
-                    # Salva WAV temp na memória ou disco
-                    temp_wav = filepath.replace(".mp3", "_temp.wav")
-                    sf.write(temp_wav, full_audio, 24000)
-                    
-                    # Converte
-                    audio_seg = AudioSegment.from_wav(temp_wav)
-                    audio_seg.export(filepath, format="mp3")
-                    
-                    # Remove temp
-                    if os.path.exists(temp_wav):
-                        os.remove(temp_wav)
+        # Job terminado (concluído, falhou ou cancelado)
+        if job.stream:
+            if job.status == CANCELLED:
+                self.stream_player.stop()
             else:
-                # Salvar WAV direto
-                sf.write(filepath, full_audio, 24000)
-            
-            # Atualiza lista de arquivos no final
-            self.after(0, self.refresh_file_list)
-            
-            self.finish_generation(True, f"Sucesso! Salvo: {os.path.basename(filepath)}")
-            logger.info(f"Generated: {filepath}")
-
-        except Exception as e:
-            logger.error(f"Generation Failed: {e}", exc_info=True)
-            self.finish_generation(False, str(e))
-
-    def update_status(self, message):
-        self.status_label.configure(text=message)
-
-    def finish_generation(self, success, message):
-        self.is_generating = False
-        self.progress_bar.stop()
-        self.progress_bar.set(1 if success else 0)
-        self.generate_btn.configure(state="normal", text="► PLAY / GERAR")
-        self.status_label.configure(text=message, text_color="green" if success else "red")
-        
-        if not success:
-            msgbox.showerror("Erro de Geração", message)
+                self.stream_player.finish()
+        if job is self.current_job:
+            self.current_job = None
+            self.cancel_btn.configure(state="disabled")
+        self.finish_generation(job, queue_note)
+
+    def toggle_stats_panel(self):
+        if self.stats_box.winfo_ismapped():
+            self.stats_box.grid_remove()
+            self.stats_toggle.configure(text="▸ Estatísticas")
+        else:
+            self.stats_box.grid()
+            self.stats_toggle.configure(text="▾ Estatísticas")
+            self.refresh_stats_panel()
+
+    def on_trace(self):
+        if self.stats_box.winfo_ismapped():
+            self.refresh_stats_panel()
+
+    def refresh_stats_panel(self):
+        """Last STATS_JOBS generations, newest first: total, RTF and seconds per stage."""
+        lines = []
+        for finished in reversed(tracer.recent_traces("job")[-self.STATS_JOBS:]):
+            audio_seconds = finished.counters.get("audio_seconds", 0.0)
+            rtf = f"RTF {finished.duration / audio_seconds:.2f}" if audio_seconds else "RTF -"
+            outcome = f"  [{finished.error}]" if finished.error else ""
+            lines.append(f"#{finished.attrs.get('job_id')} {finished.attrs.get('output', '')}: "
+                         f"{finished.duration:.2f}s, {audio_seconds:.1f}s de áudio, {rtf}{outcome}")
+            stages = "  ".join(f"{name} {seconds:.2f}s" for name, seconds in finished.stage_totals().items())
+            lines.append(f"    {stages}")
+        self.stats_box.configure(state="normal")
+        self.stats_box.delete("1.0", "end")
+        self.stats_box.insert("1.0", "\n".join(lines) or "Nenhuma geração concluída ainda.")
+        self.stats_box.configure(state="disabled")
+
+    def action_cancel_job(self):
+        if self.current_job is not None:
+            self.scheduler.cancel(self.current_job.job_id)
+            self.status_label.configure(text="Cancelando...", text_color="gray")
+
+    def action_clear_queue(self):
+        for job in self.scheduler.jobs():
+            if job.status == QUEUED:
+                self.scheduler.cancel(job.job_id)
+
+    def finish_generation(self, job, queue_note=""):
+        if job.status == DONE:
+            if not self.first_render_logged:
+                self.first_render_logged = True
+                logger.info(f"First render since launch: first audio after {job.stats.time_to_first_audio:.2f}s "
+                            f"(warm-up {'finished' if self.warm_up_done.is_set() else 'still running'})")
+            # Só os ficheiros novos entram no índice (se foram gravados na pasta mostrada)
+            stats = job.stats
+            outputs = stats.outputs or [job.result_path]
+            added = [path for path in outputs
+                     if os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.file_index.path)]
+            for path in added:
+                self.file_index.add(os.path.basename(path))
+            if added:
+                self.update_file_view()
+            saved = ", ".join(os.path.basename(path) for path in outputs)
+            message = f"Sucesso! Salvo: {saved} (1º áudio em {stats.time_to_first_audio:.2f}s"
+            if self.engine.cache is not None:
+                message += f", cache {stats.cache_hits}/{stats.cache_hits + stats.cache_misses}"
+            self.progress_bar.set(1)
+            self.status_label.configure(text=message + ")" + queue_note, text_color="green")
+        elif job.status == CANCELLED:
+            if self.current_job is None:
+                self.progress_bar.set(0)
+            self.status_label.configure(text=f"Cancelado: {os.path.basename(job.filepath)}{queue_note}",
+                                        text_color="orange")
+        else:
+            self.progress_bar.set(0)
+            self.status_label.configure(text=job.error + queue_note, text_color="red")
+            msgbox.showerror("Erro de Geração", job.error)
 
 if __name__ == "__main__":
     # Ensure working directory
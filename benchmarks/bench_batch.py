@@ -0,0 +1,132 @@
+"""
+Throughput of many short lines versus how many of them share one model call.
+
+Dialogue scripts and prompt packs are hundreds of one-sentence lines, where
+the fixed cost of each model call dominates. The corpus of each language is
+cut into sentences, one per line, and rendered with SynthesisEngine
+model_batch set to every value of --sizes (1 = one call per line, the
+default behaviour):
+
+    python benchmarks/bench_batch.py --langs a,p --sizes 1,2,4,8 --output batch.json
+
+For each size it reports lines per second, the model real-time factor, the
+number of model calls and the speedup over size 1. Packed lines are cut back
+at the pauses between them, so their durations move a little; length_ratio
+is the audio duration relative to size 1. Every run starts from the same
+torch seed.
+"""
+import argparse
+import json
+import platform
+import time
+
+from bench_common import SAMPLE_RATE, peak_rss_mb
+from bench_synthesis import CORPUS, git_commit, rounded
+
+from studio_engine import RenderStats, SynthesisEngine, SynthesisParams, default_voice
+from studio_inference import resolve_inference_profile
+from studio_text import split_sentences
+
+SEED = 0
+
+
+def short_lines(lang_code):
+    """The benchmark corpus of a language as one sentence per line."""
+    return [line.strip() for line in split_sentences(CORPUS[lang_code], lang_code) if line.strip()]
+
+
+def bench_size(engine, lines, params, size, repeat):
+    import torch
+
+    engine.model_batch = size
+    runs = []
+    for _ in range(max(1, repeat)):
+        torch.manual_seed(SEED)
+        stats = RenderStats()
+        started = time.perf_counter()
+        samples = sum(len(chunk) for chunk in engine.generate("\n".join(lines), params, stats=stats))
+        runs.append((time.perf_counter() - started, sum(stats.chunk_times), len(stats.chunk_times), samples))
+    total_s, model_s, calls, samples = min(runs)
+    audio_s = samples / SAMPLE_RATE
+    return {
+        "lines": len(lines),
+        "model_calls": calls,
+        "total_s": total_s,
+        "model_s": model_s,
+        "audio_s": audio_s,
+        "lines_per_s": len(lines) / total_s if total_s else 0.0,
+        "rtf": model_s / audio_s if audio_s else 0.0,
+    }
+
+
+def run(args):
+    sizes = sorted({max(1, int(size)) for size in args.sizes.split(",") if size.strip()} | {1})
+    profile = resolve_inference_profile(args.inference_profile, args.threads)
+    engine = SynthesisEngine(device="cpu", inference_profile=profile)
+    languages = {}
+    try:
+        for lang_code in [code.strip() for code in args.langs.split(",") if code.strip()]:
+            params = SynthesisParams(lang_code=lang_code, voice=default_voice(lang_code))
+            lines = short_lines(lang_code)
+            try:
+                engine.prewarm([lang_code], voices=[params.voice])
+                engine.warm_up(lang_code, params.voice)
+                results = {size: bench_size(engine, lines, params, size, args.repeat) for size in sizes}
+            except Exception as e:
+                languages[lang_code] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            base = results[1]
+            for r in results.values():
+                r["speedup"] = base["total_s"] / r["total_s"] if r["total_s"] else 0.0
+                r["length_ratio"] = r["audio_s"] / base["audio_s"] if base["audio_s"] else 0.0
+            languages[lang_code] = {str(size): r for size, r in results.items()}
+    finally:
+        engine.close()
+
+    import torch
+    own, _ = peak_rss_mb()
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "torch": torch.__version__,
+        "threads": torch.get_num_threads(),
+        "inference_profile": profile.describe(),
+        "sizes": sizes,
+        "peak_rss_mb": own,
+        "languages": rounded(languages),
+    }
+
+
+def print_table(report):
+    print(f"{'lang':<5} {'batch':>5} {'calls':>6} {'lines/s':>8} {'RTF':>7} {'speedup':>8} {'len Δ':>7}")
+    for lang_code, results in report["languages"].items():
+        if "error" in results:
+            print(f"{lang_code:<5} erro: {results['error']}")
+            continue
+        for size, r in results.items():
+            print(f"{lang_code:<5} {size:>5} {r['model_calls']:>6} {r['lines_per_s']:>8.2f} {r['rtf']:>7.3f} "
+                  f"{r['speedup']:>7.2f}x {r['length_ratio'] - 1:>+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--langs", default="a", help="Idiomas do corpus, separados por vírgula")
+    parser.add_argument("--sizes", default="1,2,4,8,16", help="Valores de model_batch a medir, separados por vírgula")
+    parser.add_argument("--repeat", type=int, default=1, help="Execuções por tamanho (fica a mais rápida)")
+    parser.add_argument("--inference-profile", default="default", help="Perfil de studio_inference a usar")
+    parser.add_argument("--threads", type=int, help="Threads torch (padrão: as do PyTorch)")
+    parser.add_argument("--output", help="Grava o JSON do relatório neste ficheiro")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_table(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Shared helpers for the benchmark scripts (synthetic audio, peak RSS, subprocess runs)."""
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+# Os benchmarks importam os módulos studio_* da raiz do repositório
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+SAMPLE_RATE = 24000
+
+
+def synthetic_render(minutes, seed=0):
+    """Voice-like float32 signal (modulated tone + noise), `minutes` long at 24 kHz."""
+    n = int(minutes * 60 * SAMPLE_RATE)
+    t = np.arange(n, dtype=np.float32) / SAMPLE_RATE
+    audio = 0.4 * np.sin(2 * np.pi * 180 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    audio += 0.02 * np.random.default_rng(seed).standard_normal(n).astype(np.float32)
+    return audio.astype(np.float32)
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of its finished children (e.g. ffmpeg), in MB."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1e6, 0.0
+        except (ImportError, AttributeError):
+            return float("nan"), float("nan")
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss: bytes on macOS, KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1e6
+    return own, children
+
+
+def run_isolated(script, args):
+    """Runs `script args` in a fresh interpreter and returns the JSON object on its last stdout line."""
+    out = subprocess.run([sys.executable, os.path.abspath(script), *map(str, args)], capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip() or f"exit code {out.returncode}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
@@ -0,0 +1,242 @@
+"""
+CPU inference profiles side by side: speed, and how much the audio moves away from "default".
+
+Every profile of studio_inference.INFERENCE_PROFILES (or those given with
+--profiles) runs in a fresh interpreter, so thread settings, compiled graphs
+and peak RSS do not leak from one profile into the next. For each language
+it measures the load (model + profile preparation, e.g. quantization or the
+ONNX export), the warm-up (first tiny synthesis, where torch.compile
+compiles) and the model real-time factor on the benchmark corpus, then
+compares the audio with the --reference profile:
+
+    python benchmarks/bench_inference.py --langs a,p --threads 4 --output inference.json
+
+snr_db is the signal-to-difference ratio over the common length, lsd_db the
+log-spectral distance between the two renders and length_ratio the change
+in duration (the duration predictor moved). Kokoro's vocoder adds random
+noise, so every render starts from the same torch seed. The report ends with
+the fastest profile within --max-lsd and --max-length-change of the reference.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_common import SAMPLE_RATE, peak_rss_mb, run_isolated
+from bench_synthesis import CORPUS, git_commit, rounded
+
+from studio_engine import RenderStats, SynthesisEngine, SynthesisParams, default_voice
+from studio_inference import INFERENCE_PROFILES, resolve_inference_profile
+from studio_text import DEFAULT_CHUNK_BUDGET
+
+SEED = 0
+MAX_SNR_DB = 120.0  # renders idênticos dariam infinito
+
+
+def render_profile(args):
+    """--run-one: renders the corpus with one profile; the audio goes to --audio-dir as .npy."""
+    import torch
+
+    profile = resolve_inference_profile(args.run_one, args.threads)
+    engine = SynthesisEngine(device="cpu", chunk_budget=args.chunk_budget, inference_profile=profile)
+    languages = {}
+    try:
+        for lang_code in parse_list(args.langs):
+            params = SynthesisParams(lang_code=lang_code, voice=default_voice(lang_code))
+            try:
+                started = time.perf_counter()
+                engine.prewarm([lang_code], voices=[params.voice])
+                load_s = time.perf_counter() - started
+                warmup_s = engine.warm_up(lang_code, params.voice)
+                runs = []
+                for _ in range(max(1, args.repeat)):
+                    torch.manual_seed(SEED)
+                    stats = RenderStats()
+                    audio = np.concatenate(list(engine.generate(CORPUS[lang_code], params, stats=stats)))
+                    runs.append((sum(stats.chunk_times), audio))
+            except Exception as e:
+                languages[lang_code] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            # Com --repeat fica a execução mais rápida; o áudio é o mesmo (mesma seed)
+            model_s, audio = min(runs, key=lambda run: run[0])
+            path = os.path.join(args.audio_dir, f"{profile.name}_{lang_code}.npy")
+            np.save(path, audio)
+            audio_s = len(audio) / SAMPLE_RATE
+            languages[lang_code] = {
+                "load_s": load_s,
+                "warmup_s": warmup_s,
+                "model_s": model_s,
+                "audio_s": audio_s,
+                "rtf": model_s / audio_s if audio_s else 0.0,
+                "audio": path,
+            }
+    finally:
+        engine.close()
+    own, _ = peak_rss_mb()
+    return {"profile": profile.describe(), "torch": torch.__version__, "threads": torch.get_num_threads(),
+            "peak_rss_mb": own, "languages": languages}
+
+
+def log_spectral_distance(a, b, frame=1024, hop=256):
+    """Mean over frames of the RMS difference (dB) between the power spectra of a and b (same length)."""
+    window = np.hanning(frame).astype(np.float32)
+
+    def spectrum(x):
+        if len(x) < frame:
+            x = np.pad(x, (0, frame - len(x)))
+        frames = np.lib.stride_tricks.sliding_window_view(x, frame)[::hop] * window
+        return 10 * np.log10(np.abs(np.fft.rfft(frames, axis=1)) ** 2 + 1e-10)
+
+    difference = spectrum(a) - spectrum(b)
+    return float(np.mean(np.sqrt(np.mean(difference ** 2, axis=1))))
+
+
+def compare_audio(audio, reference):
+    n = min(len(audio), len(reference))
+    if n == 0:
+        return {"snr_db": 0.0, "lsd_db": float("nan"), "length_ratio": 0.0}
+    a, b = audio[:n].astype(np.float64), reference[:n].astype(np.float64)
+    noise = np.sum((a - b) ** 2)
+    snr = 10 * np.log10(np.sum(b ** 2) / noise) if noise > 0 else MAX_SNR_DB
+    return {
+        "snr_db": min(float(snr), MAX_SNR_DB),
+        "lsd_db": log_spectral_distance(audio[:n], reference[:n]),
+        "length_ratio": len(audio) / len(reference),
+    }
+
+
+def parse_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def run(args):
+    names = parse_list(args.profiles) if args.profiles else list(INFERENCE_PROFILES)
+    # A referência corre primeiro: as outras comparam-se com o áudio dela
+    names = [args.reference] + [name for name in names if name != args.reference]
+    for name in names:
+        if name not in INFERENCE_PROFILES:
+            raise SystemExit(f"Perfil desconhecido: {name} (use {', '.join(INFERENCE_PROFILES)})")
+
+    profiles = {}
+    with tempfile.TemporaryDirectory() as audio_dir:
+        for name in names:
+            command = ["--run-one", name, "--langs", args.langs, "--repeat", args.repeat,
+                       "--chunk-budget", args.chunk_budget, "--audio-dir", audio_dir]
+            if args.threads:
+                command += ["--threads", args.threads]
+            print(f"{name}: a medir...", file=sys.stderr)
+            try:
+                profiles[name] = run_isolated(__file__, command)
+            except RuntimeError as e:
+                # Ex: onnx sem onnxruntime instalado; os outros perfis continuam
+                profiles[name] = {"error": str(e).splitlines()[-1]}
+
+        reference = profiles[args.reference].get("languages", {})
+        for name, result in profiles.items():
+            if "error" in result:
+                continue
+            for lang_code, r in result["languages"].items():
+                ref = reference.get(lang_code, {})
+                if "error" in r or "audio" not in ref:
+                    continue
+                r.update(compare_audio(np.load(r["audio"]), np.load(ref["audio"])))
+            result["totals"] = profile_totals(result, reference, args)
+        # Os caminhos dos .npy só servem enquanto a pasta temporária existe
+        for name, result in profiles.items():
+            for r in result.get("languages", {}).values():
+                r.pop("audio", None)
+            profiles[name] = rounded(result)
+
+    acceptable = {name: r for name, r in profiles.items() if r.get("totals", {}).get("acceptable")}
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "reference": args.reference,
+        "max_lsd_db": args.max_lsd,
+        "max_length_change": args.max_length_change,
+        "profiles": profiles,
+        "fastest_acceptable": min(acceptable, key=lambda name: acceptable[name]["totals"]["rtf"]) if acceptable else None,
+    }
+
+
+def profile_totals(result, reference, args):
+    ok = [(lang_code, r) for lang_code, r in result["languages"].items() if "error" not in r]
+    model_s = sum(r["model_s"] for _, r in ok)
+    audio_s = sum(r["audio_s"] for _, r in ok)
+    rtf = model_s / audio_s if audio_s else 0.0
+    ref_ok = [r for r in reference.values() if "error" not in r]
+    ref_rtf = sum(r["model_s"] for r in ref_ok) / sum(r["audio_s"] for r in ref_ok) if ref_ok else 0.0
+    compared = [r for _, r in ok if "lsd_db" in r]
+    lsd = max((r["lsd_db"] for r in compared), default=float("nan"))
+    length_change = max((abs(r["length_ratio"] - 1) for r in compared), default=float("nan"))
+    return {
+        "rtf": rtf,
+        "speedup": ref_rtf / rtf if rtf else 0.0,
+        "load_s": sum(r["load_s"] for _, r in ok),
+        "warmup_s": sum(r["warmup_s"] for _, r in ok),
+        "max_lsd_db": lsd,
+        "min_snr_db": min((r["snr_db"] for r in compared), default=float("nan")),
+        "max_length_change": length_change,
+        # Só conta como aceitável um perfil que renderizou todos os idiomas da referência
+        "acceptable": (len(compared) == len(ref_ok) and len(ok) == len(result["languages"])
+                       and lsd <= args.max_lsd and length_change <= args.max_length_change),
+    }
+
+
+def print_table(report):
+    print(f"{'profile':<10} {'RTF':>7} {'speedup':>8} {'load (s)':>9} {'warm (s)':>9} {'LSD dB':>7} {'SNR dB':>7} "
+          f"{'len Δ':>7} {'RSS (MB)':>9}  ok")
+    for name, r in report["profiles"].items():
+        if "error" in r:
+            print(f"{name:<10} erro: {r['error']}")
+            continue
+        t = r["totals"]
+        print(f"{name:<10} {t['rtf']:>7.3f} {t['speedup']:>7.2f}x {t['load_s']:>9.2f} {t['warmup_s']:>9.2f} "
+              f"{t['max_lsd_db']:>7.2f} {t['min_snr_db']:>7.1f} {t['max_length_change']:>7.1%} "
+              f"{r['peak_rss_mb']:>9.1f}  {'sim' if t['acceptable'] else 'não'}")
+        for lang_code, lang in r["languages"].items():
+            if "error" in lang:
+                print(f"  {lang_code}: erro: {lang['error']}")
+    print(f"mais rápido aceitável (LSD <= {report['max_lsd_db']} dB, duração ±{report['max_length_change']:.0%}): "
+          f"{report['fastest_acceptable'] or 'nenhum'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", help=f"Perfis a medir, separados por vírgula (padrão: {','.join(INFERENCE_PROFILES)})")
+    parser.add_argument("--reference", default="default", choices=list(INFERENCE_PROFILES),
+                        help="Perfil cujo áudio serve de referência")
+    parser.add_argument("--langs", default="a", help="Idiomas do corpus, separados por vírgula")
+    parser.add_argument("--threads", type=int, help="Threads torch de todos os perfis (padrão: as do PyTorch)")
+    parser.add_argument("--repeat", type=int, default=1, help="Execuções por idioma (fica a mais rápida)")
+    parser.add_argument("--chunk-budget", type=int, default=DEFAULT_CHUNK_BUDGET)
+    parser.add_argument("--max-lsd", type=float, default=2.0, help="LSD máximo (dB) para um perfil ser aceitável")
+    parser.add_argument("--max-length-change", type=float, default=0.02,
+                        help="Variação máxima da duração do áudio (0.02 = 2%%)")
+    parser.add_argument("--output", help="Grava o JSON do relatório neste ficheiro")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    parser.add_argument("--audio-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(render_profile(args)))
+        return
+
+    report = run(args)
+    print_table(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
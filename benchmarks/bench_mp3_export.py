@@ -0,0 +1,76 @@
+"""
+MP3 export benchmark: temp-WAV + pydub round trip vs. direct in-memory encoding.
+
+Each method runs in its own subprocess on the same synthetic render, so
+peak RSS is measured cleanly per method.
+
+    python benchmarks/bench_mp3_export.py --minutes 60
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import soundfile as sf
+
+from bench_common import SAMPLE_RATE, peak_rss_mb, run_isolated, synthetic_render
+
+METHODS = ("legacy", "direct")
+
+
+def export_legacy(audio, filepath):
+    # Caminho antigo de generate_audio_process: WAV temporário + pydub (que grava outro temporário)
+    from pydub import AudioSegment
+    temp_wav = filepath.replace(".mp3", "_temp.wav")
+    sf.write(temp_wav, audio, SAMPLE_RATE)
+    AudioSegment.from_wav(temp_wav).export(filepath, format="mp3")
+    os.remove(temp_wav)
+
+
+def export_direct(audio, filepath):
+    from studio_encode import encode_mp3
+    encode_mp3(audio, filepath, SAMPLE_RATE)
+
+
+def run_one(method, minutes):
+    audio = synthetic_render(minutes)
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, "bench.mp3")
+        started = time.perf_counter()
+        (export_legacy if method == "legacy" else export_direct)(audio, filepath)
+        wall = time.perf_counter() - started
+        size_mb = os.path.getsize(filepath) / 1e6
+    own, children = peak_rss_mb()
+    print(json.dumps({"method": method, "minutes": minutes, "wall_s": round(wall, 3),
+                      "peak_rss_mb": round(own, 1), "peak_child_rss_mb": round(children, 1),
+                      "audio_mb": round(audio.nbytes / 1e6, 1), "mp3_mb": round(size_mb, 2)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--methods", default=",".join(METHODS))
+    parser.add_argument("--run", choices=METHODS, help=argparse.SUPPRESS)  # internal: one method per subprocess
+    args = parser.parse_args()
+
+    if args.run:
+        run_one(args.run, args.minutes)
+        return
+
+    results = []
+    for method in args.methods.split(","):
+        try:
+            results.append(run_isolated(__file__, ["--run", method, "--minutes", args.minutes]))
+        except RuntimeError as e:
+            print(f"{method}: failed\n{e}", file=sys.stderr)
+
+    print(f"{'method':<8} {'wall (s)':>9} {'peak RSS (MB)':>14} {'child RSS (MB)':>15} {'mp3 (MB)':>9}")
+    for r in results:
+        print(f"{r['method']:<8} {r['wall_s']:>9.2f} {r['peak_rss_mb']:>14.1f} {r['peak_child_rss_mb']:>15.1f} {r['mp3_mb']:>9.2f}")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Pitch-shift benchmark: full-signal FFT `signal.resample` vs. block-based PitchShifter.
+
+Runs each (method, length) pair in its own subprocess and reports wall time,
+peak RSS and output duration (the old method changes duration, the new one
+does not).
+
+    python benchmarks/bench_pitch.py --minutes 1,10,60 --pitch 1.1
+"""
+import argparse
+import json
+import sys
+import time
+
+from scipy import signal
+
+from bench_common import SAMPLE_RATE, peak_rss_mb, run_isolated, synthetic_render
+
+METHODS = ("resample", "block")
+
+
+def shift_resample(audio, pitch):
+    # Implementação antiga: uma FFT do tamanho do ficheiro inteiro
+    return signal.resample(audio, int(len(audio) / pitch))
+
+
+def shift_block(audio, pitch):
+    from studio_dsp import pitch_shift
+    return pitch_shift(audio, pitch)
+
+
+def run_one(method, minutes, pitch):
+    audio = synthetic_render(minutes)
+    baseline, _ = peak_rss_mb()
+    started = time.perf_counter()
+    out = (shift_resample if method == "resample" else shift_block)(audio, pitch)
+    wall = time.perf_counter() - started
+    peak, _ = peak_rss_mb()
+    print(json.dumps({"method": method, "minutes": minutes, "pitch": pitch, "wall_s": round(wall, 3),
+                      "peak_rss_mb": round(peak, 1), "extra_rss_mb": round(peak - baseline, 1),
+                      "audio_mb": round(audio.nbytes / 1e6, 1),
+                      "out_duration_s": round(len(out) / SAMPLE_RATE, 2)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", default="1,10,60", help="Comprimentos a testar, separados por vírgula")
+    parser.add_argument("--pitch", type=float, default=1.1)
+    parser.add_argument("--methods", default=",".join(METHODS))
+    parser.add_argument("--run", choices=METHODS, help=argparse.SUPPRESS)  # internal: one run per subprocess
+    args = parser.parse_args()
+
+    if args.run:
+        run_one(args.run, float(args.minutes), args.pitch)
+        return
+
+    results = []
+    for minutes in args.minutes.split(","):
+        for method in args.methods.split(","):
+            try:
+                results.append(run_isolated(__file__, ["--run", method, "--minutes", minutes, "--pitch", args.pitch]))
+            except RuntimeError as e:
+                print(f"{method} @ {minutes} min: failed\n{e}", file=sys.stderr)
+
+    print(f"{'method':<9} {'min':>5} {'wall (s)':>9} {'peak RSS (MB)':>14} {'extra (MB)':>11} {'out (s)':>9}")
+    for r in results:
+        print(f"{r['method']:<9} {r['minutes']:>5g} {r['wall_s']:>9.2f} {r['peak_rss_mb']:>14.1f} "
+              f"{r['extra_rss_mb']:>11.1f} {r['out_duration_s']:>9.1f}")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+End-to-end synthesis benchmark: a fixed corpus per language through the engine.
+
+For every language of LANG_MAP it reports real-time factor, time to the first
+audio chunk, per-stage timings (G2P, model, DSP, encode, write) and peak RSS,
+and prints one JSON document that can be saved and compared across commits:
+
+    python benchmarks/bench_synthesis.py --output bench.json
+    python benchmarks/bench_synthesis.py --stub --compare bench_main.json
+
+--stub swaps KPipeline for a deterministic stand-in (no model, no download), so
+the run only measures the code around the model: chunking, DSP, encoding and
+I/O. G2P is timed in a separate pass over the same chunks; "model" is the time
+spent inside the pipeline minus that G2P time.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_common import REPO_ROOT, SAMPLE_RATE, peak_rss_mb
+
+from studio_encode import HAS_MP3_ENCODER, mp3_bytes, wav_bytes
+from studio_engine import LANG_MAP, RenderStats, SynthesisEngine, SynthesisParams, apply_effects, default_voice
+from studio_text import DEFAULT_CHUNK_BUDGET, chunk_text
+
+CORPUS = {
+    "a": ("The quick brown fox jumps over the lazy dog. Benchmarks should be boring, repeatable and honest. "
+          "This paragraph is long enough to be split into several chunks, which exercises the chunker, "
+          "the model and the post-processing chain the same way a real script does.\n"
+          "A second paragraph, with numbers like 1,250 and 3.5 percent, closes the test."),
+    "b": ("Good morning, and welcome to the afternoon programme. The weather in London will be grey, "
+          "with a chance of drizzle towards the evening. Remember to bring an umbrella and a sense of humour.\n"
+          "The next bulletin follows at half past six."),
+    "p": ("Olá! Este é um texto de teste para medir o desempenho da síntese de voz. "
+          "Ele tem frases curtas, frases um pouco mais longas e alguma pontuação, para que o texto seja "
+          "dividido em vários segmentos, como acontece num roteiro de verdade.\n"
+          "No segundo parágrafo aparecem números como 1.250 e 3,5 por cento."),
+    "e": ("Hola, este es un texto de prueba para medir el rendimiento de la síntesis de voz. "
+          "Tiene frases cortas y frases algo más largas, con comas y puntos, para que se divida en varios "
+          "segmentos.\nEl segundo párrafo cierra la prueba."),
+    "f": ("Bonjour, ceci est un texte de test pour mesurer les performances de la synthèse vocale. "
+          "Il contient des phrases courtes et des phrases un peu plus longues, avec de la ponctuation.\n"
+          "Le deuxième paragraphe termine le test."),
+    "i": ("Ciao, questo è un testo di prova per misurare le prestazioni della sintesi vocale. "
+          "Contiene frasi brevi e frasi un po' più lunghe, con virgole e punti.\n"
+          "Il secondo paragrafo chiude la prova."),
+    "j": ("こんにちは。これは音声合成の速度を測るためのテスト用の文章です。"
+          "短い文と少し長い文が含まれています。\n二つ目の段落でテストを終わります。"),
+    "z": ("你好。这是一段用来测量语音合成性能的测试文本。它包含短句和稍长的句子，以及一些标点符号。\n"
+          "第二段结束这次测试。"),
+    "h": ("नमस्ते। यह आवाज़ संश्लेषण की गति मापने के लिए एक परीक्षण पाठ है। "
+          "इसमें छोटे और थोड़े लंबे वाक्य हैं।\nदूसरा अनुच्छेद परीक्षण समाप्त करता है।"),
+}
+
+STUB_SAMPLES_PER_PHONEME = SAMPLE_RATE // 12  # ~12 phonemes per second of speech
+
+
+class StubPipeline:
+    """Stands in for KPipeline: lowercase "phonemes" and a tone whose length follows the phoneme count.
+
+    model_ms_per_phoneme adds a fixed, deterministic model cost (time.sleep),
+    so RTF and time-to-first-chunk stay comparable between machines.
+    """
+
+    def __init__(self, lang_code, model_ms_per_phoneme=0.0):
+        self.lang_code = lang_code
+        self.model_ms_per_phoneme = model_ms_per_phoneme
+
+    def g2p(self, text):
+        return " ".join(text.lower().split()), None
+
+    def __call__(self, text, voice=None, speed=1, split_pattern=None):
+        phonemes, _ = self.g2p(text)
+        if not phonemes:
+            return
+        if self.model_ms_per_phoneme:
+            time.sleep(len(phonemes) * self.model_ms_per_phoneme / 1000)
+        n = int(len(phonemes) * STUB_SAMPLES_PER_PHONEME / speed)
+        t = np.arange(n, dtype=np.float32) / SAMPLE_RATE
+        audio = 0.4 * np.sin(2 * np.pi * 180 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+        yield text, phonemes, audio.astype(np.float32)
+
+
+class StubPipelinePool:
+    def __init__(self, model_ms_per_phoneme=0.0):
+        self.model_ms_per_phoneme = model_ms_per_phoneme
+        self._pipelines = {}
+
+    def get(self, lang_code):
+        if lang_code not in self._pipelines:
+            self._pipelines[lang_code] = StubPipeline(lang_code, self.model_ms_per_phoneme)
+        return self._pipelines[lang_code]
+
+    def prewarm(self, lang_codes):
+        for lang_code in lang_codes:
+            self.get(lang_code)
+
+    def loaded_languages(self):
+        return list(self._pipelines)
+
+
+class StubVoices:
+    def get(self, spec):
+        return None
+
+    def preload(self, specs):
+        return 0
+
+
+def make_engine(stub, model_ms_per_phoneme, chunk_budget):
+    engine = SynthesisEngine(device="cpu", chunk_budget=chunk_budget)
+    if stub:
+        engine.pipelines = StubPipelinePool(model_ms_per_phoneme)
+        engine.voices = StubVoices()
+    return engine
+
+
+def bench_params(lang_code):
+    # Cadeia de efeitos típica de uma exportação, para o estágio DSP ter trabalho real
+    return SynthesisParams(lang_code=lang_code, voice=default_voice(lang_code), pitch=1.05, gain_db=-1.0,
+                           highpass_hz=80.0, normalize="lufs", limiter=True)
+
+
+def bench_language(engine, lang_code, text, tmp_dir):
+    params = bench_params(lang_code)
+    result = {}
+
+    started = time.perf_counter()
+    engine.prewarm([lang_code], voices=[params.voice])
+    result["load_s"] = time.perf_counter() - started
+
+    pipeline = engine.get_pipeline(lang_code)
+    segments = chunk_text(text, lang_code, engine.chunk_budget)
+    started = time.perf_counter()
+    for segment in segments:
+        pipeline.g2p(segment)
+    g2p_s = time.perf_counter() - started
+
+    stats = RenderStats()
+    chunks = []
+    started = time.perf_counter()
+    first_chunk_s = None
+    for chunk in engine.generate(text, params, stats=stats):
+        if first_chunk_s is None:
+            first_chunk_s = time.perf_counter() - started
+        chunks.append(chunk)
+    synth_s = time.perf_counter() - started
+    if not chunks:
+        raise RuntimeError("nenhum áudio gerado")
+    audio = np.concatenate(chunks)
+
+    started = time.perf_counter()
+    processed = apply_effects(audio, params)
+    dsp_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if HAS_MP3_ENCODER:
+        data, extension = mp3_bytes(processed, SAMPLE_RATE), ".mp3"
+    else:
+        data, extension = wav_bytes(processed, SAMPLE_RATE), ".wav"
+    encode_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with open(os.path.join(tmp_dir, f"bench_{lang_code}{extension}"), "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    write_s = time.perf_counter() - started
+
+    audio_s = len(processed) / SAMPLE_RATE
+    total_s = synth_s + dsp_s + encode_s + write_s
+    own, _ = peak_rss_mb()
+    result.update({
+        "segments": len(segments),
+        "chunks": len(stats.chunk_times),
+        "audio_s": audio_s,
+        "total_s": total_s,
+        "rtf": total_s / audio_s if audio_s else 0.0,
+        "first_chunk_s": first_chunk_s,
+        "stages_s": {
+            "g2p": g2p_s,
+            "model": max(0.0, sum(stats.chunk_times) - g2p_s),
+            "dsp": dsp_s,
+            "encode": encode_s,
+            "write": write_s,
+        },
+        "encoded_format": extension.lstrip("."),
+        "peak_rss_mb": own,  # cumulativo: o pico do processo até esta língua
+    })
+    return result
+
+
+def rounded(value):
+    if isinstance(value, float):
+        return round(value, 4)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    return value
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    lang_codes = [code.strip() for code in args.langs.split(",") if code.strip()] if args.langs else list(LANG_MAP.values())
+    engine = make_engine(args.stub, args.stub_ms_per_phoneme, args.chunk_budget)
+    languages = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for lang_code in lang_codes:
+                runs = []
+                try:
+                    for _ in range(max(1, args.repeat)):
+                        runs.append(bench_language(engine, lang_code, CORPUS[lang_code], tmp_dir))
+                except Exception as e:
+                    # Idiomas sem o frontend instalado (ex: japonês sem misaki[ja]) não param o resto
+                    print(f"{lang_code}: failed: {e}", file=sys.stderr)
+                    languages[lang_code] = {"error": str(e)}
+                    continue
+                # Com --repeat fica a execução mais rápida (a menos afetada por ruído)
+                languages[lang_code] = rounded(min(runs, key=lambda r: r["total_s"]))
+    finally:
+        engine.close()
+
+    ok = [r for r in languages.values() if "error" not in r]
+    audio_s = sum(r["audio_s"] for r in ok)
+    total_s = sum(r["total_s"] for r in ok)
+    own, _ = peak_rss_mb()
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stub": args.stub,
+        "chunk_budget": args.chunk_budget,
+        "languages": languages,
+        "totals": rounded({
+            "audio_s": audio_s,
+            "total_s": total_s,
+            "rtf": total_s / audio_s if audio_s else 0.0,
+            "stages_s": {stage: sum(r["stages_s"][stage] for r in ok)
+                         for stage in ("g2p", "model", "dsp", "encode", "write")},
+            "peak_rss_mb": own,
+        }),
+    }
+
+
+def print_table(report, baseline=None):
+    print(f"{'lang':<5} {'RTF':>7} {'1st (s)':>8} {'g2p':>7} {'model':>7} {'dsp':>7} {'encode':>7} {'write':>7} "
+          f"{'RSS (MB)':>9}" + (f" {'RTF Δ':>8}" if baseline else ""))
+    for lang_code, r in report["languages"].items():
+        if "error" in r:
+            print(f"{lang_code:<5} erro: {r['error']}")
+            continue
+        stages = r["stages_s"]
+        line = (f"{lang_code:<5} {r['rtf']:>7.3f} {r['first_chunk_s']:>8.3f} {stages['g2p']:>7.3f} {stages['model']:>7.3f} "
+                f"{stages['dsp']:>7.3f} {stages['encode']:>7.3f} {stages['write']:>7.3f} {r['peak_rss_mb']:>9.1f}")
+        old = (baseline or {}).get("languages", {}).get(lang_code, {})
+        if baseline and old.get("rtf"):
+            line += f" {(r['rtf'] - old['rtf']) / old['rtf']:>+8.1%}"
+        print(line)
+    totals = report["totals"]
+    print(f"total: {totals['audio_s']:.1f}s de áudio em {totals['total_s']:.2f}s (RTF {totals['rtf']:.3f}), "
+          f"pico RSS {totals['peak_rss_mb']:.1f} MB")
+    if baseline:
+        print(f"baseline: commit {baseline.get('commit')}, RTF {baseline.get('totals', {}).get('rtf')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--langs", help="Idiomas a medir, separados por vírgula (padrão: todos do LANG_MAP)")
+    parser.add_argument("--stub", action="store_true", help="Usa um pipeline simulado em vez do modelo Kokoro")
+    parser.add_argument("--stub-ms-per-phoneme", type=float, default=0.0,
+                        help="Custo fixo do modelo simulado, em ms por fonema")
+    parser.add_argument("--chunk-budget", type=int, default=DEFAULT_CHUNK_BUDGET)
+    parser.add_argument("--repeat", type=int, default=1, help="Execuções por idioma (fica a mais rápida)")
+    parser.add_argument("--output", help="Grava o JSON do relatório neste ficheiro")
+    parser.add_argument("--compare", help="JSON de uma execução anterior, para mostrar a variação do RTF")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report = run(args)
+    print_table(report, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
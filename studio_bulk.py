@@ -0,0 +1,203 @@
+"""
+Batch file operations for the file manager: convert to MP3, delete, rename by pattern.
+
+BulkRunner runs one function over many files off the Tk thread, on a thread
+or process pool, keeping at most workers * 2 files in flight. Every finished
+file is reported through on_item(result, done, total) and the run ends with a
+BulkSummary passed to on_done. cancel() stops submitting new files; the ones
+already running finish and the rest are reported as cancelled.
+"""
+import logging
+import multiprocessing as mp
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+from studio_encode import DEFAULT_MP3_BITRATE, convert_to_mp3
+from studio_timing import index_path, load_index, move_sidecars, remove_sidecars
+from studio_trace import count, trace
+
+logger = logging.getLogger("KokoroStudio")
+
+OK = "ok"
+SKIPPED = "skipped"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class BulkResult:
+    source: str
+    status: str
+    target: str = None
+    message: str = ""
+
+
+@dataclass
+class BulkSummary:
+    ok: int = 0
+    skipped: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    elapsed: float = 0.0
+
+    def add(self, result):
+        setattr(self, result.status, getattr(self, result.status) + 1)
+
+    def describe(self):
+        parts = [f"{self.ok} concluídos"]
+        if self.skipped:
+            parts.append(f"{self.skipped} ignorados")
+        if self.failed:
+            parts.append(f"{self.failed} falharam")
+        if self.cancelled:
+            parts.append(f"{self.cancelled} cancelados")
+        return ", ".join(parts) + f" em {self.elapsed:.1f}s"
+
+
+# --- Per-file operations (top-level so process pools can pickle them) ---
+
+def convert_one(path, bitrate=DEFAULT_MP3_BITRATE):
+    if path.lower().endswith(".mp3"):
+        return BulkResult(path, SKIPPED, message="já é MP3")
+    target = convert_to_mp3(path, bitrate=bitrate)
+    # O MP3 tem as mesmas amostras: o índice de tempos do original também lhe serve
+    index = load_index(path)
+    if index is not None:
+        index.audio = os.path.basename(target)
+        index.save(index_path(target))
+    return BulkResult(path, OK, target=target)
+
+
+def delete_one(path):
+    os.remove(path)
+    remove_sidecars(path)
+    return BulkResult(path, OK)
+
+
+def rename_one(pair):
+    source, target = pair
+    if os.path.exists(target):
+        raise FileExistsError(f"{os.path.basename(target)} já existe")
+    os.rename(source, target)
+    move_sidecars(source, target)
+    return BulkResult(source, OK, target=target)
+
+
+def plan_renames(paths, template):
+    """Pairs (old path, new path) for a name template; raises ValueError on bad templates or collisions.
+
+    The template may use {name} (current name without extension) and {n}
+    (1-based position, format specs allowed: {n:03d}); the extension is kept.
+    """
+    plan, targets = [], set()
+    sources = set(paths)
+    for n, path in enumerate(paths, 1):
+        folder, filename = os.path.split(path)
+        stem, ext = os.path.splitext(filename)
+        try:
+            new_stem = template.format(name=stem, n=n)
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"Padrão inválido: {e}")
+        new_stem = re.sub(r'[\\/*?:"<>|]', "", new_stem).strip()
+        if not new_stem:
+            raise ValueError("O padrão gera um nome vazio.")
+        target = os.path.join(folder, new_stem + ext)
+        if target in targets:
+            raise ValueError(f"O padrão gera nomes repetidos ({new_stem + ext}); use {{n}}.")
+        if os.path.exists(target) and target not in sources:
+            raise ValueError(f"{new_stem + ext} já existe na pasta.")
+        targets.add(target)
+        if target != path:
+            plan.append((path, target))
+    # Um destino que ainda é a origem de outro renome obrigaria a ordenar a cadeia; não suportado
+    if targets & {source for source, _ in plan}:
+        raise ValueError("Os novos nomes coincidem com nomes atuais da seleção; escolha um padrão diferente.")
+    return plan
+
+
+def default_workers():
+    return max(1, os.cpu_count() or 1)
+
+
+class BulkRunner(threading.Thread):
+    """Applies func to every item on a pool, reporting each result as it finishes."""
+
+    def __init__(self, func, items, workers=1, processes=False, on_item=None, on_done=None):
+        super().__init__(daemon=True)
+        self.func = func
+        self.items = list(items)
+        self.workers = max(1, workers)
+        self.processes = processes
+        self.on_item = on_item or (lambda result, done, total: None)
+        self.on_done = on_done or (lambda summary: None)
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @staticmethod
+    def _source(item):
+        return item if isinstance(item, str) else item[0]
+
+    def _make_executor(self):
+        if self.processes:
+            # spawn: mesmo motivo que em studio_parallel (e é o único método no Windows)
+            return ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context("spawn"))
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk")
+
+    def run(self):
+        # functools.partial (ex: convert_one com bitrate) não tem __name__
+        name = getattr(getattr(self.func, "func", self.func), "__name__", "bulk")
+        with trace("bulk", operation=name, items=len(self.items), workers=self.workers, processes=self.processes):
+            self._run()
+
+    def _run(self):
+        started = time.perf_counter()
+        summary = BulkSummary()
+        total = len(self.items)
+        done = 0
+
+        def report(result):
+            nonlocal done
+            done += 1
+            summary.add(result)
+            count(result.status)
+            if result.status == FAILED:
+                logger.warning(f"Bulk operation failed for {os.path.basename(result.source)}: {result.message}")
+            self.on_item(result, done, total)
+
+        pending = iter(self.items)
+        in_flight = {}
+        with self._make_executor() as executor:
+            def submit_next():
+                if self._cancel.is_set():
+                    return False
+                item = next(pending, None)
+                if item is None:
+                    return False
+                in_flight[executor.submit(self.func, item)] = item
+                return True
+
+            for _ in range(self.workers * 2):
+                if not submit_next():
+                    break
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = BulkResult(self._source(item), FAILED, message=str(e))
+                    report(result)
+                    submit_next()
+
+        for item in pending:  # só sobra algo se a operação foi cancelada
+            report(BulkResult(self._source(item), CANCELLED))
+        summary.elapsed = time.perf_counter() - started
+        logger.info(f"Bulk operation finished: {summary.describe()}")
+        self.on_done(summary)
@@ -0,0 +1,259 @@
+"""
+On-disk, content-addressed caches: synthesized segment audio and G2P phonemes.
+
+Each segment is stored as a float32 .npy file named by a hash of
+(normalized text, lang_code, voice, speed, model version), so re-rendering an
+edited script only synthesizes the lines that changed. Hits are memory-mapped
+instead of read into RAM. The cache has a size cap and evicts the least
+recently used entries (file mtime is refreshed on every hit).
+
+PhonemeCache keeps the phoneme strings the G2P frontend produced for a
+(lang_code, normalized text), in one SQLite file. It is independent of the
+voice and speed, so boilerplate read by many voices is converted only once
+and goes straight from the cached phonemes to the model.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger("KokoroStudio")
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".kokoro_studio", "segment_cache")
+DEFAULT_G2P_CACHE = os.path.join(os.path.expanduser("~"), ".kokoro_studio", "g2p_cache.sqlite")
+
+_model_version = None
+_g2p_version = None
+
+
+def model_version():
+    """Identifies the model that produced the audio (repo id + installed kokoro version)."""
+    global _model_version
+    if _model_version is None:
+        from studio_engine import KOKORO_REPO_ID
+        try:
+            from importlib.metadata import version
+            kokoro_version = version("kokoro")
+        except Exception:
+            kokoro_version = "unknown"
+        _model_version = f"{KOKORO_REPO_ID}@{kokoro_version}"
+    return _model_version
+
+
+def g2p_version():
+    """Identifies the G2P frontend (installed kokoro + misaki versions): phonemes of another version are misses."""
+    global _g2p_version
+    if _g2p_version is None:
+        from importlib.metadata import version
+        parts = []
+        for package in ("kokoro", "misaki"):
+            try:
+                parts.append(f"{package}@{version(package)}")
+            except Exception:
+                parts.append(f"{package}@unknown")
+        _g2p_version = ",".join(parts)
+    return _g2p_version
+
+
+def normalize_text(text):
+    """Unicode NFC with whitespace collapsed, so cosmetic edits still hit the cache."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def segment_key(text, lang_code, voice, speed, profile_tag=""):
+    """Content hash identifying one segment render.
+
+    profile_tag is InferenceProfile.cache_tag(): int8, compiled or ONNX audio
+    never answers for plain torch audio (or the other way round).
+    """
+    parts = [normalize_text(text), lang_code, str(voice), f"{float(speed):.4f}", model_version()]
+    if profile_tag:
+        parts.append(profile_tag)
+    payload = "\x1f".join(parts)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def phoneme_key(text, lang_code):
+    """Content hash identifying the G2P output of one segment."""
+    payload = "\x1f".join([normalize_text(text), lang_code, g2p_version()])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SegmentCache:
+    """LRU-bounded directory of <key>.npy segment buffers."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=2048):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npy")
+
+    def _scan(self):
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".npy"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                found.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()  # the cap may have been lowered since the last run
+        logger.info(f"Segment cache: {len(self._entries)} entries, {self._total_bytes / 1e6:.1f} MB in {self.cache_dir}")
+
+    def get(self, key):
+        """Returns the cached buffer (read-only memmap) or None."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                audio = np.load(path, mmap_mode="r")
+                os.utime(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Segment cache: dropping unreadable entry {key[:12]}: {e}")
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return audio
+
+    def put(self, key, audio):
+        """Stores a segment buffer and evicts old entries past the size cap."""
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, audio)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries[key]
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        self._total_bytes -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+
+class PhonemeCache:
+    """LRU-bounded SQLite table of key -> phoneme strings (one per model call of the segment).
+
+    Several processes (the parallel workers) may share the file; writes that
+    lose a lock race are dropped, since the cache is only an optimization.
+    """
+
+    def __init__(self, path=DEFAULT_G2P_CACHE, max_mb=64):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS phonemes (key TEXT PRIMARY KEY, phonemes TEXT NOT NULL, "
+                         "size INTEGER NOT NULL, used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS phonemes_used ON phonemes (used)")
+        self._total_bytes, entries = self._db.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM phonemes").fetchone()
+        self._evict()  # the cap may have been lowered since the last run
+        logger.info(f"G2P cache: {entries} entries, {self._total_bytes / 1e6:.1f} MB in {path}")
+
+    def get(self, key):
+        """Returns the cached phoneme strings of a segment, or None."""
+        with self._lock:
+            try:
+                row = self._db.execute("SELECT phonemes FROM phonemes WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE phonemes SET used = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.Error as e:
+                logger.warning(f"G2P cache: lookup failed: {e}")
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Os fonemas do Kokoro nunca têm quebras de linha: servem de separador
+            return row[0].split("\n")
+
+    def put(self, key, phonemes):
+        """Stores the phoneme strings of a segment and evicts old entries past the size cap."""
+        value = "\n".join(phonemes)
+        size = len(key) + len(value.encode("utf-8"))
+        with self._lock:
+            try:
+                old = self._db.execute("SELECT size FROM phonemes WHERE key = ?", (key,)).fetchone()
+                self._db.execute("INSERT OR REPLACE INTO phonemes (key, phonemes, size, used) VALUES (?, ?, ?, ?)",
+                                 (key, value, size, time.time()))
+            except sqlite3.Error as e:
+                logger.warning(f"G2P cache: could not store an entry: {e}")
+                return
+            self._total_bytes += size - (old[0] if old else 0)
+            self._evict()
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        try:
+            # Outros processos também escrevem: o total em memória é só uma estimativa
+            self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM phonemes").fetchone()[0]
+            while self._total_bytes > self.max_bytes:
+                rows = self._db.execute("SELECT key, size FROM phonemes ORDER BY used LIMIT 256").fetchall()
+                if len(rows) <= 1:
+                    break
+                dropped = []
+                for key, size in rows[:-1]:
+                    dropped.append((key,))
+                    self._total_bytes -= size
+                    if self._total_bytes <= self.max_bytes:
+                        break
+                self._db.executemany("DELETE FROM phonemes WHERE key = ?", dropped)
+        except sqlite3.Error as e:
+            logger.warning(f"G2P cache: eviction failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM phonemes")
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,684 @@
+"""
+Block-based DSP for Kokoro Studio.
+
+Pitch shifting keeps the duration constant: the signal is time-stretched by
+the pitch factor with WSOLA and then resampled back by the exact rational
+inverse with a polyphase filter. Both stages are streaming (process() a block,
+flush() at the end), so memory stays bounded by the block size no matter how
+long the render is.
+
+The post-processing chain (DspChain) is a list of Stage objects: gain,
+high-pass, pitch, silence trim, peak/LUFS normalization, limiter and fades.
+Stages work in place on float32 buffers and run either on a whole buffer
+(DspChain.run) or block by block for streaming (process()/flush()).
+TwoPassChain runs a chain with normalization on a file of any length with
+memory bounded by the block size: normalization gains are computed from
+peak/loudness measured in a first pass instead of from the whole buffer.
+"""
+import logging
+import math
+from fractions import Fraction
+
+import numpy as np
+from scipy import fft, ndimage, signal
+
+logger = logging.getLogger("KokoroStudio")
+
+EMPTY = np.zeros(0, dtype=np.float32)
+
+
+class StreamingResampler:
+    """Polyphase resampling by up/down, block by block, sample-exact.
+
+    Each block is filtered together with `context` samples of history and
+    look-ahead (a multiple of `down`, longer than the filter half-length),
+    which makes the block boundaries invisible in the output.
+    """
+
+    def __init__(self, up, down):
+        g = math.gcd(int(up), int(down))
+        self.up, self.down = int(up) // g, int(down) // g
+        # resample_poly's default filter spans 10 * max(up, down) upsampled samples per side
+        half_len = 10 * max(self.up, self.down) // self.up + 2
+        self.context = self.down * math.ceil(half_len / self.down)
+        self._buf = np.zeros(self.context, dtype=np.float32)  # leading context = silence
+        self._total_in = 0
+        self._total_out = 0
+
+    def process(self, block):
+        self._total_in += len(block)
+        self._buf = np.concatenate([self._buf, np.asarray(block, dtype=np.float32)])
+        # Ready: whole multiples of `down` that already have `context` samples of look-ahead
+        ready = (len(self._buf) - 2 * self.context) // self.down * self.down
+        if ready <= 0:
+            return np.zeros(0, dtype=np.float32)
+        return self._emit(ready)
+
+    def _emit(self, ready):
+        segment = self._buf[:ready + 2 * self.context]
+        y = signal.resample_poly(segment, self.up, self.down).astype(np.float32)
+        start = self.context * self.up // self.down
+        out = y[start:start + ready * self.up // self.down]
+        self._buf = self._buf[ready:]
+        self._total_out += len(out)
+        return out
+
+    def flush(self):
+        produced_before = self._total_out
+        remaining = len(self._buf) - self.context
+        out = np.zeros(0, dtype=np.float32)
+        if remaining > 0:
+            ready = self.down * math.ceil(remaining / self.down)
+            pad = ready + 2 * self.context - len(self._buf)
+            self._buf = np.concatenate([self._buf, np.zeros(max(pad, 0), dtype=np.float32)])
+            out = self._emit(ready)
+        # Trim the zero padding so the total length is exactly total_in * up / down
+        out = out[:max(round(self._total_in * self.up / self.down) - produced_before, 0)]
+        self._total_out = produced_before + len(out)
+        return out
+
+
+class WsolaStretcher:
+    """Streaming WSOLA time-stretch: output is `rate` times longer than the input.
+
+    Frames of frame_len samples are overlap-added every frame_len / 2 output
+    samples; each analysis frame is moved by up to `tolerance` samples to the
+    position that best continues the previous frame (cross-correlation), which
+    keeps voiced speech free of phasing artifacts.
+    """
+
+    def __init__(self, rate, frame_len=1024, tolerance=256):
+        self.rate = float(rate)
+        self.frame_len = frame_len
+        self.hop_out = frame_len // 2
+        self.hop_in = self.hop_out / self.rate
+        self.tolerance = tolerance
+        self.window = signal.windows.hann(frame_len, sym=False).astype(np.float32)
+        self._nfft = fft.next_fast_len(frame_len + 2 * tolerance, real=True)
+
+        # Input buffer starts with `tolerance` zeros so the search never looks before sample 0
+        self._in = np.zeros(tolerance, dtype=np.float32)
+        self._in_start = -tolerance  # absolute input index of self._in[0]
+        self._total_in = 0
+        self._frame = 0  # next frame index
+        self._prev_pos = None  # absolute input position of the previous chosen frame
+        self._acc = np.zeros(frame_len, dtype=np.float32)  # overlap-add accumulator
+        self._wsum = np.zeros(frame_len, dtype=np.float32)
+        self._emitted = 0  # output samples already returned
+
+    def _needed(self, nominal):
+        return nominal + self.tolerance + self.frame_len + self.hop_out
+
+    def _run(self, limit):
+        outputs = []
+        n, hop = self.frame_len, self.hop_out
+        while True:
+            nominal = int(round(self._frame * self.hop_in))
+            if self._needed(nominal) > limit:
+                break
+            base = nominal - self.tolerance - self._in_start
+            if self._prev_pos is None:
+                pos = nominal
+            else:
+                # Template: what would naturally follow the previous frame
+                t0 = self._prev_pos + hop - self._in_start
+                template = self._in[t0:t0 + n]
+                region = self._in[base:base + n + 2 * self.tolerance]
+                # Cross-correlation for lags 0..2*tolerance (nfft is long enough that nothing wraps)
+                spectrum = fft.rfft(region, self._nfft) * np.conj(fft.rfft(template, self._nfft))
+                corr = fft.irfft(spectrum, self._nfft)[:2 * self.tolerance + 1]
+                pos = nominal - self.tolerance + int(np.argmax(corr))
+            p = pos - self._in_start
+            self._acc += self.window * self._in[p:p + n]
+            self._wsum += self.window
+            self._prev_pos = pos
+            self._frame += 1
+
+            # Everything before the next frame's start is final
+            done = self._acc[:hop] / np.maximum(self._wsum[:hop], 1e-3)
+            outputs.append(done)
+            self._acc = np.concatenate([self._acc[hop:], np.zeros(hop, dtype=np.float32)])
+            self._wsum = np.concatenate([self._wsum[hop:], np.zeros(hop, dtype=np.float32)])
+
+            # Drop input that no later frame can reach
+            keep_from = min(int(round(self._frame * self.hop_in)) - self.tolerance, self._prev_pos + hop)
+            drop = keep_from - self._in_start
+            if drop > 0:
+                self._in = self._in[drop:]
+                self._in_start += drop
+        out = np.concatenate(outputs) if outputs else np.zeros(0, dtype=np.float32)
+        self._emitted += len(out)
+        return out
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        self._in = np.concatenate([self._in, block])
+        self._total_in += len(block)
+        return self._run(self._in_start + len(self._in))
+
+    def flush(self):
+        target = round(self._total_in * self.rate)
+        # Pad with silence until every frame covering the input has been placed
+        last_nominal = int(round(math.ceil(target / self.hop_out) * self.hop_in))
+        pad = self._needed(last_nominal) - (self._in_start + len(self._in))
+        if pad > 0:
+            self._in = np.concatenate([self._in, np.zeros(pad, dtype=np.float32)])
+        out = self._run(self._in_start + len(self._in))
+        emitted_before = self._emitted - len(out)
+        out = np.concatenate([out, self._acc / np.maximum(self._wsum, 1e-3)])
+        out = out[:max(target - emitted_before, 0)]
+        self._emitted = emitted_before + len(out)
+        return out
+
+
+class PitchShifter:
+    """Duration-preserving pitch shift by `factor` (>1 higher, <1 lower), streaming.
+
+    WSOLA stretches time by the rational approximation a/b of factor, then a
+    polyphase resampler by b/a brings the length back, which raises the pitch
+    by exactly a/b. Output length always equals input length.
+    """
+
+    def __init__(self, factor, max_denominator=100):
+        ratio = Fraction(float(factor)).limit_denominator(max_denominator)
+        self.factor = ratio
+        self.bypass = ratio == 1
+        if not self.bypass:
+            self._stretch = WsolaStretcher(float(ratio))
+            self._resample = StreamingResampler(ratio.denominator, ratio.numerator)
+        self._total_in = 0
+        self._total_out = 0
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        self._total_in += len(block)
+        if self.bypass:
+            out = block
+        else:
+            out = self._resample.process(self._stretch.process(block))
+        self._total_out += len(out)
+        return out
+
+    def flush(self):
+        if self.bypass:
+            return np.zeros(0, dtype=np.float32)
+        tail = np.concatenate([self._resample.process(self._stretch.flush()), self._resample.flush()])
+        # Rounding in the two stages can leave the total a few samples off: pad/trim to the input length
+        missing = self._total_in - self._total_out
+        tail = tail[:max(missing, 0)]
+        if len(tail) < missing:
+            tail = np.concatenate([tail, np.zeros(missing - len(tail), dtype=np.float32)])
+        self._total_out += len(tail)
+        return tail
+
+
+def pitch_shift(audio, factor, block_size=24000 * 5):
+    """Pitch-shifts a whole buffer by factor (same length out), working block by block."""
+    shifter = PitchShifter(factor)
+    if shifter.bypass:
+        return np.asarray(audio, dtype=np.float32)
+    out = np.empty(len(audio), dtype=np.float32)
+    pos = 0
+    for start in range(0, len(audio), block_size):
+        chunk = shifter.process(audio[start:start + block_size])
+        out[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+    tail = shifter.flush()
+    out[pos:pos + len(tail)] = tail
+    return out
+
+
+# --- DSP chain ---
+
+def db_to_linear(db):
+    return 10 ** (db / 20)
+
+
+def peak_abs(audio, scratch=None, block_size=1 << 16):
+    """max(|audio|) computed block-wise through a small scratch buffer (no full-size temporary)."""
+    if scratch is None or len(scratch) < min(block_size, len(audio)):
+        scratch = np.empty(min(block_size, len(audio)), dtype=np.float32)
+    peak = 0.0
+    for start in range(0, len(audio), block_size):
+        block = audio[start:start + block_size]
+        out = scratch[:len(block)]
+        np.abs(block, out=out)
+        peak = max(peak, float(out.max()))
+    return peak
+
+
+class Stage:
+    """One DSP step. process() may modify the float32 block in place and returns the
+    output (possibly shorter/longer, for stages with look-ahead); flush() returns what
+    is still held back. apply() runs the stage on a whole buffer.
+    """
+    # True for stages that need the whole signal (e.g. normalization): not streamable
+    needs_full_buffer = False
+
+    def process(self, block):
+        return block
+
+    def flush(self):
+        return EMPTY
+
+    def apply(self, audio):
+        out = self.process(audio)
+        tail = self.flush()
+        return np.concatenate([out, tail]) if len(tail) else out
+
+    def peak_after(self, peak):
+        """Upper bound of the output peak for an input peak (stages only attenuate by default)."""
+        return peak
+
+
+class Gain(Stage):
+    def __init__(self, db):
+        self.factor = np.float32(db_to_linear(db))
+
+    def process(self, block):
+        np.multiply(block, self.factor, out=block)
+        return block
+
+
+class HardClip(Stage):
+    """Clamps to [-ceiling, ceiling]; the streaming fallback for clipping protection."""
+
+    def __init__(self, ceiling=1.0):
+        self.ceiling = ceiling
+
+    def process(self, block):
+        np.clip(block, -self.ceiling, self.ceiling, out=block)
+        return block
+
+
+class HighPass(Stage):
+    """Butterworth high-pass (removes rumble/DC), with filter state kept across blocks."""
+
+    def __init__(self, cutoff_hz, samplerate, order=2):
+        self.sos = signal.butter(order, cutoff_hz, btype="highpass", fs=samplerate, output="sos")
+        self._zi = np.zeros((self.sos.shape[0], 2))
+
+    def process(self, block):
+        y, self._zi = signal.sosfilt(self.sos, block, zi=self._zi)
+        block[:] = y
+        return block
+
+
+class PitchShift(Stage):
+    def __init__(self, factor):
+        self._shifter = PitchShifter(factor)
+
+    def process(self, block):
+        return self._shifter.process(block)
+
+    def flush(self):
+        return self._shifter.flush()
+
+    def apply(self, audio):
+        return pitch_shift(audio, float(self._shifter.factor))
+
+
+class PeakNormalize(Stage):
+    """Scales the whole buffer so its peak is at target_db dBFS.
+
+    With only_reduce=True it just protects against clipping (the original
+    'normalize if > 1.0' behaviour) and never amplifies.
+    """
+    needs_full_buffer = True
+
+    def __init__(self, target_db=0.0, only_reduce=False):
+        self.target = db_to_linear(target_db)
+        self.only_reduce = only_reduce
+        self._scratch = None
+
+    def gain_for(self, peak, lufs=None):
+        """Linear gain this stage applies to a signal with the given peak."""
+        if peak <= 0 or (self.only_reduce and peak <= self.target):
+            return 1.0
+        if self.only_reduce:
+            logger.warning("Audio normalized to prevent clipping.")
+        return self.target / peak
+
+    def apply(self, audio):
+        if self._scratch is None:
+            self._scratch = np.empty(min(len(audio), 1 << 16), dtype=np.float32)
+        gain = self.gain_for(peak_abs(audio, self._scratch))
+        if gain != 1.0:
+            np.multiply(audio, np.float32(gain), out=audio)
+        return audio
+
+
+def _biquad_sos(kind, fc, fs, gain_db=0.0, q=1 / math.sqrt(2)):
+    # RBJ cookbook coefficients, as used by the ITU-R BS.1770 K-weighting
+    a = 10 ** (gain_db / 40)
+    w0 = 2 * math.pi * fc / fs
+    cos_w0, alpha = math.cos(w0), math.sin(w0) / (2 * q)
+    if kind == "high_shelf":
+        sq = 2 * math.sqrt(a) * alpha
+        b = [a * ((a + 1) + (a - 1) * cos_w0 + sq), -2 * a * ((a - 1) + (a + 1) * cos_w0),
+             a * ((a + 1) + (a - 1) * cos_w0 - sq)]
+        den = [(a + 1) - (a - 1) * cos_w0 + sq, 2 * ((a - 1) - (a + 1) * cos_w0), (a + 1) - (a - 1) * cos_w0 - sq]
+    else:  # high_pass
+        b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+        den = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    return np.array([[b[0] / den[0], b[1] / den[0], b[2] / den[0], 1.0, den[1] / den[0], den[2] / den[0]]])
+
+
+class LoudnessMeter:
+    """Integrated loudness (LUFS, ITU-R BS.1770 gating) measured block by block.
+
+    Only the mean square of every 100 ms step is kept, so memory is tiny even
+    for hours of audio.
+    """
+
+    def __init__(self, samplerate):
+        self.samplerate = samplerate
+        self.sos = np.vstack([_biquad_sos("high_shelf", 1500.0, samplerate, gain_db=4.0),
+                              _biquad_sos("high_pass", 38.0, samplerate, q=0.5)])
+        self._zi = np.zeros((2, 2))
+        self._step = int(round(0.1 * samplerate))
+        self._partial = EMPTY
+        self._energies = []
+
+    def feed(self, block):
+        y, self._zi = signal.sosfilt(self.sos, np.asarray(block, dtype=np.float64), zi=self._zi)
+        y = np.concatenate([self._partial, y]) if len(self._partial) else y
+        whole = len(y) // self._step * self._step
+        if whole:
+            self._energies.extend(np.mean(np.square(y[:whole]).reshape(-1, self._step), axis=1))
+        self._partial = y[whole:]
+
+    def loudness(self):
+        steps = np.asarray(self._energies)
+        if len(steps) < 4:
+            return float("-inf")
+        # 400 ms gating blocks with 75% overlap = 4 consecutive 100 ms steps
+        blocks = np.convolve(steps, np.full(4, 0.25), mode="valid")
+        with np.errstate(divide="ignore"):
+            lufs = -0.691 + 10 * np.log10(blocks)
+        gated = blocks[lufs > -70.0]
+        if not len(gated):
+            return float("-inf")
+        relative = -0.691 + 10 * math.log10(gated.mean()) - 10.0
+        gated = blocks[(lufs > -70.0) & (lufs > relative)]
+        return -0.691 + 10 * math.log10(gated.mean()) if len(gated) else float("-inf")
+
+
+def integrated_loudness(audio, samplerate, block_size=1 << 18):
+    meter = LoudnessMeter(samplerate)
+    for start in range(0, len(audio), block_size):
+        meter.feed(audio[start:start + block_size])
+    return meter.loudness()
+
+
+class LoudnessNormalize(Stage):
+    """Scales the whole buffer to target_lufs integrated loudness (needs the full signal)."""
+    needs_full_buffer = True
+
+    def __init__(self, target_lufs, samplerate):
+        self.target_lufs = target_lufs
+        self.samplerate = samplerate
+
+    def gain_for(self, peak, lufs):
+        """Linear gain this stage applies to a signal of integrated loudness lufs."""
+        return db_to_linear(self.target_lufs - lufs) if math.isfinite(lufs) else 1.0
+
+    def apply(self, audio):
+        gain = self.gain_for(None, integrated_loudness(audio, self.samplerate))
+        if gain != 1.0:
+            np.multiply(audio, np.float32(gain), out=audio)
+        return audio
+
+
+class WindowedStage(Stage):
+    """Base for stages whose output at sample i depends on input [i - past, i + future].
+
+    Blocks are processed together with `past` samples of history and `future`
+    samples of look-ahead, so the output is identical to a whole-buffer run;
+    the last `future` samples are held back until more input (or flush()) comes.
+    """
+
+    def __init__(self, past, future):
+        self.past = past
+        self.future = future
+        self._history = EMPTY  # already emitted, kept as context
+        self._pending = EMPTY  # received, not yet emitted
+
+    def _compute(self, buf):
+        raise NotImplementedError
+
+    def _run(self, block, final):
+        buf = np.concatenate([self._history, self._pending, block])
+        start = len(self._history)
+        end = len(buf) if final else max(start, len(buf) - self.future)
+        if final:
+            buf = np.concatenate([buf, np.zeros(self.future, dtype=np.float32)])
+        out = self._compute(buf.copy())[start:end]  # buf stays raw: it feeds the next context
+        self._pending = buf[end:len(buf) - (self.future if final else 0)]
+        self._history = buf[max(0, end - self.past):end]
+        return out
+
+    def process(self, block):
+        return self._run(np.asarray(block, dtype=np.float32), final=False)
+
+    def flush(self):
+        return self._run(EMPTY, final=True)
+
+
+class Limiter(WindowedStage):
+    """Look-ahead peak limiter: gain is lowered smoothly *before* each peak so the
+    output never exceeds ceiling_db, then held for release_ms and ramped back.
+
+    Fully vectorized: running minimum (van Herk) of the required gain plus a
+    moving average, instead of a per-sample envelope loop.
+    """
+
+    def __init__(self, samplerate, ceiling_db=-1.0, lookahead_ms=5.0, release_ms=60.0):
+        self.ceiling = np.float32(db_to_linear(ceiling_db))
+        self.lookahead = max(1, int(samplerate * lookahead_ms / 1000))
+        self.hold = max(0, int(samplerate * release_ms / 1000))
+        super().__init__(past=self.hold + 2 * self.lookahead, future=self.lookahead)
+
+    def _compute(self, buf):
+        la = self.lookahead
+        target = np.abs(buf)
+        np.maximum(target, self.ceiling, out=target)
+        np.divide(self.ceiling, target, out=target)  # required gain <= 1 per sample
+        # g_min[i] = min(target[i - hold : i + la]) ...
+        size = self.hold + la + 1
+        g_min = ndimage.minimum_filter1d(target, size=size, origin=(size - 1) // 2 - la, mode="nearest")
+        # ... then a moving average over la samples ramps the gain down ahead of the peak
+        csum = np.concatenate([[0.0], np.cumsum(g_min, dtype=np.float64)])
+        idx = np.arange(len(buf))
+        lo = np.maximum(idx - la, 0)
+        gain = ((csum[idx + 1] - csum[lo]) / (idx + 1 - lo)).astype(np.float32)
+        np.minimum(gain, target, out=gain)  # guarantees the ceiling even at block edges
+        np.multiply(buf, gain, out=buf)
+        return buf
+
+    def peak_after(self, peak):
+        return min(peak, float(self.ceiling))
+
+
+class FadeIn(Stage):
+    def __init__(self, samplerate, ms):
+        self.length = int(samplerate * ms / 1000)
+        self._pos = 0
+
+    def process(self, block):
+        if self._pos < self.length:
+            n = min(len(block), self.length - self._pos)
+            block[:n] *= np.linspace(self._pos / self.length, (self._pos + n) / self.length, n,
+                                     endpoint=False, dtype=np.float32)
+            self._pos += n
+        return block
+
+
+class FadeOut(Stage):
+    """Fades the last `ms` of the signal; while streaming it holds that much back."""
+
+    def __init__(self, samplerate, ms):
+        self.length = int(samplerate * ms / 1000)
+        self._held = EMPTY
+
+    def process(self, block):
+        buf = np.concatenate([self._held, block]) if len(self._held) else block
+        cut = max(0, len(buf) - self.length)
+        self._held = buf[cut:].copy()
+        return buf[:cut]
+
+    def flush(self):
+        tail, self._held = self._held, EMPTY
+        if len(tail):
+            tail *= np.linspace(len(tail) / self.length, 0.0, len(tail), dtype=np.float32)
+        return tail
+
+
+class TrimSilence(Stage):
+    """Drops leading and trailing silence below threshold_db, keeping pad_ms of margin."""
+
+    def __init__(self, samplerate, threshold_db=-50.0, pad_ms=80.0):
+        self.threshold = np.float32(db_to_linear(threshold_db))
+        self.pad = int(samplerate * pad_ms / 1000)
+        self._started = False
+        self._held = EMPTY  # leading pre-roll, or a trailing silent run
+        self.dropped_start = 0  # leading samples removed (to map input offsets onto the output)
+
+    def process(self, block):
+        loud = np.flatnonzero(np.abs(block) > self.threshold)
+        if not len(loud):
+            if self._started:
+                self._held = np.concatenate([self._held, block])
+            else:
+                before = len(self._held) + len(block)
+                self._held = np.concatenate([self._held, block])[-self.pad:] if self.pad else EMPTY
+                self.dropped_start += before - len(self._held)
+            return EMPTY
+        first, last = loud[0], loud[-1]
+        if not self._started:
+            self._started = True
+            pre = np.concatenate([self._held, block[:first]])[-self.pad:] if self.pad else EMPTY
+            self.dropped_start += len(self._held) + first - len(pre)
+            out = np.concatenate([pre, block[first:last + 1]])
+        else:
+            out = np.concatenate([self._held, block[:last + 1]])
+        self._held = block[last + 1:].copy()
+        return out
+
+    def flush(self):
+        tail = self._held[:self.pad] if self._started else EMPTY
+        self._held = EMPTY
+        return tail
+
+
+class DspChain:
+    """Ordered list of stages, run on a whole buffer or block by block."""
+
+    def __init__(self, stages=()):
+        self.stages = list(stages)
+
+    @property
+    def streamable(self):
+        return not any(stage.needs_full_buffer for stage in self.stages)
+
+    @property
+    def dropped_start(self):
+        """Leading input samples the chain has removed so far (silence trimming)."""
+        return sum(getattr(stage, "dropped_start", 0) for stage in self.stages)
+
+    @staticmethod
+    def _writable(audio, copy):
+        audio = np.asarray(audio, dtype=np.float32)
+        if copy or not audio.flags.writeable or not audio.flags.c_contiguous:
+            audio = np.array(audio, dtype=np.float32, order="C")
+        return audio
+
+    def run(self, audio, copy=True):
+        """Whole-buffer processing; with copy=False the input buffer may be reused in place."""
+        audio = self._writable(audio, copy)
+        for stage in self.stages:
+            audio = stage.apply(audio)
+        return audio
+
+    def process(self, block):
+        """Streaming: feeds one block through every stage (output may lag behind)."""
+        block = self._writable(block, copy=False)
+        for stage in self.stages:
+            if len(block):
+                block = stage.process(block)
+        return block
+
+    def flush(self):
+        """Streaming: drains what every stage still holds, in order."""
+        tail = EMPTY
+        for stage in self.stages:
+            if len(tail):
+                tail = stage.process(self._writable(tail, copy=False))
+            held = stage.flush()
+            if len(held):
+                tail = np.concatenate([tail, held]) if len(tail) else self._writable(held, copy=False)
+        return tail
+
+
+class TwoPassChain:
+    """A DspChain run in two streaming passes, for renders too long to hold in memory.
+
+    Pass 1 (process()/flush()) runs the head of the chain, everything before
+    the first stage that needs the whole buffer, and measures the peak and
+    integrated loudness of its output; the caller stores that output (e.g. in
+    a temporary file). second_pass() then returns a streaming chain for the
+    stored audio: the whole-buffer stages become one Gain computed from the
+    measurements, followed by the remaining streaming stages (limiter, fades).
+    Only gains and a peak bound are needed, so the result matches
+    DspChain.run up to rounding.
+    """
+
+    def __init__(self, chain, samplerate):
+        stages = chain.stages
+        first = next((i for i, stage in enumerate(stages) if stage.needs_full_buffer), len(stages))
+        self.head = DspChain(stages[:first])
+        self.tail = stages[first:]
+        self.peak = 0.0
+        self.gain = 1.0  # combined gain of the whole-buffer stages, set by second_pass()
+        # O medidor de loudness só é preciso se alguma etapa normaliza por LUFS
+        self._meter = LoudnessMeter(samplerate) if any(isinstance(s, LoudnessNormalize) for s in self.tail) else None
+
+    def _measure(self, block):
+        if len(block):
+            self.peak = max(self.peak, float(np.max(np.abs(block))))
+            if self._meter is not None:
+                self._meter.feed(block)
+        return block
+
+    def process(self, block):
+        """Pass 1: one block through the head of the chain (output may lag behind)."""
+        return self._measure(self.head.process(block))
+
+    def flush(self):
+        return self._measure(self.head.flush())
+
+    def second_pass(self, gain=None):
+        """Streaming DspChain for pass 2, to run over everything pass 1 produced.
+
+        A given gain replaces the one computed from the measurements, e.g. to
+        process a re-rendered piece exactly like the file it goes into.
+        """
+        peak = self.peak
+        lufs = self._meter.loudness() if self._meter is not None else float("-inf")
+        fixed_gain, gain, stages = gain, 1.0, []
+        # Ganhos e fades comutam, por isso os ganhos das etapas de buffer inteiro vão todos para o início
+        for stage in self.tail:
+            if stage.needs_full_buffer:
+                if fixed_gain is not None:
+                    continue
+                stage_gain = stage.gain_for(peak, lufs)
+                gain *= stage_gain
+                peak *= stage_gain
+                if math.isfinite(lufs):
+                    lufs += 20 * math.log10(stage_gain)
+            else:
+                stages.append(stage)
+                peak = stage.peak_after(peak)
+        self.gain = fixed_gain if fixed_gain is not None else gain
+        head = [Gain(20 * math.log10(self.gain))] if self.gain != 1.0 else []
+        return DspChain(head + stages + [HardClip()])
@@ -0,0 +1,371 @@
+"""
+Audio encoders that write straight from memory, without intermediate files.
+
+MP3 is encoded either in-process with `lameenc` (when installed) or by piping
+16-bit PCM into an ffmpeg subprocess over stdin. Both accept audio chunk by
+chunk, so a render can be encoded while it is being generated.
+
+Export profiles (EXPORT_PROFILES) name a set of ExportTargets — format,
+sample rate, MP3 bitrate and file-name suffix — written from one render.
+ExportFanOut hands every block of the render to one writer per target, each
+on its own pool thread, so the outputs are encoded concurrently and nothing
+is decoded again. WAV, FLAC, Ogg Vorbis and Opus come from libsndfile.
+"""
+import io
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger("KokoroStudio")
+
+# Tentativa de importar lameenc para codificar MP3 sem processo externo
+try:
+    import lameenc
+    HAS_LAMEENC = True
+except ImportError:
+    HAS_LAMEENC = False
+
+FFMPEG_BIN = shutil.which("ffmpeg")
+HAS_MP3_ENCODER = HAS_LAMEENC or FFMPEG_BIN is not None
+
+DEFAULT_MP3_BITRATE = "128k"  # same default as the previous pydub/ffmpeg export
+MP3_BITRATE_RANGE = (8, 320)  # kbps accepted by LAME
+
+BLOCK_FRAMES = 24000 * 10  # frames per read when converting existing files
+
+# Formatos escritos pelo libsndfile: (format, subtype) do soundfile
+SOUNDFILE_FORMATS = {
+    "wav": ("WAV", "PCM_16"),
+    "flac": ("FLAC", "PCM_16"),
+    "ogg": ("OGG", "VORBIS"),
+    "opus": ("OGG", "OPUS"),
+}
+EXPORT_FORMATS = ("wav", "mp3") + tuple(f for f in SOUNDFILE_FORMATS if f != "wav")
+OPUS_SAMPLERATES = (8000, 12000, 16000, 24000, 48000)
+FANOUT_QUEUE_BLOCKS = 4  # blocks waiting per target before the render waits for the slowest encoder
+
+
+def to_pcm16(audio):
+    """Float [-1, 1] samples (mono or frames x channels) to interleaved int16 bytes."""
+    audio = np.asarray(audio, dtype=np.float32)
+    pcm = np.empty(audio.shape, dtype=np.int16)
+    np.multiply(np.clip(audio, -1.0, 1.0), 32767, out=pcm, casting="unsafe")
+    return pcm.tobytes()
+
+
+def _bitrate_kbps(bitrate):
+    return int(str(bitrate).lower().rstrip("k"))
+
+
+class Mp3Encoder:
+    """Incremental MP3 encoder: write() float chunks, close() finishes the file."""
+
+    def __init__(self, filepath, samplerate, channels=1, bitrate=DEFAULT_MP3_BITRATE):
+        self.filepath = filepath
+        self._proc = None
+        self._file = None
+        if HAS_LAMEENC:
+            self._lame = lameenc.Encoder()
+            self._lame.set_bit_rate(_bitrate_kbps(bitrate))
+            self._lame.set_in_sample_rate(int(samplerate))
+            self._lame.set_channels(int(channels))
+            self._lame.set_quality(2)
+            self._file = open(filepath, "wb")
+        elif FFMPEG_BIN is not None:
+            cmd = [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y",
+                   "-f", "s16le", "-ar", str(int(samplerate)), "-ac", str(int(channels)), "-i", "pipe:0",
+                   "-codec:a", "libmp3lame", "-b:a", str(bitrate), filepath]
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                          stderr=subprocess.PIPE)
+        else:
+            raise RuntimeError("Nenhum encoder MP3 disponível (instale o ffmpeg ou 'pip install lameenc').")
+
+    def write(self, audio):
+        pcm = to_pcm16(audio)
+        if self._file is not None:
+            self._file.write(self._lame.encode(pcm))
+        else:
+            try:
+                self._proc.stdin.write(pcm)
+            except BrokenPipeError:
+                self.close()  # raises with ffmpeg's own error message
+
+    def close(self):
+        if self._file is not None:
+            self._file.write(self._lame.flush())
+            self._file.close()
+            self._file = None
+        elif self._proc is not None:
+            proc, self._proc = self._proc, None
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            stderr = proc.stderr.read().decode(errors="replace").strip()
+            if proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg falhou ao codificar {os.path.basename(self.filepath)}: {stderr}")
+
+
+class WavWriter:
+    """Same write()/close() interface as Mp3Encoder, on top of soundfile (WAV, or another libsndfile format)."""
+
+    def __init__(self, filepath, samplerate, channels=1, format="WAV", subtype="PCM_16"):
+        self.filepath = filepath
+        self._file = sf.SoundFile(filepath, "w", samplerate=int(samplerate), channels=int(channels),
+                                  format=format, subtype=subtype)
+
+    def write(self, audio):
+        self._file.write(audio)
+
+    def close(self):
+        self._file.close()
+
+
+def open_encoder(filepath, samplerate, channels=1, bitrate=DEFAULT_MP3_BITRATE):
+    """Returns a WavWriter or Mp3Encoder for filepath, chosen by extension."""
+    if filepath.lower().endswith(".mp3"):
+        return Mp3Encoder(filepath, samplerate, channels=channels, bitrate=bitrate)
+    return WavWriter(filepath, samplerate, channels=channels)
+
+
+# --- Export profiles ---
+
+@dataclass(frozen=True)
+class ExportTarget:
+    """One output of a render: format, sample rate (None = the render's), MP3 bitrate and file-name suffix."""
+    format: str = "wav"
+    samplerate: int = None
+    bitrate: str = None  # só MP3 (None = DEFAULT_MP3_BITRATE)
+    suffix: str = ""
+
+    def __post_init__(self):
+        if self.format not in EXPORT_FORMATS:
+            raise ValueError(f"Formato de exportação desconhecido: {self.format!r} (use {', '.join(EXPORT_FORMATS)})")
+        if self.format == "opus" and self.samplerate and self.samplerate not in OPUS_SAMPLERATES:
+            raise ValueError(f"Opus só aceita {', '.join(map(str, OPUS_SAMPLERATES))} Hz")
+        if self.format != "mp3":
+            if self.bitrate is not None:
+                raise ValueError(f"Bitrate só se aplica a MP3, não a {self.format.upper()}")
+            return
+        try:
+            kbps = _bitrate_kbps(self.bitrate or DEFAULT_MP3_BITRATE)
+        except ValueError:
+            raise ValueError(f"Bitrate MP3 inválido: {self.bitrate!r} (ex.: 128k)") from None
+        low, high = MP3_BITRATE_RANGE
+        if not low <= kbps <= high:
+            raise ValueError(f"Bitrate MP3 fora do intervalo {low}k-{high}k: {self.bitrate!r}")
+        object.__setattr__(self, "bitrate", f"{kbps}k")  # forma normalizada, ex.: "64K" -> "64k"
+
+    @property
+    def extension(self):
+        return "." + self.format
+
+    def path_for(self, filepath):
+        """Output path of this target for a render saved as filepath (its extension is replaced)."""
+        return os.path.splitext(filepath)[0] + self.suffix + self.extension
+
+    def describe(self):
+        parts = [self.format.upper()]
+        if self.format == "mp3":
+            parts.append(str(self.bitrate))
+        if self.samplerate:
+            parts.append(f"{self.samplerate / 1000:g} kHz")
+        return " ".join(parts)
+
+
+EXPORT_PROFILES = {
+    "wav": (ExportTarget("wav"),),
+    "mp3": (ExportTarget("mp3"),),
+    "wav+mp3": (ExportTarget("wav"), ExportTarget("mp3")),
+    "master+preview": (ExportTarget("wav"), ExportTarget("mp3", bitrate="192k"),
+                       ExportTarget("mp3", bitrate="64k", suffix="_preview")),
+    "web": (ExportTarget("opus"), ExportTarget("mp3")),
+    "archive": (ExportTarget("flac"), ExportTarget("flac", samplerate=48000, suffix="_48k")),
+    "telephony": (ExportTarget("wav"), ExportTarget("wav", samplerate=16000, suffix="_16k")),
+}
+
+
+def parse_export_targets(spec):
+    """ExportTargets from a profile name or a list like "wav,mp3:64k,flac@48000" (format[@rate][:bitrate]).
+
+    Later targets that would overwrite an earlier file get a suffix from their rate/bitrate.
+    """
+    if spec in EXPORT_PROFILES:
+        return EXPORT_PROFILES[spec]
+    targets, paths = [], set()
+    for item in (part.strip().lower() for part in spec.split(",")):
+        if not item:
+            continue
+        fmt, _, bitrate = item.partition(":")
+        fmt, _, rate = fmt.partition("@")
+        try:
+            target = ExportTarget(fmt.lstrip("."), samplerate=int(rate) if rate else None,
+                                  bitrate=bitrate or None)
+        except ValueError as e:
+            raise ValueError(f"{item!r}: {e}") from None
+        if target.path_for("x") in paths:
+            suffix = "".join(f"_{part}" for part in (f"{target.samplerate // 1000}k" if target.samplerate else "",
+                                                     bitrate) if part)
+            target = ExportTarget(target.format, target.samplerate, target.bitrate, suffix or f"_{len(targets)}")
+        paths.add(target.path_for("x"))
+        targets.append(target)
+    if not targets:
+        raise ValueError(f"Nenhum formato de exportação em {spec!r} (perfis: {', '.join(EXPORT_PROFILES)})")
+    return tuple(targets)
+
+
+class TargetWriter:
+    """Writer of one ExportTarget to filepath: resamples (when the target asks for another rate) and encodes."""
+
+    def __init__(self, target, filepath, samplerate, channels=1):
+        self.target = target
+        self.filepath = filepath
+        self.seconds = 0.0  # time spent resampling and encoding
+        self._resampler = None
+        rate = target.samplerate or samplerate
+        if rate != samplerate:
+            from studio_dsp import StreamingResampler
+            self._resampler = StreamingResampler(rate, samplerate)
+        if target.format == "mp3":
+            self._encoder = Mp3Encoder(self.filepath, rate, channels=channels, bitrate=target.bitrate)
+        else:
+            fmt, subtype = SOUNDFILE_FORMATS[target.format]
+            self._encoder = WavWriter(self.filepath, rate, channels=channels, format=fmt, subtype=subtype)
+
+    def write(self, audio):
+        started = time.perf_counter()
+        if self._resampler is not None:
+            audio = self._resampler.process(audio)
+        if len(audio):
+            self._encoder.write(audio)
+        self.seconds += time.perf_counter() - started
+
+    def close(self):
+        started = time.perf_counter()
+        try:
+            if self._resampler is not None:
+                tail = self._resampler.flush()
+                if len(tail):
+                    self._encoder.write(tail)
+        finally:
+            self._encoder.close()
+        self.seconds += time.perf_counter() - started
+
+
+class ExportFanOut:
+    """Feeds every written block to several writers at once, each draining its own queue on a pool thread.
+
+    write() only blocks when a writer is FANOUT_QUEUE_BLOCKS blocks behind.
+    close() finishes every writer and raises the first error; abort() stops
+    them without raising.
+    """
+
+    def __init__(self, writers):
+        self.writers = list(writers)
+        self._queues = [queue.Queue(maxsize=FANOUT_QUEUE_BLOCKS) for _ in self.writers]
+        self._pool = ThreadPoolExecutor(max_workers=len(self.writers), thread_name_prefix="export")
+        self._futures = [self._pool.submit(self._drain, writer, blocks)
+                         for writer, blocks in zip(self.writers, self._queues)]
+
+    @staticmethod
+    def _drain(writer, blocks):
+        error = None
+        while True:
+            block = blocks.get()
+            if block is None:
+                break
+            if error is None:
+                try:
+                    writer.write(block)
+                except BaseException as e:
+                    error = e  # continua a esvaziar a fila para o render não ficar bloqueado
+        if error is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+            raise error
+        writer.close()
+
+    def write(self, audio):
+        # Cópia própria: os writers leem o bloco noutras threads enquanto o chamador reutiliza os seus buffers
+        audio = np.array(audio, dtype=np.float32)
+        for blocks in self._queues:
+            blocks.put(audio)
+
+    def close(self):
+        for blocks in self._queues:
+            blocks.put(None)
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._pool.shutdown()
+
+    def abort(self):
+        try:
+            self.close()
+        except BaseException:
+            pass
+
+
+def encode_mp3(audio, filepath, samplerate, bitrate=DEFAULT_MP3_BITRATE):
+    """Encodes a whole in-memory buffer to MP3, block by block."""
+    encoder = Mp3Encoder(filepath, samplerate, channels=1 if np.ndim(audio) == 1 else np.shape(audio)[1],
+                         bitrate=bitrate)
+    try:
+        for start in range(0, len(audio), BLOCK_FRAMES):
+            encoder.write(audio[start:start + BLOCK_FRAMES])
+    finally:
+        encoder.close()
+    return filepath
+
+
+def wav_bytes(audio, samplerate):
+    """Whole buffer as an in-memory 16-bit WAV file."""
+    buf = io.BytesIO()
+    sf.write(buf, audio, int(samplerate), format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def mp3_bytes(audio, samplerate, bitrate=DEFAULT_MP3_BITRATE):
+    """Whole mono buffer as in-memory MP3 data (for HTTP responses)."""
+    pcm = to_pcm16(audio)
+    if HAS_LAMEENC:
+        lame = lameenc.Encoder()
+        lame.set_bit_rate(_bitrate_kbps(bitrate))
+        lame.set_in_sample_rate(int(samplerate))
+        lame.set_channels(1)
+        lame.set_quality(2)
+        return bytes(lame.encode(pcm) + lame.flush())
+    if FFMPEG_BIN is None:
+        raise RuntimeError("Nenhum encoder MP3 disponível (instale o ffmpeg ou 'pip install lameenc').")
+    cmd = [FFMPEG_BIN, "-hide_banner", "-loglevel", "error",
+           "-f", "s16le", "-ar", str(int(samplerate)), "-ac", "1", "-i", "pipe:0",
+           "-codec:a", "libmp3lame", "-b:a", str(bitrate), "-f", "mp3", "pipe:1"]
+    # communicate() feeds stdin and drains stdout together, so large renders cannot deadlock
+    proc = subprocess.run(cmd, input=pcm, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg falhou ao codificar MP3: {proc.stderr.decode(errors='replace').strip()}")
+    return proc.stdout
+
+
+def convert_to_mp3(source_path, target_path=None, bitrate=DEFAULT_MP3_BITRATE):
+    """Re-encodes an existing audio file (WAV/FLAC/OGG) to MP3 reading it in blocks."""
+    target_path = target_path or os.path.splitext(source_path)[0] + ".mp3"
+    with sf.SoundFile(source_path) as src:
+        encoder = Mp3Encoder(target_path, src.samplerate, channels=src.channels, bitrate=bitrate)
+        try:
+            for block in src.blocks(blocksize=BLOCK_FRAMES, dtype="float32"):
+                encoder.write(block)
+        finally:
+            encoder.close()
+    return target_path
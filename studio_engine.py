@@ -0,0 +1,1194 @@
+"""
+Headless synthesis engine for Kokoro Studio.
+
+Holds everything needed to turn text into a processed audio file without
+touching Tk: pipeline loading, synthesis, post-processing (pitch/gain/clipping)
+and saving. Both the GUI (KokoroStudio.py) and the batch CLI use it:
+
+    python -m studio_engine manifest.jsonl --out-dir renders/
+    python -m studio_engine --text "Olá mundo" --lang p --voice pf_dora -o ola.mp3
+    python -m studio_engine --splice ola.wav --segment 3 --text "Frase corrigida."
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import gc
+import queue
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field, fields, replace
+
+import numpy as np
+import soundfile as sf
+
+from studio_encode import EXPORT_PROFILES, HAS_MP3_ENCODER, ExportFanOut, ExportTarget, TargetWriter, open_encoder, parse_export_targets
+from studio_inference import INFERENCE_PROFILES, MAX_TOKENS, forward_packed, packed_length, resolve_inference_profile, token_ids
+from studio_text import DEFAULT_CHUNK_BUDGET, chunk_text, estimate_phonemes
+from studio_timing import SUBTITLE_FORMATS, TimingIndex, index_path, load_index, subtitle_path, write_subtitles
+from studio_trace import count, record, span, trace
+from studio_voices import VoiceRegistry, normalize_voice_spec
+
+logger = logging.getLogger("KokoroStudio")
+
+SAMPLE_RATE = 24000  # Kokoro output rate
+SPOOL_BLOCK = SAMPLE_RATE * 10  # samples per read in render()'s second pass
+
+# Mapping Languages to Kokoro Codes
+LANG_MAP = {
+    "🇺🇸 Inglês (Americano)": "a",
+    "🇬🇧 Inglês (Britânico)": "b",
+    "🇧🇷 Português (Brasil)": "p",
+    "🇪🇸 Espanhol": "e",
+    "🇫🇷 Francês": "f",
+    "🇮🇹 Italiano": "i",
+    "🇯🇵 Japonês": "j",
+    "🇨🇳 Chinês (Mandarim)": "z",
+    "🇮🇳 Hindi": "h"
+}
+
+# Mapping Voices (Based on Kokoro v0.19 specs)
+# Format: {LangCode: {VoiceName: VoiceID}}
+VOICE_MAP = {
+    "a": {
+        "👩 Bella (Narrativa)": "af_bella", "👩 Sarah (Calma)": "af_sarah",
+        "👩 Nicole (Neutra)": "af_nicole", "👩 Sky (Jovem)": "af_sky",
+        "👨 Michael (Neutro)": "am_michael", "👨 Adam (Profundo)": "am_adam",
+        "👩 Heart (Suave)": "af_heart", "👨 George (Britânico/US Mix)": "bm_george"
+    },
+    "b": {
+        "👩 Emma (Elegante)": "bf_emma", "👩 Isabella (Clássica)": "bf_isabella",
+        "👨 George (Padrão)": "bm_george", "👨 Lewis (Narrador)": "bm_lewis"
+    },
+    "p": {
+        "👨 Alex (Padrão)": "pm_alex", "👩 Dora (Padrão)": "pf_dora",
+        "👨 Santa (Temático)": "pm_santa"
+    },
+    "e": {"👩 Dora (ES)": "ef_dora", "👨 Alex (ES)": "em_alex", "👨 Santa (ES)": "em_santa"},
+    "f": {"👩 Siwis": "ff_siwis"},
+    "i": {"👨 Nicola": "im_nicola", "👩 Sara": "if_sara"},
+    "j": {"👩 Kokoro (Japonês)": "jf_tebukuro", "👨 Alpha": "jm_kumo"},
+    "z": {"👩 Ling": "zf_xiaobei", "👩 Fan": "zf_xiaoni", "👨 Yun": "zm_yunjian"},
+    "h": {"👩 Amara": "hf_alpha", "👩 Beta": "hf_beta"}
+}
+
+SUPPORTED_FORMATS = (".wav", ".mp3")
+
+MP3_FALLBACK_MESSAGE = "Encoder MP3 não encontrado (instale o ffmpeg). Salvo como .wav."
+
+KOKORO_REPO_ID = "hexgrad/Kokoro-82M"
+
+# Rough resident sizes (MB) used by PipelinePool's memory budget.
+# The 82M-parameter model is loaded once and shared; frontends vary a lot
+# (the Japanese/Chinese dictionaries are the heavy ones).
+MODEL_COST_MB = 350
+FRONTEND_COST_MB = {"a": 60, "b": 60, "j": 150, "z": 120, "default": 20}
+
+# Tiny sentence per language for SynthesisEngine.warm_up
+WARMUP_TEXT = {
+    "a": "Hello.", "b": "Hello.", "p": "Olá.", "e": "Hola.", "f": "Bonjour.",
+    "i": "Ciao.", "j": "こんにちは。", "z": "你好。", "h": "नमस्ते।",
+}
+
+
+class RenderCancelled(Exception):
+    """Raised between segments when a render's cancel event is set."""
+
+
+@dataclass
+class RenderStats:
+    """Timings of one render, in seconds."""
+    time_to_first_audio: float = 0.0
+    total_time: float = 0.0
+    audio_seconds: float = 0.0
+    segments: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    chunk_times: list = field(default_factory=list)  # model time of each synthesized chunk
+    outputs: list = field(default_factory=list)  # files written by render()
+
+    @property
+    def real_time_factor(self):
+        """Processing time per second of audio (< 1.0 is faster than real time)."""
+        return self.total_time / self.audio_seconds if self.audio_seconds else 0.0
+
+
+@dataclass
+class SynthesisParams:
+    """Everything that shapes one render, independent of the GUI sliders."""
+    lang_code: str = "a"
+    voice: str = "af_heart"
+    speed: float = 1.0
+    gain_db: float = 0.0
+    pitch: float = 1.0
+    # Post-processing chain (see build_dsp_chain); defaults keep the original gain/pitch/clip behaviour
+    highpass_hz: float = 0.0
+    normalize: str = ""  # "", "peak" ou "lufs"
+    peak_db: float = -1.0
+    lufs: float = -16.0
+    limiter: bool = False
+    trim_silence: bool = False
+    fade_in_ms: float = 0.0
+    fade_out_ms: float = 0.0
+
+
+def params_from_dict(data):
+    """SynthesisParams from a dict (e.g. a timing index), ignoring unknown keys."""
+    names = {f.name for f in fields(SynthesisParams)}
+    return SynthesisParams(**{key: value for key, value in data.items() if key in names})
+
+
+def resolve_lang_code(lang):
+    """Accepts a Kokoro code ('p') or a LANG_MAP display name and returns the code."""
+    if lang in LANG_MAP:
+        return LANG_MAP[lang]
+    if lang in VOICE_MAP:
+        return lang
+    raise ValueError(f"Idioma desconhecido: {lang!r}")
+
+
+def default_voice(lang_code):
+    """First voice listed in VOICE_MAP for the language (same default as the GUI)."""
+    voices = VOICE_MAP.get(lang_code, {})
+    if not voices:
+        raise ValueError(f"Nenhuma voz configurada para o idioma {lang_code!r}")
+    return next(iter(voices.values()))
+
+
+def sanitize_filename(name):
+    """Strips characters that are invalid in file names (same rule as the GUI)."""
+    return re.sub(r'[\\/*?:"<>|]', "", name)
+
+
+def build_dsp_chain(params, streaming=False):
+    """Post-processing chain for params: high-pass, pitch, gain, trim, normalize, limiter, fades.
+
+    Normalization needs the whole signal, so a streaming chain swaps it for the
+    limiter, and clipping protection becomes a hard clip instead of 'divide by
+    the peak' (the peak of the whole file is unknown while streaming).
+    """
+    # scipy (via studio_dsp) só é importado no primeiro render: não atrasa o arranque da GUI
+    from studio_dsp import (DspChain, FadeIn, FadeOut, Gain, HardClip, HighPass, Limiter, LoudnessNormalize,
+                            PeakNormalize, PitchShift, TrimSilence)
+    stages = []
+    if params.highpass_hz > 0:
+        stages.append(HighPass(params.highpass_hz, SAMPLE_RATE))
+    # Pitch: WSOLA + polyphase, block by block; duration is preserved
+    if params.pitch != 1.0:
+        stages.append(PitchShift(params.pitch))
+    if params.gain_db != 0:
+        stages.append(Gain(params.gain_db))
+    if params.trim_silence:
+        stages.append(TrimSilence(SAMPLE_RATE))
+
+    limiter = params.limiter
+    if params.normalize and streaming:
+        logger.info(f"Normalização '{params.normalize}' indisponível em streaming; usando o limitador.")
+        limiter = True
+    elif params.normalize == "peak":
+        stages.append(PeakNormalize(params.peak_db))
+    elif params.normalize == "lufs":
+        stages.append(LoudnessNormalize(params.lufs, SAMPLE_RATE))
+    elif params.normalize:
+        raise ValueError(f"Normalização desconhecida: {params.normalize!r} (use 'peak' ou 'lufs')")
+    if limiter:
+        stages.append(Limiter(SAMPLE_RATE))
+
+    if params.fade_in_ms > 0:
+        stages.append(FadeIn(SAMPLE_RATE, params.fade_in_ms))
+    if params.fade_out_ms > 0:
+        stages.append(FadeOut(SAMPLE_RATE, params.fade_out_ms))
+
+    # Clipping protection
+    stages.append(HardClip() if streaming else PeakNormalize(0.0, only_reduce=True))
+    return DspChain(stages)
+
+
+def apply_effects(audio, params):
+    """Runs the post-processing chain on a full mono buffer (in place when it can)."""
+    return build_dsp_chain(params).run(audio, copy=False)
+
+
+class ChunkWriter(threading.Thread):
+    """Appends audio chunks to a WAV or MP3 encoder on a background thread.
+
+    Lets the synthesis loop hand a chunk to the player without waiting on
+    disk I/O or the MP3 encoder. Errors are kept and re-raised by close().
+    """
+
+    def __init__(self, filepath, samplerate=SAMPLE_RATE):
+        super().__init__(daemon=True)
+        self.filepath = filepath
+        self.error = None
+        self._queue = queue.Queue()
+        self._file = open_encoder(filepath, samplerate)
+
+    def run(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                break
+            if self.error is None:
+                try:
+                    self._file.write(chunk)
+                except Exception as e:
+                    self.error = e
+        self._file.close()
+
+    def write(self, chunk):
+        self._queue.put(chunk)
+
+    def close(self):
+        self._queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+def pipeline_results(pipeline, segment, lang_code, voice, speed, g2p_cache=None):
+    """Yields (phonemes, audio) for one segment, reusing the G2P output stored in g2p_cache.
+
+    On a hit the pipeline's G2P is skipped and each cached phoneme string goes
+    straight to the model (KPipeline.generate_from_tokens); on a miss the
+    phonemes the pipeline produced are stored once the segment is done.
+    """
+    key = None
+    if g2p_cache is not None:
+        from studio_cache import phoneme_key
+        key = phoneme_key(segment, lang_code)
+        cached = g2p_cache.get(key)
+        if cached is not None:
+            count("g2p_hits")
+            for phonemes in cached:
+                for _, ps, audio in pipeline.generate_from_tokens(phonemes, voice=voice, speed=speed):
+                    yield ps, audio
+            return
+        count("g2p_misses")
+    produced = []
+    for _, ps, audio in pipeline(segment, voice=voice, speed=speed, split_pattern=None):
+        if ps:
+            produced.append(ps)
+        yield ps, audio
+    if key is not None and produced:
+        g2p_cache.put(key, produced)
+
+
+class PipelinePool:
+    """LRU cache of KPipeline objects keyed by lang_code.
+
+    All language frontends (G2P) share a single loaded KModel, so switching
+    between pt/en/es only builds the cheap frontend the first time and never
+    reloads the 82M weights. Entries are evicted least-recently-used when
+    either max_pipelines or memory_budget_mb is exceeded.
+
+    The model is prepared with an InferenceProfile (threads, quantization,
+    backend; see studio_inference) as soon as it is loaded.
+    """
+
+    def __init__(self, device="cpu", max_pipelines=4, memory_budget_mb=None, share_model=True, profile=None):
+        self.device = device
+        self.profile = resolve_inference_profile(profile)
+        self.max_pipelines = max(1, int(max_pipelines))
+        self.memory_budget_mb = memory_budget_mb
+        self.share_model = share_model
+        self.model = None
+        self._pipelines = OrderedDict()  # lang_code -> KPipeline, oldest first
+        self._lock = threading.RLock()
+
+    def _load_model(self):
+        if self.model is None:
+            from kokoro import KModel
+            logger.info(f"Loading Kokoro model ({KOKORO_REPO_ID}) on {self.device}")
+            with span("model_load"):
+                self.model = self.profile.prepare_model(KModel(repo_id=KOKORO_REPO_ID).to(self.device).eval())
+        return self.model
+
+    def entry_cost_mb(self, lang_code):
+        """Estimated resident cost of one pool entry (frontend, plus the model if not shared)."""
+        cost = FRONTEND_COST_MB.get(lang_code, FRONTEND_COST_MB["default"])
+        if not self.share_model:
+            cost += MODEL_COST_MB
+        return cost
+
+    def used_mb(self):
+        with self._lock:
+            return sum(self.entry_cost_mb(code) for code in self._pipelines)
+
+    def loaded_languages(self):
+        with self._lock:
+            return list(self._pipelines)
+
+    def get(self, lang_code):
+        """Returns the pipeline for lang_code, building it (and evicting others) if needed."""
+        with self._lock:
+            pipeline = self._pipelines.get(lang_code)
+            if pipeline is not None:
+                self._pipelines.move_to_end(lang_code)
+                return pipeline
+
+            from kokoro import KPipeline
+            started = time.perf_counter()
+            logger.info(f"Loading Pipeline: {lang_code}")
+            # Force CPU for stability on generic hardware
+            with span("pipeline_load", lang=lang_code):
+                if self.share_model:
+                    pipeline = KPipeline(lang_code=lang_code, repo_id=KOKORO_REPO_ID, model=self._load_model(), device=self.device)
+                else:
+                    pipeline = KPipeline(lang_code=lang_code, repo_id=KOKORO_REPO_ID, device=self.device)
+                    self.profile.prepare_model(pipeline.model)
+            self._pipelines[lang_code] = pipeline
+            logger.info(f"Pipeline {lang_code} ready in {time.perf_counter() - started:.2f}s")
+            self._evict(keep=lang_code)
+            return pipeline
+
+    def _evict(self, keep):
+        def over_budget():
+            if len(self._pipelines) > self.max_pipelines:
+                return True
+            return self.memory_budget_mb is not None and self.used_mb() > self.memory_budget_mb
+
+        while len(self._pipelines) > 1 and over_budget():
+            oldest = next(iter(self._pipelines))
+            if oldest == keep:
+                break
+            del self._pipelines[oldest]
+            logger.info(f"Pipeline {oldest} evicted (LRU), {len(self._pipelines)} loaded")
+        gc.collect()
+
+    def prewarm(self, lang_codes):
+        """Loads the given languages up front (e.g. at startup), most important first."""
+        # Loaded in reverse so the first language ends up most recently used
+        for lang_code in reversed(list(lang_codes)):
+            self.get(resolve_lang_code(lang_code))
+
+    def clear(self):
+        with self._lock:
+            self._pipelines.clear()
+            self.model = None
+        gc.collect()
+
+
+class SynthesisEngine:
+    """Renders text with a given SynthesisParams using a shared PipelinePool.
+
+    Loaded pipelines are kept between calls, so a batch of jobs pays each
+    language's load only once. Calls are serialized by a lock because
+    KPipeline is not safe to drive from two threads at once.
+
+    Text is cut by studio_text.chunk_text into chunks of at most chunk_budget
+    estimated phonemes (0 = one chunk per line, the old behaviour).
+
+    params.voice may be a voice id or a weighted blend ("af_bella:0.7,af_sarah:0.3");
+    the packs come from a VoiceRegistry shared by all languages (see studio_voices).
+
+    inference_profile is a preset name of studio_inference.INFERENCE_PROFILES
+    or an InferenceProfile; in parallel mode each worker applies it with
+    threads_per_worker threads.
+
+    g2p_cache names a studio_cache.PhonemeCache file: the phonemes of every
+    segment are kept there across runs, so repeated text skips the G2P
+    frontend (also in the parallel workers, which share the file).
+
+    model_batch > 1 lets up to that many consecutive short segments share one
+    model call (studio_inference.forward_packed), which pays off for scripts
+    made of many short lines; it applies outside parallel mode.
+
+    Rendered files get a studio_timing sidecar index (timing_index=True) and,
+    with subtitles="srt" or "vtt", a subtitle file with one cue per segment.
+    """
+
+    def __init__(self, device="cpu", max_pipelines=4, memory_budget_mb=None, workers=1, threads_per_worker=None,
+                 cache_dir=None, cache_max_mb=2048, chunk_budget=DEFAULT_CHUNK_BUDGET, voices_dir=None,
+                 inference_profile=None, timing_index=True, subtitles=None, g2p_cache=None, g2p_cache_max_mb=64,
+                 model_batch=1):
+        if subtitles and subtitles not in SUBTITLE_FORMATS:
+            raise ValueError(f"Formato de legendas desconhecido: {subtitles!r}")
+        self.device = device
+        self.chunk_budget = chunk_budget
+        self.model_batch = max(1, int(model_batch))
+        self.timing_index = timing_index
+        self.subtitles = subtitles
+        self.inference_profile = resolve_inference_profile(inference_profile)
+        self.pipelines = PipelinePool(device=device, max_pipelines=max_pipelines, memory_budget_mb=memory_budget_mb,
+                                      profile=self.inference_profile)
+        self.voices = VoiceRegistry(KOKORO_REPO_ID, voices_dir=voices_dir)
+        self._lock = threading.Lock()
+        self.last_stats = None
+
+        # Parallel mode: segments are rendered by a process pool instead of self.pipelines
+        self.parallel = None
+        if workers > 1:
+            from studio_parallel import ParallelSynthesizer
+            self.parallel = ParallelSynthesizer(workers, threads_per_worker, voices_dir=voices_dir,
+                                                profile=self.inference_profile,
+                                                g2p_cache=(g2p_cache, g2p_cache_max_mb) if g2p_cache else None)
+
+        # Segment cache: only lines whose (text, lang, voice, speed) changed are re-synthesized
+        self.cache = None
+        if cache_dir:
+            from studio_cache import SegmentCache
+            self.cache = SegmentCache(cache_dir, max_mb=cache_max_mb)
+
+        # G2P cache: phonemes per (lang_code, text), reused for any voice and speed
+        self.g2p_cache = None
+        if g2p_cache:
+            from studio_cache import PhonemeCache
+            self.g2p_cache = PhonemeCache(g2p_cache, max_mb=g2p_cache_max_mb)
+
+    def get_pipeline(self, lang_code):
+        """Returns the (cached) KPipeline for lang_code."""
+        return self.pipelines.get(lang_code)
+
+    def prewarm(self, lang_codes, voices=()):
+        """Loads the pipelines for lang_codes (and the given voice specs) before the first render."""
+        with self._lock:
+            self.pipelines.prewarm(lang_codes)
+        self.voices.preload(voices)
+
+    def warm_up(self, lang_code, voice=None):
+        """Loads a language (model, pipeline, voice) and synthesizes one tiny sentence; returns the seconds taken.
+
+        The first real render then starts with everything loaded and the
+        model's first-call overhead already paid. The sentence bypasses the
+        segment cache. In parallel mode every worker process is warmed.
+        """
+        lang_code = resolve_lang_code(lang_code)
+        voice = voice or default_voice(lang_code)
+        params = SynthesisParams(lang_code=lang_code, voice=voice)
+        text = WARMUP_TEXT.get(lang_code, WARMUP_TEXT["a"])
+        started = time.perf_counter()
+        with trace("warm_up", lang=lang_code, voice=voice):
+            if self.parallel is not None:
+                for _ in self.parallel.generate_segments([text] * self.parallel.workers, params):
+                    pass
+            else:
+                with self._lock:
+                    pipeline = self.get_pipeline(lang_code)
+                    with span("voice_load"):
+                        pack = self.voices.get(voice)
+                    for _ in self._pipeline_chunks(pipeline, text, pack, params, RenderStats()):
+                        pass
+        elapsed = time.perf_counter() - started
+        logger.info(f"Warm-up of lang={lang_code}, voice={voice} done in {elapsed:.2f}s")
+        return elapsed
+
+    def close(self):
+        """Stops the worker processes of parallel mode, if any, and closes the G2P cache."""
+        if self.parallel is not None:
+            self.parallel.shutdown()
+        if self.g2p_cache is not None:
+            self.g2p_cache.close()
+            self.g2p_cache = None
+
+    def _pipeline_chunks(self, pipeline, segment, voice, params, stats, phonemes=None):
+        # Only the time spent inside the model counts, not the consumer's work between yields
+        if phonemes is not None:
+            # G2P já feito (ver _packed_chunks): os fonemas vão direto ao modelo
+            results = ((ps, audio) for _, ps, audio in pipeline.generate_from_tokens(phonemes, voice=voice,
+                                                                                     speed=params.speed))
+        else:
+            results = pipeline_results(pipeline, segment, params.lang_code, voice, params.speed, self.g2p_cache)
+        phonemes = samples = 0
+        elapsed = 0.0
+        while True:
+            started = time.perf_counter()
+            with self.inference_profile.context():
+                result = next(results, None)
+            elapsed += time.perf_counter() - started
+            if result is None:
+                break
+            ps, audio = result
+            phonemes += len(ps or "")
+            if audio is not None:
+                audio = np.asarray(audio, dtype=np.float32)
+                samples += len(audio)
+                yield audio
+        self._record_chunk(stats, segment, params.lang_code, phonemes, samples, elapsed)
+
+    def _packed_chunks(self, pipeline, misses, voice, params, stats):
+        """One iterable of chunks per miss, like _pipeline_chunks, with short misses sharing model calls.
+
+        Consecutive misses are grouped while the group has at most model_batch
+        segments and fits in the model's context; a segment too long to share
+        a call goes through the pipeline as usual.
+        """
+        model = pipeline.model
+        group = []  # (segment, phonemes, token ids)
+        for segment in misses:
+            phonemes = self._segment_phonemes(pipeline, segment, params.lang_code)
+            ids = token_ids(model, phonemes)
+            fits = 0 < len(ids) and packed_length([ids]) <= MAX_TOKENS
+            if group and (not fits or len(group) >= self.model_batch
+                          or packed_length([g[2] for g in group] + [ids]) > MAX_TOKENS):
+                yield from self._run_group(pipeline, group, voice, params, stats)
+                group = []
+            if fits:
+                group.append((segment, phonemes, ids))
+            else:
+                yield self._pipeline_chunks(pipeline, segment, voice, params, stats)
+        yield from self._run_group(pipeline, group, voice, params, stats)
+
+    def _run_group(self, pipeline, group, voice, params, stats):
+        if not group:
+            return
+        if len(group) == 1:
+            # Sozinho, o segmento não partilha a chamada: os fonemas já calculados vão ao modelo como um acerto do cache G2P
+            segment, phonemes, _ = group[0]
+            yield self._pipeline_chunks(pipeline, segment, voice, params, stats, phonemes=phonemes)
+            return
+        segments, phonemes, id_lists = zip(*group)
+        started = time.perf_counter()
+        pieces = forward_packed(pipeline.model, phonemes, id_lists, voice, params.speed, self.inference_profile)
+        self._record_chunk(stats, " ".join(segments), params.lang_code, sum(map(len, phonemes)),
+                           sum(map(len, pieces)), time.perf_counter() - started)
+        count("packed_segments", len(group))
+        for piece in pieces:
+            yield [piece]
+
+    def _segment_phonemes(self, pipeline, segment, lang_code):
+        """Phoneme string of a segment, from the G2P cache when possible."""
+        key = None
+        if self.g2p_cache is not None:
+            from studio_cache import phoneme_key
+            key = phoneme_key(segment, lang_code)
+            cached = self.g2p_cache.get(key)
+            if cached is not None:
+                count("g2p_hits")
+                return " ".join(cached)
+            count("g2p_misses")
+        with span("g2p"):
+            phonemes, _ = pipeline.g2p(segment)
+        phonemes = (phonemes or "").strip()
+        # Acima do contexto o pipeline divide o texto; essas entradas ficam para ele gravar
+        if key is not None and phonemes and len(phonemes) <= MAX_TOKENS:
+            self.g2p_cache.put(key, [phonemes])
+        return phonemes
+
+    def _parallel_chunks(self, misses, params, stats):
+        results = self.parallel.generate_segments(misses, params)
+        for segment, (audio, phonemes, elapsed) in zip(misses, results):
+            self._record_chunk(stats, segment, params.lang_code, phonemes, len(audio), elapsed)
+            yield [audio]
+
+    @staticmethod
+    def _record_chunk(stats, segment, lang_code, phonemes, samples, elapsed):
+        stats.chunk_times.append(elapsed)
+        record("model", elapsed, chars=len(segment), phonemes=phonemes)
+        count("chunks")
+        count("phonemes", phonemes)
+        audio_seconds = samples / SAMPLE_RATE
+        rtf = elapsed / audio_seconds if audio_seconds else 0.0
+        logger.debug(f"Chunk {len(stats.chunk_times)}: {len(segment)} chars, "
+                     f"{estimate_phonemes(segment, lang_code)} est. / {phonemes} phonemes, "
+                     f"{audio_seconds:.2f}s audio in {elapsed:.3f}s (RTF {rtf:.3f})")
+
+    def generate(self, text, params, on_status=None, stats=None, on_progress=None, cancel=None):
+        """Yields the raw (unprocessed) audio of the text, in order, as float32.
+
+        on_progress(segments_done, segments_total, audio_seconds) is called after
+        each segment; setting the threading.Event `cancel` stops the render with
+        RenderCancelled before the next segment.
+        """
+        segments = chunk_text(text, params.lang_code, self.chunk_budget)
+        for _, chunk in self._generate_segments(segments, params, on_status, stats, on_progress, cancel):
+            yield chunk
+
+    def _generate_segments(self, segments, params, on_status=None, stats=None, on_progress=None, cancel=None,
+                           use_cache=True):
+        """Yields (segment index, raw audio chunk) for the segments, in order.
+
+        Segments already in the segment cache come straight from disk; only
+        the misses go through the model (or the worker pool) and are stored.
+        use_cache=False renders every segment again (and stores the new take).
+        """
+        status = on_status or (lambda message: None)
+        progress = on_progress or (lambda done, total, audio_seconds: None)
+        stats = stats if stats is not None else RenderStats()
+
+        with self._lock:
+            keys = [None] * len(segments)
+            cached = [None] * len(segments)
+            if self.cache is not None:
+                from studio_cache import segment_key
+                voice_key = normalize_voice_spec(params.voice)
+                profile_tag = self.inference_profile.cache_tag()
+                keys = [segment_key(segment, params.lang_code, voice_key, params.speed, profile_tag)
+                        for segment in segments]
+                with span("cache_lookup"):
+                    cached = [self.cache.get(key) if use_cache else None for key in keys]
+                stats.cache_hits = sum(audio is not None for audio in cached)
+                stats.cache_misses = len(segments) - stats.cache_hits
+                count("cache_hits", stats.cache_hits)
+                count("cache_misses", stats.cache_misses)
+                logger.info(f"Segment cache: {stats.cache_hits} hits, {stats.cache_misses} misses")
+            misses = [segment for segment, audio in zip(segments, cached) if audio is None]
+            cache_note = f" (cache: {stats.cache_hits} hits, {stats.cache_misses} misses)" if self.cache is not None else ""
+
+            # One iterable of chunks per missing segment, consumed in document order
+            if not misses:
+                miss_chunks = iter(())
+            elif self.parallel is not None:
+                status(f"Sintetizando áudio ({self.parallel.workers} processos){cache_note}...")
+                logger.info(f"Synthesizing in parallel: lang={params.lang_code}, voice={params.voice}, "
+                            f"speed={params.speed}, workers={self.parallel.workers}")
+                miss_chunks = self._parallel_chunks(misses, params, stats)
+            else:
+                status("Carregando Pipeline Kokoro...")
+                pipeline = self.get_pipeline(params.lang_code)
+                with span("voice_load"):
+                    voice = self.voices.get(params.voice)
+                status(f"Sintetizando áudio{cache_note}...")
+                logger.info(f"Synthesizing: lang={params.lang_code}, voice={params.voice}, speed={params.speed}")
+                if self.model_batch > 1 and len(misses) > 1:
+                    miss_chunks = self._packed_chunks(pipeline, misses, voice, params, stats)
+                else:
+                    miss_chunks = (self._pipeline_chunks(pipeline, segment, voice, params, stats) for segment in misses)
+
+            samples = 0
+            for index, (key, audio) in enumerate(zip(keys, cached)):
+                if cancel is not None and cancel.is_set():
+                    raise RenderCancelled()
+                if audio is not None:
+                    if len(audio):
+                        samples += len(audio)
+                        yield index, audio
+                else:
+                    chunks = []
+                    for chunk in next(miss_chunks):
+                        if len(chunk):
+                            # O consumidor pode aplicar os efeitos no próprio bloco (DspChain): o cache guarda uma cópia crua
+                            if self.cache is not None:
+                                chunks.append(chunk.copy())
+                            samples += len(chunk)
+                            yield index, chunk
+                    if self.cache is not None:
+                        with span("cache_store"):
+                            self.cache.put(key, np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32))
+                progress(index + 1, len(segments), samples / SAMPLE_RATE)
+
+            if stats.chunk_times:
+                logger.info(f"Synthesized {len(stats.chunk_times)}/{len(segments)} chunks: "
+                            f"mean {np.mean(stats.chunk_times):.3f}s, max {max(stats.chunk_times):.3f}s per chunk")
+
+    def synthesize(self, text, params, on_status=None, stats=None, on_progress=None, cancel=None):
+        """Runs the model and the effects chain; returns a float mono buffer at SAMPLE_RATE."""
+        status = on_status or (lambda message: None)
+        audio_segments = list(self.generate(text, params, on_status=status, stats=stats,
+                                            on_progress=on_progress, cancel=cancel))
+        if stats is not None:
+            stats.segments = len(audio_segments)
+
+        if not audio_segments:
+            raise RuntimeError("Nenhum áudio foi gerado pelo modelo.")
+
+        # Concatenate
+        full_audio = np.concatenate(audio_segments)
+
+        status("Aplicando efeitos...")
+        with span("dsp"):
+            return apply_effects(full_audio, params)
+
+    def synthesize_batch(self, texts, params, on_status=None, stats=None):
+        """Synthesizes several texts that share params in a single engine pass.
+
+        Their segments go through one lock acquisition and pipeline lookup (and,
+        in parallel mode, fill the worker pool together); with model_batch > 1
+        short segments of different texts also share model calls. Returns one
+        processed buffer per text, or None for a text that produced no audio.
+        """
+        segments, owners = [], []
+        for owner, text in enumerate(texts):
+            for segment in chunk_text(text, params.lang_code, self.chunk_budget):
+                segments.append(segment)
+                owners.append(owner)
+        pieces = [[] for _ in texts]
+        for index, chunk in self._generate_segments(segments, params, on_status=on_status, stats=stats):
+            pieces[owners[index]].append(chunk)
+        with span("dsp"):
+            return [apply_effects(np.concatenate(chunks), params) if chunks else None for chunks in pieces]
+
+    def render(self, text, filepath, params, on_status=None, on_progress=None, cancel=None, targets=None):
+        """Synthesizes text and saves it to filepath; returns the path actually written.
+
+        Memory stays bounded by one segment however long the text is (see
+        studio_dsp.TwoPassChain). The first pass runs the streaming part of the
+        effects chain as segments arrive and spools the result to a temporary
+        raw float32 file next to the output, measuring peak and loudness on
+        the way. The second pass reads it back block by block, applies the
+        normalization gains and the rest of the chain, and encodes the file.
+
+        targets (studio_encode.ExportTargets, e.g. an EXPORT_PROFILES entry)
+        turns the second pass into a fan-out: every block goes to one encoder
+        per target, all running concurrently, and each file is named by
+        ExportTarget.path_for(filepath). The first target's path is returned;
+        stats.outputs lists them all.
+        """
+        from studio_dsp import TwoPassChain
+        status = on_status or (lambda message: None)
+        stats = RenderStats()
+        started = time.perf_counter()
+
+        if targets:
+            outputs = [(target, target.path_for(filepath)) for target in targets]
+        else:
+            outputs = [(ExportTarget("mp3" if filepath.lower().endswith(".mp3") else "wav"), filepath)]
+        # Fallback sem encoder MP3: grava WAV no lugar de cada MP3 e avisa no fim
+        fallback_to_wav = not HAS_MP3_ENCODER and any(target.format == "mp3" for target, _ in outputs)
+        if fallback_to_wav:
+            wav_outputs = {}
+            for target, path in outputs:
+                if target.format == "mp3":
+                    target, path = replace(target, format="wav", bitrate=None), path[:-4] + ".wav"
+                wav_outputs.setdefault(path, target)
+            outputs = [(target, path) for path, target in wav_outputs.items()]
+        filepath = outputs[0][1]
+        chain = TwoPassChain(build_dsp_chain(params), SAMPLE_RATE)
+        segments = chunk_text(text, params.lang_code, self.chunk_budget)
+        raw_lengths = [0] * len(segments)  # para o índice de tempos
+        samples = 0
+
+        with tempfile.TemporaryFile(prefix="kokoro_", suffix=".f32",
+                                    dir=os.path.dirname(os.path.abspath(filepath))) as spool:
+            for index, audio in self._generate_segments(segments, params, on_status=status, stats=stats,
+                                                        on_progress=on_progress, cancel=cancel):
+                raw_lengths[index] += len(audio)
+                stats.segments += 1
+                with span("dsp"):
+                    block = chain.process(audio)
+                spool.write(block.tobytes())
+            if stats.segments == 0:
+                raise RuntimeError("Nenhum áudio foi gerado pelo modelo.")
+            with span("dsp"):
+                spool.write(chain.flush().tobytes())
+
+            names = ", ".join(os.path.basename(path) for _, path in outputs)
+            status(f"Salvando {names}...")
+            spool.seek(0)
+            second_pass = chain.second_pass()
+            dsp_s = save_s = 0.0
+            writers, writer = [], None
+            try:
+                for target, path in outputs:
+                    writers.append(TargetWriter(target, path, SAMPLE_RATE))
+                # Um só ficheiro é codificado nesta thread; vários, em paralelo (um encoder por thread)
+                writer = writers[0] if len(writers) == 1 else ExportFanOut(writers)
+                while True:
+                    t0 = time.perf_counter()
+                    data = spool.read(SPOOL_BLOCK * 4)
+                    # O buffer lido é só de leitura: DspChain copia-o antes de processar
+                    block = second_pass.process(np.frombuffer(data, dtype=np.float32)) if data else second_pass.flush()
+                    t1 = time.perf_counter()
+                    if len(block):
+                        writer.write(block)
+                        samples += len(block)
+                    dsp_s += t1 - t0
+                    save_s += time.perf_counter() - t1
+                    if not data:
+                        break
+                t0 = time.perf_counter()
+                writer.close()
+                save_s += time.perf_counter() - t0
+            except BaseException:
+                if isinstance(writer, ExportFanOut):
+                    writer.abort()  # os writers fecham-se nas suas próprias threads
+                else:
+                    for partial in writers:
+                        try:
+                            partial.close()
+                        except Exception:
+                            pass
+                for _, path in outputs:
+                    if os.path.exists(path):
+                        os.remove(path)  # no half-written file is left behind
+                raise
+            record("dsp", dsp_s)
+            record("save", save_s, format="+".join(target.format for target, _ in outputs))
+            if len(writers) > 1:
+                for partial in writers:
+                    record("encode", partial.seconds, output=os.path.basename(partial.filepath))
+
+        index = TimingIndex.from_render(segments, raw_lengths, SAMPLE_RATE, samples, chain.head.dropped_start,
+                                        params=asdict(params), gain=float(chain.gain), audio=os.path.basename(filepath))
+        self._write_sidecars(filepath, index)
+        for target, path in outputs[1:]:
+            extra = index.resampled(target.samplerate or SAMPLE_RATE, audio=os.path.basename(path))
+            self._write_sidecars(path, extra, subtitles=False)
+        stats.outputs = [path for _, path in outputs]
+        if fallback_to_wav:
+            raise RuntimeError(MP3_FALLBACK_MESSAGE)
+        # Without streaming, nothing is audible before the file is complete
+        stats.total_time = stats.time_to_first_audio = time.perf_counter() - started
+        stats.audio_seconds = samples / SAMPLE_RATE
+        count("audio_seconds", stats.audio_seconds)
+        self.last_stats = stats
+        logger.info(f"Generated: {filepath}")
+        return filepath
+
+    def render_stream(self, text, filepath, params, on_chunk=None, on_status=None, on_progress=None, cancel=None):
+        """Streaming render: each chunk is processed and handed to on_chunk as soon
+        as the model yields it, while a ChunkWriter appends it to the file.
+
+        Returns the path actually written; timings (including time-to-first-audio)
+        are left in self.last_stats.
+        """
+        status = on_status or (lambda message: None)
+        stats = RenderStats()
+        started = time.perf_counter()
+
+        # Fallback sem encoder MP3: grava o WAV e avisa no fim
+        fallback_to_wav = filepath.lower().endswith(".mp3") and not HAS_MP3_ENCODER
+        if fallback_to_wav:
+            filepath = filepath[:-4] + ".wav"
+        chain = build_dsp_chain(params, streaming=True)
+        segments = chunk_text(text, params.lang_code, self.chunk_budget)
+        raw_lengths = [0] * len(segments)
+        samples = 0
+
+        def emit(chunk):
+            nonlocal samples
+            if not len(chunk):
+                return  # pitch/limiter/fade ainda estão a acumular look-ahead
+            if stats.segments == 0:
+                stats.time_to_first_audio = time.perf_counter() - started
+                logger.info(f"Time to first audio: {stats.time_to_first_audio:.3f}s")
+            stats.segments += 1
+            samples += len(chunk)
+            stats.audio_seconds += len(chunk) / SAMPLE_RATE
+            writer.write(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+
+        writer = ChunkWriter(filepath)
+        writer.start()
+        try:
+            try:
+                for index, audio in self._generate_segments(segments, params, on_status=status, stats=stats,
+                                                            on_progress=on_progress, cancel=cancel):
+                    raw_lengths[index] += len(audio)
+                    with span("dsp"):
+                        chunk = chain.process(audio)
+                    emit(chunk)
+                with span("dsp"):
+                    chunk = chain.flush()
+                emit(chunk)
+            finally:
+                # A escrita corre na thread do ChunkWriter; aqui só se mede a espera pelo fim dela
+                with span("save"):
+                    writer.close()
+        except BaseException:
+            # Cancelado ou falhou (modelo, encoder, disco cheio)
+            if os.path.exists(filepath):
+                os.remove(filepath)  # no half-written file is left behind
+            raise
+
+        if stats.segments == 0:
+            os.remove(filepath)
+            raise RuntimeError("Nenhum áudio foi gerado pelo modelo.")
+        # Em streaming a normalização foi trocada pelo limitador; o índice guarda o que foi de facto aplicado
+        applied = replace(params, normalize="", limiter=params.limiter or bool(params.normalize))
+        self._write_sidecars(filepath, TimingIndex.from_render(
+            segments, raw_lengths, SAMPLE_RATE, samples, chain.dropped_start,
+            params=asdict(applied), audio=os.path.basename(filepath)))
+        if fallback_to_wav:
+            raise RuntimeError(MP3_FALLBACK_MESSAGE)
+
+        stats.total_time = time.perf_counter() - started
+        self.last_stats = stats
+        count("audio_seconds", stats.audio_seconds)
+        logger.info(f"Generated (stream): {filepath} - TTFA {stats.time_to_first_audio:.3f}s, "
+                    f"RTF {stats.real_time_factor:.3f}")
+        return filepath
+
+    def _write_sidecars(self, filepath, index, subtitles=True):
+        # O índice e as legendas são extras: uma falha aqui não estraga o áudio já gravado
+        try:
+            if self.timing_index:
+                index.save(index_path(filepath))
+            if self.subtitles and subtitles:
+                write_subtitles(index, filepath, self.subtitles)
+        except OSError as e:
+            logger.warning(f"Could not write the timing index of {os.path.basename(filepath)}: {e}")
+
+    def splice_segment(self, filepath, number, text=None, params=None):
+        """Re-renders segment `number` of a rendered WAV and splices it into the file; returns the new TimingIndex.
+
+        text replaces the segment's text (by default the same text is rendered
+        again, bypassing the segment cache, e.g. to fix a bad take); params
+        default to those stored in the index, and the stored normalization
+        gain is reused so the new piece matches its neighbours. The samples
+        are overwritten in place when the length is unchanged; otherwise the
+        file is rewritten block by block. Fades and silence trimming are not
+        re-applied. Subtitles next to the file are updated too.
+        """
+        from studio_dsp import TwoPassChain
+
+        index = load_index(filepath)
+        if index is None:
+            raise FileNotFoundError(f"{os.path.basename(filepath)} não tem índice de tempos ({index_path(filepath)}).")
+        if not filepath.lower().endswith(".wav"):
+            raise ValueError("Só ficheiros WAV podem ser editados no lugar.")
+        if not 0 <= number < len(index.segments):
+            raise IndexError(f"Segmento {number} inexistente (o ficheiro tem {len(index.segments)}).")
+        params = params or params_from_dict(index.params)
+        old = index.segments[number]
+        text = old.text if text is None else text
+
+        # Mesma cadeia do render original, sem o que só faz sentido no início/fim do ficheiro
+        chain = TwoPassChain(build_dsp_chain(replace(params, trim_silence=False, fade_in_ms=0.0, fade_out_ms=0.0)),
+                             SAMPLE_RATE)
+        pieces = []
+        with trace("splice", segment=number, chars=len(text)):
+            for _, audio in self._generate_segments(chunk_text(text, params.lang_code, self.chunk_budget) or [text], params,
+                                                    use_cache=False):
+                pieces.append(chain.process(audio))
+            pieces.append(chain.flush())
+            second_pass = chain.second_pass(gain=index.gain)
+            audio = np.concatenate(pieces)
+            audio = np.concatenate([second_pass.process(audio), second_pass.flush()])
+
+            with span("save"):
+                if len(audio) == old.samples:
+                    with sf.SoundFile(filepath, "r+") as f:
+                        f.seek(old.start)
+                        f.write(audio)
+                else:
+                    _rewrite_span(filepath, old.start, old.end, audio)
+        index.replace_segment(number, text, len(audio))
+        index.save(index_path(filepath))
+        for fmt in SUBTITLE_FORMATS:
+            if os.path.exists(subtitle_path(filepath, fmt)):
+                write_subtitles(index, filepath, fmt)
+        logger.info(f"Segment {number} of {os.path.basename(filepath)} re-rendered "
+                    f"({old.samples / SAMPLE_RATE:.2f}s -> {len(audio) / SAMPLE_RATE:.2f}s)")
+        return index
+
+
+def _rewrite_span(filepath, start, end, audio):
+    """Replaces samples [start, end) of a sound file with audio, copying the rest block by block."""
+    tmp_path = filepath + ".splice.tmp"
+    with sf.SoundFile(filepath) as src:
+        with sf.SoundFile(tmp_path, "w", samplerate=src.samplerate, channels=src.channels,
+                          subtype=src.subtype, format=src.format) as dst:
+            for block in src.blocks(blocksize=SPOOL_BLOCK, frames=start, dtype="float32"):
+                dst.write(block)
+            dst.write(audio)
+            src.seek(end)
+            for block in src.blocks(blocksize=SPOOL_BLOCK, dtype="float32"):
+                dst.write(block)
+    os.replace(tmp_path, filepath)
+
+
+# --- Batch CLI ---
+
+def load_manifest(path):
+    """Reads jobs from a .jsonl (one object per line) or .csv (header row) manifest."""
+    jobs = []
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            jobs = [dict(row) for row in csv.DictReader(f)]
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    jobs.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{line_no}: JSON inválido ({e})")
+    return jobs
+
+
+def job_params(job, defaults):
+    """Builds SynthesisParams for a manifest row, falling back to the CLI defaults."""
+    lang_code = resolve_lang_code(job.get("lang") or defaults.lang_code)
+    voice = job.get("voice") or (defaults.voice if lang_code == defaults.lang_code else default_voice(lang_code))
+    overrides = {"lang_code": lang_code, "voice": normalize_voice_spec(voice)}
+    for key in ("speed", "gain_db", "pitch", "highpass_hz", "peak_db", "lufs", "fade_in_ms", "fade_out_ms"):
+        value = job.get(key)
+        if value not in (None, ""):
+            overrides[key] = float(value)
+    for key in ("limiter", "trim_silence"):
+        value = job.get(key)
+        if value not in (None, ""):
+            overrides[key] = value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "yes", "sim")
+    if job.get("normalize") is not None:
+        overrides["normalize"] = str(job["normalize"]).strip().lower()
+    return replace(defaults, **overrides)
+
+
+def job_output_path(job, index, out_dir, default_format):
+    """Output path of a manifest row: its 'output' column or job_0001<format>."""
+    name = sanitize_filename(str(job.get("output") or "").strip())
+    if not name:
+        name = f"job_{index:04d}{default_format}"
+    if os.path.splitext(name)[1].lower() not in SUPPORTED_FORMATS:
+        name += default_format
+    return os.path.join(out_dir, name)
+
+
+def run_batch(engine, jobs, defaults, out_dir, default_format=".wav", skip_existing=False, targets=None):
+    """Renders every job in order with one shared engine; returns (ok, failed) counts.
+
+    targets are the default ExportTargets of every job; a job's 'export'
+    column (a profile name or format list) overrides them.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    ok = failed = 0
+    for index, job in enumerate(jobs, 1):
+        text = str(job.get("text") or "").strip()
+        if not text:
+            logger.warning(f"Job {index}: texto vazio, ignorado.")
+            failed += 1
+            continue
+        try:
+            filepath = job_output_path(job, index, out_dir, default_format)
+            job_targets = parse_export_targets(str(job["export"])) if job.get("export") else targets
+            paths = [target.path_for(filepath) for target in job_targets] if job_targets else [filepath]
+            if skip_existing and all(os.path.exists(path) for path in paths):
+                logger.info(f"Job {index}: {filepath} já existe, ignorado.")
+                ok += 1
+                continue
+            params = job_params(job, defaults)
+            started = time.perf_counter()
+            with trace("job", profile=True, job_id=index, output=os.path.basename(filepath)):
+                engine.render(text, filepath, params, targets=job_targets)
+            logger.info(f"Job {index}/{len(jobs)} done in {time.perf_counter() - started:.2f}s")
+            ok += 1
+        except Exception as e:
+            logger.error(f"Job {index} failed: {e}", exc_info=True)
+            failed += 1
+    return ok, failed
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m studio_engine",
+        description="Kokoro Studio headless: renderiza um texto ou um manifest (CSV/JSONL) de jobs.",
+    )
+    parser.add_argument("manifest", nargs="?", help="Manifest .jsonl ou .csv (colunas: text, output, lang, voice, speed, gain_db, pitch, export)")
+    parser.add_argument("--text", help="Renderiza um único texto em vez de um manifest")
+    parser.add_argument("-o", "--output", help="Ficheiro de saída para --text")
+    parser.add_argument("--out-dir", default=".", help="Pasta de saída dos jobs do manifest")
+    parser.add_argument("--format", choices=SUPPORTED_FORMATS, default=".wav", help="Formato quando o job não indica extensão")
+    parser.add_argument("--export", help=f"Vários ficheiros do mesmo render: um perfil ({', '.join(EXPORT_PROFILES)}) "
+                                         "ou uma lista como wav,mp3:64k,flac@48000,opus")
+    parser.add_argument("--lang", default="a", help="Código Kokoro do idioma padrão (a, b, p, e, f, i, j, z, h)")
+    parser.add_argument("--voice", help="Voz padrão (ex: af_heart, ou uma mistura como af_bella:0.7,af_sarah:0.3); "
+                                        "por omissão a primeira do idioma")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--gain-db", type=float, default=0.0)
+    parser.add_argument("--pitch", type=float, default=1.0)
+    parser.add_argument("--highpass-hz", type=float, default=0.0, help="Filtro passa-altas (0 = desligado)")
+    parser.add_argument("--normalize", choices=("peak", "lufs"), help="Normaliza o ficheiro inteiro por pico ou loudness")
+    parser.add_argument("--peak-db", type=float, default=-1.0, help="Alvo de --normalize peak (dBFS)")
+    parser.add_argument("--lufs", type=float, default=-16.0, help="Alvo de --normalize lufs (LUFS integrados)")
+    parser.add_argument("--limiter", action="store_true", help="Limitador com look-ahead a -1 dBFS")
+    parser.add_argument("--trim-silence", action="store_true", help="Remove silêncio no início e no fim")
+    parser.add_argument("--fade-in-ms", type=float, default=0.0)
+    parser.add_argument("--fade-out-ms", type=float, default=0.0)
+    parser.add_argument("--skip-existing", action="store_true", help="Não re-renderiza saídas que já existem")
+    parser.add_argument("--prewarm", default="", help="Idiomas a carregar antes do primeiro job, separados por vírgula (ex: p,a,e)")
+    parser.add_argument("--max-pipelines", type=int, default=4, help="Máximo de idiomas mantidos carregados (LRU)")
+    parser.add_argument("--pipeline-budget-mb", type=float, help="Orçamento de memória para os frontends carregados")
+    parser.add_argument("--workers", type=int, default=1, help="Processos de síntese em paralelo (1 = sem paralelismo)")
+    parser.add_argument("--cache-dir", help="Ativa o cache de segmentos nesta pasta (só re-sintetiza linhas alteradas)")
+    parser.add_argument("--cache-max-mb", type=float, default=2048, help="Tamanho máximo do cache de segmentos")
+    parser.add_argument("--g2p-cache", help="Ficheiro SQLite do cache de fonemas (G2P) entre execuções")
+    parser.add_argument("--g2p-cache-max-mb", type=float, default=64, help="Tamanho máximo do cache de fonemas")
+    parser.add_argument("--threads-per-worker", type=int, help="Threads torch por processo (padrão: núcleos / workers)")
+    parser.add_argument("--chunk-budget", type=int, default=DEFAULT_CHUNK_BUDGET,
+                        help="Máximo estimado de fonemas por chamada ao modelo (0 = só quebras de linha)")
+    parser.add_argument("--model-batch", type=int, default=1,
+                        help="Segmentos curtos juntados numa só chamada ao modelo (1 = um por chamada)")
+    parser.add_argument("--voices-dir", help="Pasta local com os ficheiros <voz>.pt (evita o download do hub)")
+    parser.add_argument("--inference-profile", choices=list(INFERENCE_PROFILES), default="default",
+                        help="Como o modelo corre na CPU (ver benchmarks/bench_inference.py)")
+    parser.add_argument("--threads", type=int, help="Threads torch do processo (padrão: as do PyTorch)")
+    parser.add_argument("--subtitles", choices=SUBTITLE_FORMATS, help="Grava também legendas (.srt/.vtt) de cada saída")
+    parser.add_argument("--no-timing-index", action="store_true",
+                        help="Não grava o índice de tempos (<saída>.timing.json) ao lado de cada saída")
+    parser.add_argument("--splice", metavar="FICHEIRO", help="Re-renderiza um segmento de um WAV já gerado (usa o índice de tempos)")
+    parser.add_argument("--segment", type=int, help="Número do segmento para --splice (a partir de 0)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Mostra o tempo de cada chunk sintetizado")
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.splice:
+        if args.segment is None:
+            parser.error("--splice precisa de --segment")
+    elif not args.manifest and not args.text:
+        parser.error("indique um manifest ou --text")
+    try:
+        targets = parse_export_targets(args.export) if args.export else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - [%(levelname)s] - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    lang_code = resolve_lang_code(args.lang)
+    try:
+        voice = normalize_voice_spec(args.voice or default_voice(lang_code))
+    except ValueError as e:
+        parser.error(str(e))
+    defaults = SynthesisParams(
+        lang_code=lang_code,
+        voice=voice,
+        speed=args.speed,
+        gain_db=args.gain_db,
+        pitch=args.pitch,
+        highpass_hz=args.highpass_hz,
+        normalize=args.normalize or "",
+        peak_db=args.peak_db,
+        lufs=args.lufs,
+        limiter=args.limiter,
+        trim_silence=args.trim_silence,
+        fade_in_ms=args.fade_in_ms,
+        fade_out_ms=args.fade_out_ms,
+    )
+    engine = SynthesisEngine(max_pipelines=args.max_pipelines, memory_budget_mb=args.pipeline_budget_mb,
+                             workers=args.workers, threads_per_worker=args.threads_per_worker,
+                             cache_dir=args.cache_dir, cache_max_mb=args.cache_max_mb,
+                             chunk_budget=args.chunk_budget, voices_dir=args.voices_dir,
+                             inference_profile=resolve_inference_profile(args.inference_profile, args.threads),
+                             timing_index=not args.no_timing_index, subtitles=args.subtitles,
+                             g2p_cache=args.g2p_cache, g2p_cache_max_mb=args.g2p_cache_max_mb,
+                             model_batch=args.model_batch)
+    try:
+        if args.splice:
+            # --text substitui o texto do segmento; sem ele o segmento é apenas gerado de novo
+            with trace("job", profile=True, output=os.path.basename(args.splice)):
+                engine.splice_segment(args.splice, args.segment, text=args.text)
+            return 0
+
+        if args.prewarm and engine.parallel is None:
+            engine.prewarm([code.strip() for code in args.prewarm.split(",") if code.strip()], voices=[defaults.voice])
+
+        if args.text:
+            filepath = args.output or f"audio_kokoro{args.format}"
+            with trace("job", profile=True, output=os.path.basename(filepath)):
+                engine.render(args.text, filepath, defaults, targets=targets)
+            return 0
+
+        jobs = load_manifest(args.manifest)
+        ok, failed = run_batch(engine, jobs, defaults, args.out_dir, args.format, args.skip_existing, targets)
+        logger.info(f"Batch finished: {ok} ok, {failed} failed, {len(jobs)} total")
+        return 1 if failed else 0
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Incremental index of the audio files in the work folder.
+
+The file manager used to os.listdir the folder and rebuild every row after each
+generation, rename, delete or convert. DirectoryIndex keeps the entries in a
+dict instead: the app's own operations update it in O(1) (add/remove/rename),
+and external changes are picked up by poll(), which only re-runs os.scandir
+when the folder's mtime moved and then applies the diff. Sorted/filtered views
+are rebuilt lazily, once per change.
+"""
+import logging
+import os
+from dataclasses import dataclass
+
+from studio_encode import EXPORT_FORMATS
+from studio_meta import probe_audio
+from studio_trace import count, span
+
+logger = logging.getLogger("KokoroStudio")
+
+AUDIO_EXTENSIONS = tuple("." + fmt for fmt in EXPORT_FORMATS)  # everything a render can export
+
+SORT_KEYS = ("name", "size", "date", "duration")
+
+
+@dataclass
+class FileEntry:
+    name: str
+    size: int
+    mtime: float
+    duration: float = None  # probed lazily (headers only, see studio_meta)
+
+
+class DirectoryIndex:
+    """Audio files of one folder, kept in sync incrementally."""
+
+    def __init__(self, path, extensions=AUDIO_EXTENSIONS):
+        self.path = path
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.entries = {}  # name -> FileEntry
+        self.version = 0  # bumped on every change; invalidates the cached view
+        self._dir_mtime = None
+        self._view_key = None
+        self._view = []
+
+    def _accepts(self, name):
+        return name.lower().endswith(self.extensions)
+
+    def _stat(self, name):
+        st = os.stat(os.path.join(self.path, name))
+        return FileEntry(name, st.st_size, st.st_mtime)
+
+    def _changed(self):
+        self.version += 1
+
+    # --- Full scans ---
+
+    def scan(self):
+        """os.scandir pass diffed against the index; returns (added, removed, changed) name sets."""
+        dir_mtime = os.stat(self.path).st_mtime_ns  # read first: a change during the scan triggers another
+        seen = {}
+        with span("files.scan"), os.scandir(self.path) as it:
+            for entry in it:
+                if not self._accepts(entry.name):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                seen[entry.name] = (st.st_size, st.st_mtime)
+
+        added = seen.keys() - self.entries.keys()
+        removed = self.entries.keys() - seen.keys()
+        changed = {name for name in seen.keys() & self.entries.keys()
+                   if (self.entries[name].size, self.entries[name].mtime) != seen[name]}
+        for name in removed:
+            del self.entries[name]
+        for name in added | changed:
+            size, mtime = seen[name]
+            self.entries[name] = FileEntry(name, size, mtime)
+        self._dir_mtime = dir_mtime
+        if added or removed or changed:
+            self._changed()
+        count("files.scanned", len(seen))
+        count("files.changed", len(added) + len(removed) + len(changed))
+        return added, removed, changed
+
+    def poll(self):
+        """Rescans only if the folder's mtime moved since the last scan; None when nothing moved."""
+        try:
+            dir_mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        if dir_mtime == self._dir_mtime:
+            return None
+        return self.scan()
+
+    # --- O(1) updates for the app's own file operations ---
+
+    def add(self, name):
+        """Adds (or refreshes) one file after the app wrote it."""
+        if not self._accepts(name):
+            return
+        try:
+            self.entries[name] = self._stat(name)
+        except OSError:
+            self.entries.pop(name, None)
+        self._changed()
+
+    def remove(self, name):
+        if self.entries.pop(name, None) is not None:
+            self._changed()
+
+    def rename(self, old_name, new_name):
+        entry = self.entries.pop(old_name, None)
+        if entry is not None and self._accepts(new_name):
+            entry.name = new_name
+            self.entries[new_name] = entry
+        self._changed()
+
+    # --- Views ---
+
+    def duration(self, name):
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        if entry.duration is None:
+            info = probe_audio(os.path.join(self.path, name))
+            entry.duration = info.duration if info is not None else -1.0
+        return entry.duration if entry.duration >= 0 else None
+
+    def missing_durations(self):
+        return [name for name, entry in self.entries.items() if entry.duration is None]
+
+    def set_durations(self, durations):
+        """Stores durations probed elsewhere (e.g. on a worker thread); name -> seconds or None."""
+        for name, seconds in durations.items():
+            entry = self.entries.get(name)
+            if entry is not None:
+                entry.duration = seconds if seconds is not None else -1.0
+        self._changed()
+
+    def view(self, sort="name", reverse=False, filter_text=""):
+        """Names matching filter_text, sorted by name/size/date/duration (cached until the next change)."""
+        needle = filter_text.strip().lower()
+        key = (self.version, sort, reverse, needle)
+        if key == self._view_key:
+            return self._view
+        with span("files.view", sort=sort):
+            names = self._sorted_view(sort, reverse, needle)
+        self._view_key, self._view = key, names
+        return names
+
+    def _sorted_view(self, sort, reverse, needle):
+        names = [name for name in self.entries if needle in name.lower()]
+        if sort == "size":
+            sort_key = lambda name: self.entries[name].size
+        elif sort == "date":
+            sort_key = lambda name: self.entries[name].mtime
+        elif sort == "duration":
+            # Durações ainda não lidas contam como 0 (ver missing_durations)
+            sort_key = lambda name: self.entries[name].duration or 0.0
+        else:
+            sort_key = lambda name: name.lower()
+        names.sort(key=sort_key, reverse=reverse)
+        return names
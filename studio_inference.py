@@ -0,0 +1,239 @@
+"""
+CPU inference profiles: how the Kokoro model is prepared and run.
+
+A profile bundles the settings that trade load time and accuracy for speed
+on CPU:
+
+* threads: torch intra-op threads (None keeps PyTorch's default);
+* inference_mode: runs the model under torch.inference_mode() instead of
+  plain no_grad, which skips autograd's version counters and view tracking;
+* quantize: "int8" applies dynamic int8 quantization to the Linear layers
+  (weights stored as int8, activations quantized on the fly);
+* backend: "torch" (eager), "compile" (torch.compile of the model's forward,
+  compiled on the first call) or "onnx" (the model exported once to ONNX and
+  run by ONNX Runtime on CPU; the export is kept in ONNX_DIR).
+
+"default" in INFERENCE_PROFILES is exactly the old behaviour. Which preset
+is fastest at an acceptable quality depends on the machine, so
+benchmarks/bench_inference.py measures the real-time factor of each one and
+compares its audio with "default".
+
+forward_packed() runs several short segments in one model call. Kokoro
+aligns durations for a single sequence, so instead of padding a batch the
+segments are joined with a short pause into one input and the audio is cut
+back at the middle of each pause, using the duration the model predicted for
+every token (benchmarks/bench_batch.py measures the gain).
+"""
+import contextlib
+import logging
+import os
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+logger = logging.getLogger("KokoroStudio")
+
+BACKENDS = ("torch", "compile", "onnx")
+QUANTIZATIONS = ("int8",)
+ONNX_DIR = os.path.join(os.path.expanduser("~"), ".kokoro_studio", "onnx")
+ONNX_OPSET = 17
+MAX_TOKENS = 510  # contexto do modelo (512) menos os dois tokens de início/fim
+PACK_SEPARATOR = " "  # pausa entre segmentos juntados numa chamada
+
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    name: str = "default"
+    threads: int = None
+    inference_mode: bool = False
+    quantize: str = None  # None or "int8"
+    backend: str = "torch"
+
+    def __post_init__(self):
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Backend de inferência desconhecido: {self.backend!r} (use {', '.join(BACKENDS)})")
+        if self.quantize not in (None,) + QUANTIZATIONS:
+            raise ValueError(f"Quantização desconhecida: {self.quantize!r}")
+        if self.threads is not None and self.threads < 1:
+            raise ValueError(f"Número de threads inválido: {self.threads}")
+
+    def describe(self):
+        parts = [self.backend]
+        if self.quantize:
+            parts.append(self.quantize)
+        if self.inference_mode:
+            parts.append("inference_mode")
+        parts.append(f"{self.threads} threads" if self.threads else "default threads")
+        return f"{self.name} ({', '.join(parts)})"
+
+    def cache_tag(self):
+        """The settings that change the audio numerically (backend, quantization); "" for plain torch."""
+        if self.backend == "torch" and not self.quantize:
+            return ""
+        return "+".join(part for part in (self.backend, self.quantize) if part)
+
+    def context(self):
+        """Context manager to run the model in (torch.inference_mode() or nothing)."""
+        if not self.inference_mode:
+            return contextlib.nullcontext()
+        import torch
+        return torch.inference_mode()
+
+    def apply_threads(self):
+        if self.threads:
+            import torch
+            torch.set_num_threads(self.threads)
+
+    def prepare_model(self, model):
+        """Applies threads, quantization and backend to a loaded KModel (in place); returns it."""
+        self.apply_threads()
+        if self.quantize == "int8" and self.backend != "onnx":
+            import torch
+            # Só as camadas Linear: as LSTM/Conv do Kokoro ficam em float32
+            torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        if self.backend == "compile":
+            import torch
+            # Atributo da instância: KModel.forward chama self.forward_with_tokens
+            model.forward_with_tokens = torch.compile(model.forward_with_tokens, dynamic=True)
+        elif self.backend == "onnx":
+            model.forward_with_tokens = _onnx_forward(self._onnx_session(model))
+        logger.info(f"Inference profile: {self.describe()}")
+        return model
+
+    def _onnx_session(self, model):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("O backend 'onnx' precisa do onnxruntime: pip install onnxruntime")
+        path = export_onnx(model)
+        if self.quantize == "int8":
+            path = quantize_onnx(path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+INFERENCE_PROFILES = {
+    "default": InferenceProfile("default"),
+    "fast": InferenceProfile("fast", inference_mode=True),
+    "int8": InferenceProfile("int8", inference_mode=True, quantize="int8"),
+    "compiled": InferenceProfile("compiled", inference_mode=True, backend="compile"),
+    "onnx": InferenceProfile("onnx", backend="onnx"),
+    "onnx-int8": InferenceProfile("onnx-int8", backend="onnx", quantize="int8"),
+}
+
+
+def resolve_inference_profile(profile=None, threads=None):
+    """InferenceProfile for a preset name (or a profile), with threads overridden when given."""
+    if profile is None or profile == "":
+        profile = INFERENCE_PROFILES["default"]
+    elif not isinstance(profile, InferenceProfile):
+        if profile not in INFERENCE_PROFILES:
+            raise ValueError(f"Perfil de inferência desconhecido: {profile!r} "
+                             f"(use {', '.join(INFERENCE_PROFILES)})")
+        profile = INFERENCE_PROFILES[profile]
+    if threads:
+        profile = replace(profile, threads=int(threads))
+    return profile
+
+
+# --- Several segments per model call ---
+
+def token_ids(model, phonemes):
+    """Model input ids of a phoneme string (unknown symbols are dropped, as KModel.forward does)."""
+    vocab = model.vocab
+    return [vocab[p] for p in phonemes if p in vocab]
+
+
+def packed_length(id_lists):
+    """Tokens of the segments joined by forward_packed (without the start/end tokens)."""
+    return sum(len(ids) for ids in id_lists) + max(0, len(id_lists) - 1)
+
+
+def forward_packed(model, phonemes, id_lists, pack, speed=1, profile=None):
+    """Runs the segments through the model in one forward pass; returns one float32 buffer per segment.
+
+    phonemes are the segments' phoneme strings and id_lists their token_ids;
+    packed_length(id_lists) must not exceed MAX_TOKENS.
+    """
+    import torch
+
+    separator = model.vocab[PACK_SEPARATOR]
+    input_ids, ends = [0], []
+    for n, ids in enumerate(id_lists):
+        if n:
+            input_ids.append(separator)
+        input_ids.extend(ids)
+        ends.append(len(input_ids))  # o token a seguir ao segmento: a pausa (ou o token de fim)
+    input_ids.append(0)
+    # Como o KPipeline, o estilo da voz é escolhido pelo número de fonemas da entrada
+    ref_s = pack[len(PACK_SEPARATOR.join(phonemes)) - 1]
+    with (profile or INFERENCE_PROFILES["default"]).context():
+        audio, durations = model.forward_with_tokens(torch.tensor([input_ids], dtype=torch.long, device=model.device),
+                                                     ref_s.to(model.device), speed)
+    audio = np.asarray(audio.squeeze().cpu(), dtype=np.float32)
+    durations = np.asarray(durations.squeeze().cpu(), dtype=np.float64)
+    frames = np.concatenate([[0.0], np.cumsum(durations)])  # frames[t] = primeiro frame do token t
+    samples_per_frame = len(audio) / frames[-1]
+    cuts = [0] + [int(round((frames[end] + durations[end] / 2) * samples_per_frame)) for end in ends[:-1]] + [len(audio)]
+    return [audio[start:stop] for start, stop in zip(cuts, cuts[1:])]
+
+
+# --- ONNX Runtime backend ---
+
+def export_onnx(model, onnx_dir=ONNX_DIR):
+    """Exports model.forward_with_tokens to ONNX once; returns the file (reused on later calls)."""
+    import torch
+
+    path = os.path.join(onnx_dir, f"kokoro_opset{ONNX_OPSET}.onnx")
+    if os.path.exists(path):
+        return path
+    os.makedirs(onnx_dir, exist_ok=True)
+
+    class TokensModule(torch.nn.Module):
+        def __init__(self, kmodel):
+            super().__init__()
+            self.kmodel = kmodel
+
+        def forward(self, input_ids, ref_s, speed):
+            return self.kmodel.forward_with_tokens(input_ids, ref_s, speed)
+
+    logger.info(f"Exporting Kokoro model to ONNX ({path}); this runs only once")
+    input_ids = torch.zeros((1, 32), dtype=torch.long)
+    ref_s = torch.zeros((1, 256), dtype=torch.float32)
+    speed = torch.ones(1, dtype=torch.float32)
+    # Ficheiro temporário + replace: vários processos (modo paralelo) podem exportar ao mesmo tempo
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.onnx.export(TokensModule(model).eval(), (input_ids, ref_s, speed), tmp_path,
+                      input_names=["input_ids", "ref_s", "speed"], output_names=["waveform", "duration"],
+                      dynamic_axes={"input_ids": {1: "tokens"}, "waveform": {0: "samples"}, "duration": {0: "tokens"}},
+                      opset_version=ONNX_OPSET)
+    os.replace(tmp_path, path)
+    return path
+
+
+def quantize_onnx(path):
+    """Dynamic int8 copy of an exported model, made once next to it."""
+    target = path.replace(".onnx", "_int8.onnx")
+    if not os.path.exists(target):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, target)
+    return target
+
+
+def _onnx_forward(session):
+    import torch
+
+    def forward_with_tokens(input_ids, ref_s, speed=1):
+        waveform, duration = session.run(None, {
+            "input_ids": input_ids.cpu().numpy().astype(np.int64),
+            "ref_s": ref_s.cpu().numpy().astype(np.float32),
+            "speed": np.array([speed], dtype=np.float32),
+        })
+        return torch.from_numpy(waveform), torch.from_numpy(duration)
+
+    return forward_with_tokens
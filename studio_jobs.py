@@ -0,0 +1,213 @@
+"""
+Generation job queue for Kokoro Studio.
+
+Renders are submitted as GenerationJobs to a JobScheduler, which runs them on
+worker threads in priority order (FIFO within the same priority). A job can be
+cancelled while queued or between two segments of its render. Every state
+change and every finished segment is reported through on_update(job, progress)
+from the worker thread; the GUI marshals it to Tk with after().
+"""
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field, replace
+
+from studio_engine import RenderCancelled, SynthesisParams
+from studio_trace import trace
+
+logger = logging.getLogger("KokoroStudio")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+PRIORITY_HIGH = -10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = 10
+
+
+@dataclass(frozen=True)
+class JobProgress:
+    """Snapshot of a running job (safe to hand to another thread)."""
+    segments_done: int = 0
+    segments_total: int = 0
+    audio_seconds: float = 0.0
+    elapsed: float = 0.0
+    message: str = ""
+
+    @property
+    def fraction(self):
+        return self.segments_done / self.segments_total if self.segments_total else 0.0
+
+    @property
+    def real_time_factor(self):
+        return self.elapsed / self.audio_seconds if self.audio_seconds else 0.0
+
+
+@dataclass
+class GenerationJob:
+    """One queued render. Lower priority values run first."""
+    text: str
+    filepath: str
+    params: SynthesisParams
+    stream: bool = False
+    priority: int = PRIORITY_NORMAL
+    on_start: object = None  # called on the worker thread right before rendering
+    on_chunk: object = None  # streaming only: receives each processed chunk
+    targets: tuple = None  # ExportTargets written from the single render (not streaming)
+    job_id: int = 0
+    status: str = QUEUED
+    result_path: str = None
+    error: str = None
+    stats: object = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def output_paths(self):
+        """Every file the job may write: filepath and, with export targets, one path per target."""
+        return {self.filepath} | {target.path_for(self.filepath) for target in self.targets or ()}
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+
+class JobScheduler:
+    """Priority queue of GenerationJobs served by `workers` threads sharing one engine."""
+
+    def __init__(self, engine, workers=1, on_update=None):
+        self.engine = engine
+        self.on_update = on_update or (lambda job, progress: None)
+        self._queue = queue.PriorityQueue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._jobs = {}  # job_id -> job, until it finishes
+        self._threads = [threading.Thread(target=self._worker, name=f"generation-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, job):
+        """Queues a job and returns it (with its job_id set)."""
+        with self._lock:
+            job.job_id = next(self._ids)
+            job.status = QUEUED
+            self._jobs[job.job_id] = job
+        self._queue.put((job.priority, job.job_id, job))
+        self._notify(job, JobProgress(message="Na fila..."))
+        return job
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job; returns False if it is unknown or already finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def jobs(self):
+        """Unfinished jobs, in submission order."""
+        with self._lock:
+            return [self._jobs[job_id] for job_id in sorted(self._jobs)]
+
+    def pending_count(self):
+        with self._lock:
+            return sum(job.status == QUEUED for job in self._jobs.values())
+
+    def reserved_paths(self):
+        """Output paths that unfinished jobs are going to write (every export target included)."""
+        with self._lock:
+            return set().union(*(job.output_paths for job in self._jobs.values()))
+
+    def shutdown(self):
+        self.cancel_all()
+        for _ in self._threads:
+            self._queue.put((float("inf"), next(self._ids), None))
+
+    def _notify(self, job, progress):
+        try:
+            self.on_update(job, progress)
+        except Exception as e:
+            logger.error(f"Job update callback failed: {e}", exc_info=True)
+
+    def _finish(self, job, status, progress):
+        job.status = status
+        with self._lock:
+            self._jobs.pop(job.job_id, None)
+        self._notify(job, progress)
+
+    def _worker(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            if job.cancelled:
+                self._finish(job, CANCELLED, JobProgress(message="Cancelado."))
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        job.status = RUNNING
+        started = time.perf_counter()
+        last = JobProgress(message="Iniciando...")
+        self._notify(job, last)
+
+        def on_status(message):
+            nonlocal last
+            last = JobProgress(last.segments_done, last.segments_total, last.audio_seconds,
+                               time.perf_counter() - started, message)
+            self._notify(job, last)
+
+        def on_progress(done, total, audio_seconds):
+            nonlocal last
+            last = JobProgress(done, total, audio_seconds, time.perf_counter() - started, last.message)
+            self._notify(job, last)
+
+        try:
+            # Um trace por job (spans do motor + contadores); ver studio_trace
+            with trace("job", profile=True, job_id=job.job_id, stream=job.stream, chars=len(job.text),
+                       output=os.path.basename(job.filepath)):
+                if job.on_start is not None:
+                    job.on_start(job)
+                if job.stream:
+                    job.result_path = self.engine.render_stream(job.text, job.filepath, job.params, on_chunk=job.on_chunk,
+                                                                on_status=on_status, on_progress=on_progress,
+                                                                cancel=job._cancel)
+                else:
+                    job.result_path = self.engine.render(job.text, job.filepath, job.params, on_status=on_status,
+                                                         on_progress=on_progress, cancel=job._cancel,
+                                                         targets=job.targets)
+            job.stats = self.engine.last_stats
+        except RenderCancelled:
+            logger.info(f"Job {job.job_id} cancelled after {last.segments_done}/{last.segments_total} segments")
+            self._finish(job, CANCELLED, replace(last, message="Cancelado."))
+            return
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {e}", exc_info=True)
+            job.error = str(e)
+            self._finish(job, FAILED, replace(last, message=str(e)))
+            return
+        elapsed = time.perf_counter() - started
+        self._finish(job, DONE, JobProgress(last.segments_total, last.segments_total, last.audio_seconds,
+                                            elapsed, "Concluído."))
+
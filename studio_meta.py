@@ -0,0 +1,198 @@
+"""
+Audio metadata probing without decoding.
+
+WAV/FLAC/OGG headers are read with soundfile.info; MP3 files are parsed
+directly: the first MPEG frame header gives sample rate, channels and bitrate,
+and a Xing/Info or VBRI tag (written by LAME and ffmpeg) gives the exact frame
+count. Constant bitrate files without a tag are estimated from the file size.
+Results are cached per (path, mtime, size), so listing a folder repeatedly
+only touches files that changed.
+"""
+import logging
+import os
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import soundfile as sf
+
+logger = logging.getLogger("KokoroStudio")
+
+CACHE_ENTRIES = 4096
+MP3_SCAN_BYTES = 64 * 1024  # how far past the ID3 tag we look for the first frame
+
+# kbps by [mpeg1?][layer]; index 0 = free format, 15 = invalid
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Hz by version bits (0 = MPEG 2.5, 2 = MPEG 2, 3 = MPEG 1)
+_SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+
+
+@dataclass(frozen=True)
+class AudioInfo:
+    duration: float
+    samplerate: int
+    channels: int
+    format: str
+    bitrate_kbps: int = 0  # MP3 only (first frame's bitrate for VBR files)
+
+
+@dataclass(frozen=True)
+class _Mp3Frame:
+    offset: int
+    mpeg1: bool
+    layer: int
+    bitrate_kbps: int
+    samplerate: int
+    channels: int
+    length: int
+    samples: int
+
+
+def _parse_frame_header(header, offset):
+    """Decodes a 4-byte MPEG audio frame header, or returns None if it is not one."""
+    b0, b1, b2, b3 = header
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 3
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index]
+    samplerate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    channels = 1 if (b3 >> 6) == 3 else 2
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate * 1000 // samplerate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        length = (samples // 8) * bitrate * 1000 // samplerate + padding
+    return _Mp3Frame(offset, mpeg1, layer, bitrate, samplerate, channels, length, samples)
+
+
+def _id3v2_size(head):
+    if len(head) < 10 or head[:3] != b"ID3":
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _find_first_frame(f, start):
+    f.seek(start)
+    data = f.read(MP3_SCAN_BYTES)
+    pos = data.find(b"\xff")
+    while 0 <= pos <= len(data) - 4:
+        frame = _parse_frame_header(data[pos:pos + 4], start + pos)
+        if frame is not None:
+            # A real frame is followed by another one (guards against stray 0xFF bytes in tags)
+            following = pos + frame.length
+            if following + 4 > len(data) or _parse_frame_header(data[following:following + 4], 0) is not None:
+                return frame, data[pos:]
+        pos = data.find(b"\xff", pos + 1)
+    return None, b""
+
+
+def _tagged_sample_count(frame, data):
+    """Decoded sample count from a Xing/Info or VBRI header in the first frame, if present.
+
+    The LAME extension of the Xing tag (also written by ffmpeg) stores the
+    encoder delay and padding, which are subtracted like a gapless decoder does.
+    """
+    if frame.mpeg1:
+        side_info = 17 if frame.channels == 1 else 32
+    else:
+        side_info = 9 if frame.channels == 1 else 17
+    xing = 4 + side_info
+    tag = data[xing:xing + 4]
+    if tag in (b"Xing", b"Info") and len(data) >= xing + 12:
+        flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+        if not flags & 1:
+            return None
+        samples = struct.unpack(">I", data[xing + 8:xing + 12])[0] * frame.samples
+        # Campos opcionais: frames, bytes, TOC (100 bytes), qualidade; depois vem a extensão LAME
+        lame = xing + 8 + 4 * bool(flags & 1) + 4 * bool(flags & 2) + 100 * bool(flags & 4) + 4 * bool(flags & 8)
+        if len(data) >= lame + 24 and data[lame:lame + 4].isalpha():
+            b0, b1, b2 = data[lame + 21:lame + 24]
+            delay, padding = (b0 << 4) | (b1 >> 4), ((b1 & 0x0F) << 8) | b2
+            if delay + padding < samples:
+                samples -= delay + padding
+        return samples
+    if data[36:40] == b"VBRI" and len(data) >= 36 + 18:
+        return struct.unpack(">I", data[36 + 14:36 + 18])[0] * frame.samples
+    return None
+
+
+def probe_mp3(path):
+    """Duration and format of an MP3 file from its headers (no decoding)."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        audio_start = _id3v2_size(f.read(10))
+        frame, data = _find_first_frame(f, audio_start)
+        if frame is None:
+            raise ValueError(f"Nenhum frame MPEG encontrado em {os.path.basename(path)}")
+        samples = _tagged_sample_count(frame, data)
+        if samples is not None:
+            duration = samples / frame.samplerate
+        else:
+            # CBR sem cabeçalho Xing: bytes de áudio / bitrate (descontando a tag ID3v1 no fim)
+            f.seek(max(0, size - 128))
+            id3v1 = 128 if f.read(3) == b"TAG" else 0
+            duration = (size - frame.offset - id3v1) * 8 / (frame.bitrate_kbps * 1000)
+    return AudioInfo(duration, frame.samplerate, frame.channels, "MP3", frame.bitrate_kbps)
+
+
+def _probe_uncached(path):
+    if path.lower().endswith(".mp3"):
+        try:
+            return probe_mp3(path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.debug(f"MP3 header probe failed for {path}: {e}")
+    info = sf.info(path)
+    return AudioInfo(info.duration, info.samplerate, info.channels, info.format)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def probe_audio(path):
+    """AudioInfo for path, cached per (path, mtime, size); None if it cannot be read."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    try:
+        info = _probe_uncached(path)
+    except Exception as e:
+        logger.warning(f"Could not read audio metadata of {os.path.basename(path)}: {e}")
+        info = None
+    with _cache_lock:
+        _cache[key] = info
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return info
+
+
+def format_duration(seconds):
+    """'m:ss' (or 'h:mm:ss' from one hour up)."""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
@@ -0,0 +1,130 @@
+"""
+Parallel segment synthesis for long documents.
+
+The engine cuts the text into independent segments (studio_text.chunk_text)
+and the segments are rendered by a pool of worker processes, each with its own CPU
+KPipeline. Results are yielded back in document order.
+
+Every worker limits torch (and, with the onnx backend, its ONNX Runtime
+session) to cpu_count // workers intra-op threads so the pool does not
+oversubscribe the cores. Each worker also holds its own copy
+of the model (~350 MB), so pick the worker count with RAM in mind. The
+engine's InferenceProfile is applied in every worker (its threads setting
+is replaced by the per-worker thread count). With a G2P cache, every worker
+opens the same SQLite file.
+"""
+import logging
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from itertools import islice
+
+import numpy as np
+
+logger = logging.getLogger("KokoroStudio")
+
+# PipelinePool, VoiceRegistry, InferenceProfile and PhonemeCache of the current worker process (set by _init_worker)
+_worker_pipelines = None
+_worker_voices = None
+_worker_profile = None
+_worker_g2p_cache = None
+
+
+def default_threads_per_worker(workers):
+    """Intra-op torch threads per worker so that workers * threads <= cores."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _init_worker(threads, voices_dir=None, profile=None, g2p_cache=None):
+    # Must run before torch is imported in this process
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Already set in this process
+
+    global _worker_pipelines, _worker_voices, _worker_profile, _worker_g2p_cache
+    from studio_engine import KOKORO_REPO_ID, PipelinePool
+    from studio_inference import resolve_inference_profile
+    from studio_voices import VoiceRegistry
+    _worker_profile = replace(resolve_inference_profile(profile), threads=threads)  # also caps ONNX Runtime
+    _worker_pipelines = PipelinePool(device="cpu", max_pipelines=2, profile=_worker_profile)
+    _worker_voices = VoiceRegistry(KOKORO_REPO_ID, voices_dir=voices_dir)
+    if g2p_cache:
+        from studio_cache import PhonemeCache
+        path, max_mb = g2p_cache
+        _worker_g2p_cache = PhonemeCache(path, max_mb=max_mb)
+
+
+def _synthesize_segment(segment, lang_code, voice, speed):
+    """Returns (audio, phoneme count, seconds spent in the model) for one segment."""
+    from studio_engine import pipeline_results
+    started = time.perf_counter()
+    pipeline = _worker_pipelines.get(lang_code)
+    chunks, phonemes = [], 0
+    with _worker_profile.context():
+        for ps, audio in pipeline_results(pipeline, segment, lang_code, _worker_voices.get(voice), speed,
+                                          _worker_g2p_cache):
+            phonemes += len(ps or "")
+            if audio is not None:
+                chunks.append(np.asarray(audio, dtype=np.float32))
+    audio = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+    return audio, phonemes, time.perf_counter() - started
+
+
+class ParallelSynthesizer:
+    """Renders the segments of a text on a process pool, yielding audio in order.
+
+    At most workers * 2 segments are in flight at once, which keeps every
+    core busy without holding the whole document's audio in memory.
+    """
+
+    def __init__(self, workers, threads_per_worker=None, voices_dir=None, profile=None, g2p_cache=None):
+        self.workers = max(1, int(workers))
+        self.threads_per_worker = threads_per_worker or default_threads_per_worker(self.workers)
+        self.voices_dir = voices_dir
+        self.profile = profile
+        self.g2p_cache = g2p_cache  # (path, max_mb) of the shared PhonemeCache, or None
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            logger.info(f"Starting {self.workers} synthesis workers ({self.threads_per_worker} torch threads each)")
+            # spawn: torch and fork do not mix, and it is the only method on Windows
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=mp.get_context("spawn"),
+                                                 initializer=_init_worker,
+                                                 initargs=(self.threads_per_worker, self.voices_dir, self.profile,
+                                                           self.g2p_cache))
+        return self._executor
+
+    def generate_segments(self, segments, params):
+        """Yields (audio, phonemes, model seconds) for each segment, in order."""
+        executor = self._get_executor()
+        segments = iter(segments)
+
+        def submit(segment):
+            return executor.submit(_synthesize_segment, segment, params.lang_code, params.voice, params.speed)
+
+        in_flight = deque(submit(segment) for segment in islice(segments, self.workers * 2))
+        try:
+            while in_flight:
+                result = in_flight.popleft().result()
+                segment = next(segments, None)
+                if segment is not None:
+                    in_flight.append(submit(segment))
+                yield result
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,490 @@
+"""
+Local HTTP synthesis service for Kokoro Studio (render servers, no Tk).
+
+    python -m studio_server --host 127.0.0.1 --port 8765 --prewarm a,p
+
+Endpoints:
+    GET  /health       JSON with queue depth, loaded languages and counters
+    POST /synthesize   JSON body: text, lang, voice, speed, gain_db, pitch (and the
+                       other manifest keys), format = "wav" (default), "mp3" or "pcm".
+                       wav/mp3 come back as a whole file; pcm is 16-bit mono at
+                       24 kHz, streamed with chunked transfer encoding as it renders.
+
+Requests wait in a bounded queue (503 + Retry-After when it is full) and fail
+with 504 once their timeout expires. Short non-streaming requests with the same
+language, voice and effects that arrive within batch_window_ms of each other
+are rendered together in one engine pass (SynthesisEngine.synthesize_batch).
+A single synthesis thread drives the engine, so pipelines stay warm between
+requests. Every response closes its connection (no keep-alive).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import astuple, dataclass, field
+
+from studio_encode import HAS_MP3_ENCODER, mp3_bytes, to_pcm16, wav_bytes
+from studio_engine import (SAMPLE_RATE, SynthesisEngine, SynthesisParams, build_dsp_chain, default_voice,
+                           job_params, resolve_lang_code)
+from studio_inference import INFERENCE_PROFILES, resolve_inference_profile
+from studio_text import DEFAULT_CHUNK_BUDGET
+from studio_trace import span, trace
+from studio_voices import normalize_voice_spec
+
+logger = logging.getLogger("KokoroStudio")
+
+MAX_BODY_BYTES = 1024 * 1024
+HEADER_TIMEOUT = 10.0  # seconds to receive the request line, headers and body
+
+CONTENT_TYPES = {
+    "wav": "audio/wav",
+    "mp3": "audio/mpeg",
+    "pcm": f"audio/L16; rate={SAMPLE_RATE}; channels=1",
+}
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    500: "Internal Server Error", 501: "Not Implemented", 503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+class HttpError(Exception):
+    """Turned into a JSON error response by the connection handler."""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+@dataclass
+class Job:
+    """One /synthesize request waiting for (or going through) the engine."""
+    text: str
+    params: SynthesisParams
+    fmt: str
+    future: asyncio.Future
+    deadline: float  # loop.time() after which the client gets a 504
+    chunks: asyncio.Queue = None  # pcm only: bytes, None at the end, or an exception
+    cancelled: threading.Event = field(default_factory=threading.Event)
+
+    @property
+    def streaming(self):
+        return self.fmt == "pcm"
+
+    @property
+    def batch_key(self):
+        return astuple(self.params)
+
+    def cancel(self):
+        self.cancelled.set()
+        self.future.cancel()
+
+
+class SynthesisServer:
+    """asyncio HTTP front end feeding a SynthesisEngine from a bounded queue."""
+
+    def __init__(self, engine, defaults=None, max_queue=32, timeout=120.0, batch_window_ms=15, max_batch=8,
+                 short_text_chars=300):
+        self.engine = engine
+        self.defaults = defaults or SynthesisParams()
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.short_text_chars = short_text_chars
+        self.served = self.batched = self.rejected = self.timed_out = 0
+        self._pending = deque()
+        self._wakeup = None
+        self._loop = None
+        self._server = None
+        self._dispatcher = None
+        # One thread: the engine serializes renders anyway, and its pipelines stay warm
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="synthesis")
+
+    # --- Lifecycle ---
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        self._server = await asyncio.start_server(self._handle_client, host, port)
+        return self._server
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1] if self._server else None
+
+    async def serve_forever(self, host="127.0.0.1", port=8765):
+        await self.start(host, port)
+        logger.info(f"Kokoro Studio server listening on http://{host}:{self.port}")
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        for job in self._pending:
+            job.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
+
+    # --- Queue and batching ---
+
+    def _submit(self, text, params, fmt, timeout):
+        if len(self._pending) >= self.max_queue:
+            self.rejected += 1
+            raise HttpError(503, "Fila cheia, tente novamente.", {"Retry-After": "1"})
+        job = Job(text=text, params=params, fmt=fmt, future=self._loop.create_future(),
+                  deadline=self._loop.time() + timeout,
+                  chunks=asyncio.Queue() if fmt == "pcm" else None)
+        self._pending.append(job)
+        self._wakeup.set()
+        return job
+
+    def _batchable(self, job):
+        return self.max_batch > 1 and not job.streaming and len(job.text) <= self.short_text_chars
+
+    def _take_batch(self, first):
+        """Removes up to max_batch - 1 queued jobs that can share first's engine pass."""
+        batch, rest = [], deque()
+        for job in self._pending:
+            if (len(batch) < self.max_batch - 1 and not job.future.done()
+                    and self._batchable(job) and job.batch_key == first.batch_key):
+                batch.append(job)
+            else:
+                rest.append(job)
+        self._pending = rest
+        return batch
+
+    async def _dispatch(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            job = self._pending.popleft()
+            if job.future.done():
+                continue  # timed out while queued
+            batch = [job]
+            if self._batchable(job):
+                # Give requests arriving right behind this one a chance to join it
+                if self.batch_window > 0:
+                    await asyncio.sleep(self.batch_window)
+                batch += self._take_batch(job)
+            try:
+                await self._loop.run_in_executor(self._executor, self._run, batch)
+            except Exception as e:
+                logger.error(f"Synthesis dispatch failed: {e}", exc_info=True)
+
+    # --- Synthesis thread ---
+
+    def _resolve(self, job, result=None, error=None):
+        def settle():
+            if job.future.done():
+                return
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+        self._loop.call_soon_threadsafe(settle)
+
+    def _run(self, batch):
+        jobs = [job for job in batch if not job.cancelled.is_set()]
+        if not jobs:
+            return
+        with trace("request", requests=len(jobs), streaming=jobs[0].streaming, lang=jobs[0].params.lang_code):
+            if jobs[0].streaming:
+                self._run_stream(jobs[0])
+            else:
+                self._run_batch(jobs)
+
+    def _run_batch(self, jobs):
+        started = time.perf_counter()
+        try:
+            if len(jobs) == 1:
+                audios = [self.engine.synthesize(jobs[0].text, jobs[0].params)]
+            else:
+                audios = self.engine.synthesize_batch([job.text for job in jobs], jobs[0].params)
+                self.batched += len(jobs)
+        except Exception as e:
+            logger.error(f"Synthesis failed: {e}", exc_info=True)
+            for job in jobs:
+                self._resolve(job, error=e)
+            return
+
+        for job, audio in zip(jobs, audios):
+            try:
+                if audio is None:
+                    raise RuntimeError("Nenhum áudio foi gerado pelo modelo.")
+                with span("encode", format=job.fmt):
+                    data = mp3_bytes(audio, SAMPLE_RATE) if job.fmt == "mp3" else wav_bytes(audio, SAMPLE_RATE)
+            except Exception as e:
+                self._resolve(job, error=e)
+                continue
+            self.served += 1
+            self._resolve(job, result=data)
+        logger.info(f"Served {len(jobs)} request(s) in {time.perf_counter() - started:.2f}s")
+
+    def _run_stream(self, job):
+        def put(item):
+            self._loop.call_soon_threadsafe(job.chunks.put_nowait, item)
+
+        chain = build_dsp_chain(job.params, streaming=True)
+        generator = self.engine.generate(job.text, job.params)
+        try:
+            for audio in generator:
+                if job.cancelled.is_set():
+                    break
+                chunk = chain.process(audio)
+                if len(chunk):
+                    put(to_pcm16(chunk))
+            else:
+                tail = chain.flush()
+                if len(tail):
+                    put(to_pcm16(tail))
+                self.served += 1
+            put(None)
+        except Exception as e:
+            logger.error(f"Streaming synthesis failed: {e}", exc_info=True)
+            put(e)
+        finally:
+            generator.close()  # releases the engine lock when the client went away
+            self._resolve(job, result=True)
+
+    # --- HTTP ---
+
+    async def _handle_client(self, reader, writer):
+        try:
+            method, path, body = await asyncio.wait_for(self._read_request(reader), HEADER_TIMEOUT)
+            await self._route(method, path, body, writer)
+        except HttpError as e:
+            await self._send_json(writer, e.status, {"error": e.message}, e.headers)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            logger.error(f"Request failed: {e}", exc_info=True)
+            try:
+                await self._send_json(writer, 500, {"error": str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        parts = (await reader.readline()).decode("latin-1").split()
+        if len(parts) != 3:
+            raise HttpError(400, "Pedido HTTP malformado.")
+        method, path = parts[0].upper(), parts[1].split("?", 1)[0]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(400, "Content-Length inválido.")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, f"Corpo maior que {MAX_BODY_BYTES} bytes.")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method, path, body
+
+    async def _route(self, method, path, body, writer):
+        if path == "/health":
+            if method != "GET":
+                raise HttpError(405, "Use GET.")
+            await self._send_json(writer, 200, self.health())
+        elif path == "/synthesize":
+            if method != "POST":
+                raise HttpError(405, "Use POST.")
+            await self._synthesize(body, writer)
+        else:
+            raise HttpError(404, f"Rota desconhecida: {path}")
+
+    def health(self):
+        return {
+            "status": "ok",
+            "queued": len(self._pending),
+            "max_queue": self.max_queue,
+            "loaded_languages": self.engine.pipelines.loaded_languages(),
+            "loaded_voices": self.engine.voices.loaded_voices(),
+            "inference_profile": self.engine.inference_profile.describe(),
+            "served": self.served,
+            "batched": self.batched,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+    async def _synthesize(self, body, writer):
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError as e:
+            raise HttpError(400, f"JSON inválido: {e}")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "O corpo deve ser um objeto JSON.")
+        text = str(payload.get("text") or "").strip()
+        if not text:
+            raise HttpError(400, "Campo 'text' vazio.")
+        fmt = str(payload.get("format") or "wav").strip().lower().lstrip(".")
+        if fmt not in CONTENT_TYPES:
+            raise HttpError(400, f"Formato desconhecido: {fmt!r} (use wav, mp3 ou pcm)")
+        if fmt == "mp3" and not HAS_MP3_ENCODER:
+            raise HttpError(501, "Encoder MP3 não encontrado (instale o ffmpeg).")
+        try:
+            params = job_params(payload, self.defaults)
+            timeout = min(float(payload.get("timeout") or self.timeout), self.timeout)
+        except (TypeError, ValueError) as e:
+            raise HttpError(400, str(e))
+
+        job = self._submit(text, params, fmt, timeout)
+        if job.streaming:
+            await self._stream_pcm(job, writer)
+            return
+        try:
+            data = await asyncio.wait_for(job.future, max(0.0, job.deadline - self._loop.time()))
+        except asyncio.TimeoutError:
+            job.cancel()
+            self.timed_out += 1
+            raise HttpError(504, f"Tempo limite de {timeout:g}s excedido.")
+        await self._send(writer, 200, data, CONTENT_TYPES[fmt])
+
+    async def _next_chunk(self, job):
+        try:
+            return await asyncio.wait_for(job.chunks.get(), max(0.0, job.deadline - self._loop.time()))
+        except asyncio.TimeoutError:
+            job.cancel()
+            self.timed_out += 1
+            raise
+
+    async def _stream_pcm(self, job, writer):
+        try:
+            # Errors up to the first chunk still get a proper status code
+            try:
+                item = await self._next_chunk(job)
+            except asyncio.TimeoutError:
+                raise HttpError(504, "Tempo limite excedido antes do primeiro áudio.")
+            if isinstance(item, Exception):
+                raise item
+            head = self._head(200, CONTENT_TYPES["pcm"], {"Transfer-Encoding": "chunked",
+                                                          "X-Sample-Rate": str(SAMPLE_RATE)})
+            writer.write(head)
+            # From here on a failure can only cut the stream short (no final zero-length chunk)
+            while item is not None:
+                if isinstance(item, Exception):
+                    return
+                writer.write(f"{len(item):X}\r\n".encode("ascii") + item + b"\r\n")
+                await writer.drain()
+                try:
+                    item = await self._next_chunk(job)
+                except asyncio.TimeoutError:
+                    return
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            job.cancel()  # stops the synthesis thread if the client left or the stream timed out
+
+    @staticmethod
+    def _head(status, content_type, headers=None):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", f"Content-Type: {content_type}",
+                 "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send(self, writer, status, body, content_type, headers=None):
+        writer.write(self._head(status, content_type, dict(headers or {}, **{"Content-Length": len(body)})) + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await self._send(writer, status, body, "application/json; charset=utf-8", headers)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m studio_server",
+        description="Kokoro Studio como serviço HTTP local (POST /synthesize, GET /health).",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Interface de escuta (padrão: só loopback)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--lang", default="a", help="Idioma padrão quando o pedido não indica 'lang'")
+    parser.add_argument("--voice", help="Voz padrão (ou mistura, ex: af_bella:0.7,af_sarah:0.3); por omissão a primeira do idioma")
+    parser.add_argument("--max-queue", type=int, default=32, help="Pedidos em espera antes de responder 503")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Tempo máximo por pedido, em segundos (504)")
+    parser.add_argument("--batch-window-ms", type=float, default=15, help="Espera para agrupar pedidos curtos")
+    parser.add_argument("--max-batch", type=int, default=8, help="Pedidos curtos por passagem do motor (1 = sem lotes)")
+    parser.add_argument("--prewarm", default="", help="Idiomas a carregar no arranque, separados por vírgula")
+    parser.add_argument("--max-pipelines", type=int, default=4, help="Máximo de idiomas mantidos carregados (LRU)")
+    parser.add_argument("--pipeline-budget-mb", type=float, help="Orçamento de memória para os frontends carregados")
+    parser.add_argument("--workers", type=int, default=1, help="Processos de síntese em paralelo (1 = sem paralelismo)")
+    parser.add_argument("--threads-per-worker", type=int, help="Threads torch por processo (padrão: núcleos / workers)")
+    parser.add_argument("--cache-dir", help="Ativa o cache de segmentos nesta pasta")
+    parser.add_argument("--cache-max-mb", type=float, default=2048, help="Tamanho máximo do cache de segmentos")
+    parser.add_argument("--g2p-cache", help="Ficheiro SQLite do cache de fonemas (G2P) entre execuções")
+    parser.add_argument("--g2p-cache-max-mb", type=float, default=64, help="Tamanho máximo do cache de fonemas")
+    parser.add_argument("--model-batch", type=int, default=1,
+                        help="Segmentos curtos juntados numa só chamada ao modelo (1 = um por chamada)")
+    parser.add_argument("--chunk-budget", type=int, default=DEFAULT_CHUNK_BUDGET,
+                        help="Máximo estimado de fonemas por chamada ao modelo (0 = só quebras de linha)")
+    parser.add_argument("--voices-dir", help="Pasta local com os ficheiros <voz>.pt (evita o download do hub)")
+    parser.add_argument("--inference-profile", choices=list(INFERENCE_PROFILES), default="default",
+                        help="Como o modelo corre na CPU (ver benchmarks/bench_inference.py)")
+    parser.add_argument("--threads", type=int, help="Threads torch do processo (padrão: as do PyTorch)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Mostra o tempo de cada chunk sintetizado")
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - [%(levelname)s] - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    lang_code = resolve_lang_code(args.lang)
+    try:
+        voice = normalize_voice_spec(args.voice or default_voice(lang_code))
+    except ValueError as e:
+        parser.error(str(e))
+    defaults = SynthesisParams(lang_code=lang_code, voice=voice)
+    engine = SynthesisEngine(max_pipelines=args.max_pipelines, memory_budget_mb=args.pipeline_budget_mb,
+                             workers=args.workers, threads_per_worker=args.threads_per_worker,
+                             cache_dir=args.cache_dir, cache_max_mb=args.cache_max_mb,
+                             g2p_cache=args.g2p_cache, g2p_cache_max_mb=args.g2p_cache_max_mb,
+                             model_batch=args.model_batch,
+                             chunk_budget=args.chunk_budget, voices_dir=args.voices_dir,
+                             inference_profile=resolve_inference_profile(args.inference_profile, args.threads))
+    try:
+        if args.prewarm and engine.parallel is None:
+            engine.prewarm([code.strip() for code in args.prewarm.split(",") if code.strip()], voices=[defaults.voice])
+        server = SynthesisServer(engine, defaults, max_queue=args.max_queue, timeout=args.timeout,
+                                 batch_window_ms=args.batch_window_ms, max_batch=args.max_batch)
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Text chunking in front of the Kokoro pipeline.
+
+Paragraphs (newlines) are always hard boundaries. Inside a paragraph the text
+is cut at sentence ends, then at clause marks, then at word boundaries, and the
+pieces are packed greedily into chunks of at most `budget` estimated phonemes.
+That bounds the latency and memory of each model call no matter how the
+author formatted the text (Kokoro itself accepts at most 510 phonemes per call
+and truncates non-English input beyond that).
+"""
+import re
+
+# Kokoro's hard limit per model call
+MAX_PHONEMES = 510
+DEFAULT_CHUNK_BUDGET = 250
+
+PARAGRAPH_PATTERN = r'\n+'
+
+# Sentence ends: Latin punctuation needs following whitespace, CJK full-width
+# punctuation does not (no spaces between sentences in Japanese/Chinese),
+# Hindi uses the danda / double danda (Latin marks there still need whitespace,
+# so decimals like 3.5 stay whole).
+# (a closing quote/bracket right after the mark stays with its sentence)
+_CLOSERS = '"\'”’»)\\]」』）'
+_LATIN_SENTENCE = rf'(?<=[.!?…][{_CLOSERS}])\s+|(?<=[.!?…])\s+'
+_SENTENCE_PATTERNS = {
+    "j": rf'(?<=[。！？!?…][{_CLOSERS}])\s*|(?<=[。！？!?…])(?![{_CLOSERS}])\s*',
+    "z": rf'(?<=[。！？!?…；][{_CLOSERS}])\s*|(?<=[。！？!?…；])(?![{_CLOSERS}])\s*',
+    "h": r'(?<=[।॥])\s*|(?<=[!?.])\s+',
+}
+_LATIN_CLAUSE = r'(?<=[,;:—–])\s+|\s+(?=[—–]\s)'
+_CLAUSE_PATTERNS = {
+    "j": r'(?<=[、，,：:])\s*',
+    "z": r'(?<=[，、：:,])\s*',
+    "h": r'(?<=[,;:])\s+',
+}
+
+_CJK_CHAR = re.compile(r'[぀-ヿ㐀-䶿一-鿿豈-﫿]')
+
+
+def estimate_phonemes(text, lang_code):
+    """Cheap phoneme count estimate (G2P is only run later, by the pipeline).
+
+    Alphabetic scripts are close to one phoneme per letter; a CJK character
+    expands to roughly three.
+    """
+    cjk = len(_CJK_CHAR.findall(text)) if lang_code in ("j", "z") else 0
+    letters = sum(1 for ch in text if not ch.isspace()) - cjk
+    return letters + 3 * cjk
+
+
+def _split_keep(text, pattern):
+    return [piece for piece in re.split(pattern, text) if piece and piece.strip()]
+
+
+def split_sentences(text, lang_code):
+    return _split_keep(text, _SENTENCE_PATTERNS.get(lang_code, _LATIN_SENTENCE))
+
+
+def split_clauses(sentence, lang_code):
+    return _split_keep(sentence, _CLAUSE_PATTERNS.get(lang_code, _LATIN_CLAUSE))
+
+
+def _split_words(piece, lang_code, budget):
+    """Last resort for a clause longer than the budget: words, or characters for CJK.
+
+    A single word longer than the budget (a URL, an unspaced run of text) is
+    cut every `budget` characters, so no piece ever exceeds it.
+    """
+    if lang_code in ("j", "z"):
+        step = max(1, budget // 3)
+        return [piece[i:i + step] for i in range(0, len(piece), step)]
+    return [word[i:i + budget] for word in piece.split() for i in range(0, len(word), budget)]
+
+
+def _joiner(lang_code):
+    return "" if lang_code in ("j", "z") else " "
+
+
+def _pack(pieces, lang_code, budget):
+    """Greedily joins consecutive pieces while the estimate stays within budget."""
+    chunks, current, size = [], [], 0
+    joiner = _joiner(lang_code)
+    for piece in pieces:
+        n = estimate_phonemes(piece, lang_code)
+        if current and size + n > budget:
+            chunks.append(joiner.join(current))
+            current, size = [], 0
+        current.append(piece.strip())
+        size += n
+    if current:
+        chunks.append(joiner.join(current))
+    return chunks
+
+
+def _fit(text, lang_code, budget, splitters):
+    """Splits text with the first splitter and recurses into pieces still over budget."""
+    if estimate_phonemes(text, lang_code) <= budget or not splitters:
+        return [text.strip()]
+    split, rest = splitters[0], splitters[1:]
+    pieces = []
+    for piece in split(text):
+        pieces.extend(_fit(piece, lang_code, budget, rest))
+    return _pack(pieces, lang_code, budget)
+
+
+def chunk_text(text, lang_code, budget=DEFAULT_CHUNK_BUDGET):
+    """Splits text into chunks of at most ~budget phonemes, in reading order.
+
+    budget <= 0 disables packing and keeps the old behaviour (one chunk per line).
+    """
+    paragraphs = [p for p in re.split(PARAGRAPH_PATTERN, text.strip()) if p.strip()]
+    if budget <= 0:
+        return paragraphs
+    budget = min(budget, MAX_PHONEMES)
+    splitters = [
+        lambda t: split_sentences(t, lang_code),
+        lambda t: split_clauses(t, lang_code),
+        lambda t: _split_words(t, lang_code, budget),
+    ]
+    chunks = []
+    for paragraph in paragraphs:
+        chunks.extend(c for c in _fit(paragraph, lang_code, budget, splitters) if c)
+    return chunks
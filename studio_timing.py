@@ -0,0 +1,222 @@
+"""
+Timing index of a rendered file: where each text segment starts and how long it lasts.
+
+Every render writes one next to the audio, as <file>.timing.json:
+
+    {"version": 1, "audio": "cap1.wav", "samplerate": 24000, "samples": 1234567,
+     "gain": 0.83, "params": {...SynthesisParams...},
+     "segments": [{"text": "Olá.", "start": 0, "samples": 52800}, ...]}
+
+Offsets are samples of the final file (after silence trimming), so the
+player jumps to a segment with one lookup and seeks by sample position
+instead of trusting the decoder's clock. The index also gives SRT/VTT
+subtitles (one cue per segment), named after the audio's stem (cap1.srt); a
+file exported in several formats (cap1.wav, cap1.mp3) shares them, so they
+stay while any of those files remains. With the stored params and normalization
+gain, SynthesisEngine.splice_segment can re-render one segment exactly like
+the rest of the file and splice it into the WAV.
+"""
+import bisect
+import json
+import logging
+import os
+import shutil
+from dataclasses import asdict, dataclass, field, replace
+
+from studio_encode import EXPORT_FORMATS
+
+logger = logging.getLogger("KokoroStudio")
+
+INDEX_SUFFIX = ".timing.json"
+INDEX_VERSION = 1
+SUBTITLE_FORMATS = ("srt", "vtt")
+
+
+@dataclass
+class TimedSegment:
+    text: str
+    start: int  # first sample in the file
+    samples: int
+
+    @property
+    def end(self):
+        return self.start + self.samples
+
+
+@dataclass
+class TimingIndex:
+    samplerate: int
+    samples: int = 0  # length of the whole file
+    segments: list = field(default_factory=list)
+    params: dict = field(default_factory=dict)  # SynthesisParams of the render, as a dict
+    gain: float = 1.0  # normalization gain of the render's second pass
+    audio: str = ""  # file name, for reference
+
+    @classmethod
+    def from_render(cls, texts, raw_lengths, samplerate, total, dropped_start=0, **kwargs):
+        """Index from the raw (model output) length of each segment, mapped onto the final file.
+
+        dropped_start is how much leading silence the effects chain trimmed;
+        segments are clamped to the final length (trailing trim).
+        """
+        segments, raw_start = [], 0
+        for text, length in zip(texts, raw_lengths):
+            start = min(max(raw_start - dropped_start, 0), total)
+            end = min(max(raw_start + length - dropped_start, 0), total)
+            segments.append(TimedSegment(text, int(start), int(end - start)))
+            raw_start += length
+        return cls(samplerate=samplerate, samples=int(total), segments=segments, **kwargs)
+
+    # --- Lookups ---
+
+    def start_seconds(self, number):
+        return self.segments[number].start / self.samplerate
+
+    def segment_at(self, seconds):
+        """Number of the segment playing at `seconds` (the last one that started before it)."""
+        starts = [segment.start for segment in self.segments]
+        return max(0, bisect.bisect_right(starts, int(seconds * self.samplerate)) - 1)
+
+    def resampled(self, samplerate, **kwargs):
+        """The index of the same render written at another sample rate."""
+        ratio = samplerate / self.samplerate
+        segments = []
+        for segment in self.segments:
+            start, end = round(segment.start * ratio), round(segment.end * ratio)
+            segments.append(TimedSegment(segment.text, start, end - start))
+        return replace(self, samplerate=samplerate, samples=round(self.samples * ratio), segments=segments, **kwargs)
+
+    # --- Editing ---
+
+    def replace_segment(self, number, text, samples):
+        """Records a re-rendered segment: new text and length, later segments shifted."""
+        segment = self.segments[number]
+        delta = samples - segment.samples
+        segment.text, segment.samples = text, samples
+        for later in self.segments[number + 1:]:
+            later.start += delta
+        self.samples += delta
+
+    # --- Persistence ---
+
+    def to_dict(self):
+        return {"version": INDEX_VERSION, **asdict(self)}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"Versão de índice não suportada: {data.get('version')}")
+        return cls(samplerate=int(data["samplerate"]), samples=int(data["samples"]),
+                   segments=[TimedSegment(s["text"], int(s["start"]), int(s["samples"])) for s in data["segments"]],
+                   params=dict(data.get("params") or {}), gain=float(data.get("gain", 1.0)),
+                   audio=data.get("audio", ""))
+
+    def save(self, path):
+        # Escrita atómica: o player pode estar a ler o índice antigo
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
+
+    # --- Subtitles ---
+
+    def to_subtitles(self, fmt):
+        if fmt not in SUBTITLE_FORMATS:
+            raise ValueError(f"Formato de legendas desconhecido: {fmt!r} (use {' ou '.join(SUBTITLE_FORMATS)})")
+        separator = "," if fmt == "srt" else "."
+        lines = ["WEBVTT", ""] if fmt == "vtt" else []
+        cue = 0
+        for segment in self.segments:
+            text = " ".join(segment.text.split())
+            if not text or not segment.samples:
+                continue
+            cue += 1
+            if fmt == "srt":
+                lines.append(str(cue))
+            lines.append(f"{_timestamp(segment.start / self.samplerate, separator)} --> "
+                         f"{_timestamp(segment.end / self.samplerate, separator)}")
+            lines += [text, ""]
+        return "\n".join(lines)
+
+
+def _timestamp(seconds, separator):
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def index_path(audio_path):
+    return audio_path + INDEX_SUFFIX
+
+
+def subtitle_path(audio_path, fmt):
+    return os.path.splitext(audio_path)[0] + "." + fmt
+
+
+def load_index(audio_path):
+    """The TimingIndex of a rendered file, or None if it has none (or it is unreadable)."""
+    path = index_path(audio_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return TimingIndex.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Ignoring timing index {path}: {e}")
+        return None
+
+
+def write_subtitles(index, audio_path, fmt):
+    path = subtitle_path(audio_path, fmt)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(index.to_subtitles(fmt))
+    return path
+
+
+def shares_subtitles(audio_path):
+    """True if another audio file with the same stem (cap1.mp3 next to cap1.wav) still uses its subtitles."""
+    stem, ext = os.path.splitext(audio_path)
+    return any(os.path.exists(f"{stem}.{fmt}") for fmt in EXPORT_FORMATS if fmt != ext[1:].lower())
+
+
+def sidecar_paths(audio_path, subtitles=True):
+    """Existing files that belong to audio_path: its timing index and (if subtitles) its subtitles."""
+    paths = [index_path(audio_path)]
+    if subtitles:
+        paths += [subtitle_path(audio_path, fmt) for fmt in SUBTITLE_FORMATS]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def move_sidecars(source, target):
+    """Renames the sidecar files of source to follow its new name (best effort).
+
+    Subtitles still used by a sibling format of source are copied instead of moved.
+    Call it after renaming the audio file itself.
+    """
+    shared = shares_subtitles(source)
+    for path in sidecar_paths(source):
+        if path.endswith(INDEX_SUFFIX):
+            new_path = index_path(target)
+        else:
+            new_path = subtitle_path(target, os.path.splitext(path)[1].lstrip("."))
+        if new_path == path:
+            continue
+        try:
+            if shared and not path.endswith(INDEX_SUFFIX):
+                shutil.copyfile(path, new_path)
+            else:
+                os.replace(path, new_path)
+        except OSError as e:
+            logger.warning(f"Could not move {os.path.basename(path)}: {e}")
+
+
+def remove_sidecars(audio_path):
+    """Removes the sidecar files of a deleted audio file; shared subtitles stay with its siblings."""
+    for path in sidecar_paths(audio_path, subtitles=not shares_subtitles(audio_path)):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove {os.path.basename(path)}: {e}")
@@ -0,0 +1,225 @@
+"""
+Lightweight tracing for Kokoro Studio: spans and counters grouped per job.
+
+A trace is opened around one unit of work (a render job, a file list rescan,
+a bulk operation) with trace(); inside it, code marks its stages with span()
+or record() and bumps counters with count(). Outside a trace these calls are
+no-ops, so the engine can stay instrumented in the CLI and the server at no
+cost. Traces are per thread.
+
+Finished traces are kept in memory for the GUI stats panel (recent_traces /
+add_listener) and, when KOKORO_TRACE names a file, appended to it as one JSON
+object per line. KOKORO_PROFILE=cprofile (or torch) additionally profiles the
+traces opened with profile=True and writes the result to KOKORO_PROFILE_DIR
+(default: the current folder).
+"""
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+logger = logging.getLogger("KokoroStudio")
+
+PROFILERS = ("cprofile", "torch")
+RECENT_TRACES = 50
+
+
+@dataclass
+class Span:
+    name: str
+    start: float  # seconds since the start of the trace
+    duration: float
+    depth: int
+    attrs: dict = field(default_factory=dict)
+
+
+@dataclass
+class Trace:
+    trace_id: int
+    name: str
+    attrs: dict
+    started: float  # time.time() when the trace was opened
+    duration: float = 0.0
+    spans: list = field(default_factory=list)
+    counters: dict = field(default_factory=lambda: defaultdict(float))
+    error: str = None
+
+    def stage_totals(self):
+        """Total seconds per span name, in order of first appearance."""
+        totals = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return totals
+
+    def to_dict(self):
+        return {
+            "id": self.trace_id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "started": self.started,
+            "duration_s": round(self.duration, 6),
+            "error": self.error,
+            "stages_s": {name: round(seconds, 6) for name, seconds in self.stage_totals().items()},
+            "counters": dict(self.counters),
+            "spans": [{"name": span.name, "start_s": round(span.start, 6), "duration_s": round(span.duration, 6),
+                       "depth": span.depth, **span.attrs} for span in self.spans],
+        }
+
+
+class Tracer:
+    """Collects traces of the current process; see the module docstring."""
+
+    def __init__(self, trace_path=None, profiler=None, profile_dir=None, keep=RECENT_TRACES):
+        if profiler and profiler not in PROFILERS:
+            logger.warning(f"Unknown profiler {profiler!r} (use {' or '.join(PROFILERS)}); profiling disabled")
+            profiler = None
+        self.trace_path = trace_path
+        self.profiler = profiler
+        self.profile_dir = profile_dir or os.getcwd()
+        self._recent = deque(maxlen=keep)
+        self._listeners = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls):
+        return cls(trace_path=os.environ.get("KOKORO_TRACE") or None,
+                   profiler=(os.environ.get("KOKORO_PROFILE") or "").strip().lower() or None,
+                   profile_dir=os.environ.get("KOKORO_PROFILE_DIR") or None)
+
+    def current(self):
+        return getattr(self._local, "trace", None)
+
+    # --- Instrumentation ---
+
+    @contextmanager
+    def trace(self, name, profile=False, **attrs):
+        """Opens a trace on this thread (or just a span, if one is already open); yields the Trace."""
+        if self.current() is not None:
+            with self.span(name, **attrs):
+                yield self.current()
+            return
+        current = Trace(next(self._ids), name, attrs, time.time())
+        self._local.trace, self._local.depth, self._local.t0 = current, 0, time.perf_counter()
+        profiler = self._start_profiler() if profile else None
+        try:
+            yield current
+        except BaseException as e:
+            current.error = type(e).__name__
+            raise
+        finally:
+            current.duration = time.perf_counter() - self._local.t0
+            self._local.trace = None
+            if profiler is not None:
+                self._stop_profiler(profiler, current)
+            # Traces sem spans nem contadores (ex: um poll da pasta sem mudanças) não interessam
+            if current.spans or current.counters:
+                self._finish(current)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Times the enclosed block as one stage of the current trace."""
+        current = self.current()
+        if current is None:
+            yield
+            return
+        depth = self._local.depth
+        self._local.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            current.spans.append(Span(name, started - self._local.t0, time.perf_counter() - started, depth, attrs))
+
+    def record(self, name, seconds, **attrs):
+        """Adds a stage that was timed elsewhere (e.g. model time spread over a generator's next() calls)."""
+        current = self.current()
+        if current is not None:
+            now = time.perf_counter() - self._local.t0
+            current.spans.append(Span(name, now - seconds, seconds, self._local.depth, attrs))
+
+    def count(self, name, value=1):
+        current = self.current()
+        if current is not None:
+            current.counters[name] += value
+
+    # --- Output ---
+
+    def add_listener(self, callback):
+        """callback(trace) runs on the thread that finished the trace."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def recent_traces(self, name=None):
+        with self._lock:
+            return [trace for trace in self._recent if name is None or trace.name == name]
+
+    def _finish(self, current):
+        with self._lock:
+            self._recent.append(current)
+            listeners = list(self._listeners)
+            if self.trace_path:
+                try:
+                    with open(self.trace_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(current.to_dict(), ensure_ascii=False, default=str) + "\n")
+                except OSError as e:
+                    logger.warning(f"Could not write trace to {self.trace_path}: {e}")
+        for callback in listeners:
+            try:
+                callback(current)
+            except Exception as e:
+                logger.error(f"Trace listener failed: {e}", exc_info=True)
+
+    # --- Profilers ---
+
+    def _start_profiler(self):
+        if self.profiler == "cprofile":
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                return None  # outro profiler já está ativo (só um por processo)
+            return profiler
+        if self.profiler == "torch":
+            try:
+                from torch.profiler import ProfilerActivity, profile
+            except ImportError:
+                logger.warning("KOKORO_PROFILE=torch needs torch; profiling disabled")
+                self.profiler = None
+                return None
+            profiler = profile(activities=[ProfilerActivity.CPU])
+            profiler.__enter__()
+            return profiler
+        return None
+
+    def _stop_profiler(self, profiler, current):
+        path = os.path.join(self.profile_dir, f"profile_{current.name}_{current.trace_id}_{int(current.started)}")
+        try:
+            if self.profiler == "cprofile":
+                profiler.disable()
+                path += ".prof"
+                profiler.dump_stats(path)
+            else:
+                profiler.__exit__(None, None, None)
+                path += ".json"
+                profiler.export_chrome_trace(path)
+            logger.info(f"Profile of {current.name} #{current.trace_id} written to {path}")
+        except Exception as e:
+            logger.warning(f"Could not write profile {path}: {e}")
+
+
+# Tracer of the process, configured from the environment
+tracer = Tracer.from_env()
+
+trace = tracer.trace
+span = tracer.span
+record = tracer.record
+count = tracer.count
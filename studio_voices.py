@@ -0,0 +1,195 @@
+"""
+Voice registry: Kokoro voice packs loaded once and kept in memory, plus weighted blends.
+
+Passing voice="af_bella" to KPipeline makes every pipeline (one per language)
+resolve and torch.load the pack on its own. VoiceRegistry loads each pack once
+per process, memory-mapped from a local folder when one is given
+(KOKORO_VOICES_DIR / --voices-dir) and from the Hugging Face cache otherwise,
+and the engine hands the tensor straight to the pipeline, so switching voices
+or languages costs no I/O after the first use.
+
+A voice spec is a voice id ("af_bella") or a weighted blend
+("af_bella:0.7,af_sarah:0.3"). Weights are normalized to sum 1 and default to
+1, so "af_bella,af_sarah" is the same even mix Kokoro makes. Each blend is
+computed once and cached.
+"""
+import logging
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from studio_trace import span
+
+logger = logging.getLogger("KokoroStudio")
+
+VOICE_ID_PATTERN = re.compile(r"^[a-z][fm]_[a-z0-9]+$")
+MAX_BLENDS = 64
+
+
+def _parse_weight(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_voice_spec(spec):
+    """((voice_id, weight), ...) sorted by id with weights summing to 1; raises ValueError on bad specs.
+
+    A part may also be a path to a .pt voice pack, like KPipeline accepts.
+    """
+    weights = {}
+    for part in str(spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        voice_id, weight = part, 1.0
+        # Só é peso se o que vem depois do último ':' for um número (caminhos Windows têm 'C:')
+        head, sep, tail = part.rpartition(":")
+        if sep and _parse_weight(tail) is not None:
+            voice_id, weight = head.strip(), _parse_weight(tail)
+        if not (VOICE_ID_PATTERN.match(voice_id) or voice_id.lower().endswith(".pt")):
+            raise ValueError(f"Voz inválida: {voice_id!r}")
+        if not math.isfinite(weight) or weight <= 0:
+            raise ValueError(f"Peso inválido para {voice_id}: {weight:g}")
+        weights[voice_id] = weights.get(voice_id, 0.0) + weight
+    if not weights:
+        raise ValueError("Nenhuma voz indicada.")
+    total = sum(weights.values())
+    return tuple((voice_id, weights[voice_id] / total) for voice_id in sorted(weights))
+
+
+def format_voice_spec(parts):
+    if len(parts) == 1:
+        return parts[0][0]
+    return ",".join(f"{voice_id}:{weight:.4g}" for voice_id, weight in parts)
+
+
+def normalize_voice_spec(spec):
+    """Canonical form of a voice spec (equivalent blends give the same string)."""
+    return format_voice_spec(parse_voice_spec(spec))
+
+
+def _load_pack(path):
+    import torch
+    try:
+        # mmap: the pages come from the OS file cache instead of a private copy (torch >= 2.1)
+        pack = torch.load(path, map_location="cpu", weights_only=True, mmap=True)
+    except (TypeError, RuntimeError):
+        pack = torch.load(path, map_location="cpu", weights_only=True)
+    return pack.float()
+
+
+class VoiceRegistry:
+    """Voice packs by id and blends by canonical spec, shared by every pipeline of the engine."""
+
+    def __init__(self, repo_id, voices_dir=None, max_blends=MAX_BLENDS):
+        self.repo_id = repo_id
+        self.voices_dir = voices_dir
+        self.max_blends = max(1, int(max_blends))
+        self._packs = {}  # voice_id -> tensor
+        self._blends = OrderedDict()  # canonical spec -> tensor, oldest first
+        self._lock = threading.Lock()
+
+    def voice_path(self, voice_id, download=True):
+        """Local file of a voice pack: voices_dir first, then the hub cache (downloading if allowed)."""
+        if voice_id.lower().endswith(".pt"):
+            return voice_id if os.path.exists(voice_id) else None
+        if self.voices_dir:
+            path = os.path.join(self.voices_dir, f"{voice_id}.pt")
+            if os.path.exists(path):
+                return path
+        filename = f"voices/{voice_id}.pt"
+        if not download:
+            from huggingface_hub import try_to_load_from_cache
+            cached = try_to_load_from_cache(self.repo_id, filename)
+            return cached if isinstance(cached, str) else None
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(repo_id=self.repo_id, filename=filename)
+
+    def load(self, voice_id):
+        """The pack of one voice, loaded on first use."""
+        with self._lock:
+            pack = self._packs.get(voice_id)
+        if pack is not None:
+            return pack
+        with span("voice_pack_load", voice=voice_id):
+            path = self.voice_path(voice_id)
+            if path is None:
+                raise FileNotFoundError(f"Voz não encontrada: {voice_id}")
+            pack = _load_pack(path)
+        with self._lock:
+            # Outra thread pode ter carregado a mesma voz entretanto; fica a primeira
+            pack = self._packs.setdefault(voice_id, pack)
+        logger.info(f"Voice {voice_id} loaded from {path}")
+        return pack
+
+    def get(self, spec):
+        """Tensor for a voice spec: a single pack, or the cached weighted sum of a blend."""
+        parts = parse_voice_spec(spec)
+        if len(parts) == 1:
+            return self.load(parts[0][0])
+        key = format_voice_spec(parts)
+        with self._lock:
+            blend = self._blends.get(key)
+            if blend is not None:
+                self._blends.move_to_end(key)
+                return blend
+        packs = [(self.load(voice_id), weight) for voice_id, weight in parts]
+        if len({tuple(pack.shape) for pack, _ in packs}) > 1:
+            raise ValueError(f"As vozes de {key} têm formatos diferentes e não podem ser misturadas.")
+        blend = sum(pack * weight for pack, weight in packs)
+        with self._lock:
+            self._blends[key] = blend
+            while len(self._blends) > self.max_blends:
+                self._blends.popitem(last=False)
+        logger.info(f"Voice blend {key} ready")
+        return blend
+
+    def preload(self, specs):
+        """Loads the given voices/blends ahead of time; returns how many are ready."""
+        ready = 0
+        for spec in specs:
+            try:
+                self.get(spec)
+                ready += 1
+            except Exception as e:
+                logger.warning(f"Could not preload voice {spec}: {e}")
+        return ready
+
+    def validate(self, voice_map, download=False):
+        """Checks every id of voice_map ({lang_code: {label: voice_id}}); returns {voice_id: problem}.
+
+        Valid ids already on disk are loaded as a side effect, so they are
+        resident afterwards. Ids that are not on disk yet only count as a
+        problem with download=True (when fetching them fails).
+        """
+        problems = {}
+        loaded = not_downloaded = 0
+        for voice_id in sorted({voice_id for voices in voice_map.values() for voice_id in voices.values()}):
+            if not VOICE_ID_PATTERN.match(voice_id):
+                problems[voice_id] = "id inválido"
+                continue
+            try:
+                if self.voice_path(voice_id, download=download) is None:
+                    not_downloaded += 1
+                    continue
+                self.load(voice_id)
+                loaded += 1
+            except Exception as e:
+                problems[voice_id] = str(e)
+        for voice_id, problem in problems.items():
+            logger.warning(f"Voice {voice_id} unusable: {problem}")
+        logger.info(f"Voices checked: {loaded} loaded, {not_downloaded} not downloaded yet, {len(problems)} unusable")
+        return problems
+
+    def loaded_voices(self):
+        with self._lock:
+            return sorted(self._packs) + list(self._blends)
+
+    def clear(self):
+        with self._lock:
+            self._packs.clear()
+            self._blends.clear()
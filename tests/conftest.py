@@ -0,0 +1,45 @@
+import os
+import sys
+
+# Os módulos studio_* vivem na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+from studio_engine import SynthesisEngine
+
+
+class StubPipeline:
+    """Stands in for KPipeline: a deterministic tone per segment, 240 samples per character."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text, voice=None, speed=1.0, split_pattern=None):
+        self.calls += 1
+        t = np.arange(240 * len(text), dtype=np.float32)
+        yield text, text, 0.2 * np.sin(0.05 * t)
+
+
+class StubPipelines:
+    def __init__(self):
+        self.pipeline = StubPipeline()
+
+    def get(self, lang_code):
+        return self.pipeline
+
+
+class StubVoices:
+    def get(self, spec):
+        return None
+
+
+@pytest.fixture
+def stub_engine(tmp_path):
+    """SynthesisEngine with a segment cache whose model and voices are stubs (no torch/kokoro needed)."""
+    engine = SynthesisEngine(cache_dir=str(tmp_path / "segment_cache"))
+    engine.pipelines = StubPipelines()
+    engine.voices = StubVoices()
+    yield engine
+    engine.close()
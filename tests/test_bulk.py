@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from studio_bulk import delete_one, plan_renames, rename_one
+from studio_timing import TimingIndex, index_path, subtitle_path, write_subtitles
+
+
+def render_pair(folder, stem="cap1"):
+    """A wav+mp3 export of one render: both files indexed, one shared pair of subtitles."""
+    paths = [os.path.join(folder, f"{stem}.wav"), os.path.join(folder, f"{stem}.mp3")]
+    sf.write(paths[0], np.zeros(2400, dtype=np.float32), 24000)
+    with open(paths[1], "wb") as f:
+        f.write(b"\xff\xfb" + bytes(100))
+    index = TimingIndex.from_render(["Olá."], [2400], 24000, 2400)
+    for path in paths:
+        index.save(index_path(path))
+    write_subtitles(index, paths[0], "srt")
+    write_subtitles(index, paths[0], "vtt")
+    return paths
+
+
+def test_delete_keeps_subtitles_of_sibling_format(tmp_path):
+    wav, mp3 = render_pair(str(tmp_path))
+
+    delete_one(wav)
+
+    assert not os.path.exists(index_path(wav))
+    assert os.path.exists(index_path(mp3))
+    assert os.path.exists(subtitle_path(mp3, "srt")) and os.path.exists(subtitle_path(mp3, "vtt"))
+
+    delete_one(mp3)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_rename_copies_subtitles_still_used_by_sibling(tmp_path):
+    wav, mp3 = render_pair(str(tmp_path))
+    renamed = os.path.join(str(tmp_path), "intro.wav")
+
+    rename_one((wav, renamed))
+
+    assert os.path.exists(index_path(renamed)) and not os.path.exists(index_path(wav))
+    assert os.path.exists(subtitle_path(mp3, "srt"))
+    assert os.path.exists(subtitle_path(renamed, "srt"))
+
+    moved = os.path.join(str(tmp_path), "outro.mp3")
+    rename_one((mp3, moved))
+
+    assert not os.path.exists(subtitle_path(mp3, "srt"))
+    assert os.path.exists(subtitle_path(moved, "srt")) and os.path.exists(index_path(moved))
+
+
+def touch(folder, *names):
+    paths = [os.path.join(folder, name) for name in names]
+    for path in paths:
+        open(path, "wb").close()
+    return paths
+
+
+def test_plan_renames_numbers_files(tmp_path):
+    paths = touch(str(tmp_path), "b.wav", "a.mp3")
+
+    plan = plan_renames(paths, "cap{n:02d}")
+
+    assert [(os.path.basename(s), os.path.basename(t)) for s, t in plan] == [("b.wav", "cap01.wav"), ("a.mp3", "cap02.mp3")]
+
+
+def test_plan_renames_skips_unchanged_names(tmp_path):
+    paths = touch(str(tmp_path), "1.wav", "x.wav")
+
+    plan = plan_renames(paths, "{n}")
+
+    assert [os.path.basename(t) for _, t in plan] == ["2.wav"]
+
+
+def test_plan_renames_rejects_swap(tmp_path):
+    paths = touch(str(tmp_path), "2.wav", "1.wav")  # 2 -> 1 e 1 -> 2
+
+    with pytest.raises(ValueError, match="nomes atuais da seleção"):
+        plan_renames(paths, "{n}")
+
+
+def test_plan_renames_rejects_chain(tmp_path):
+    paths = touch(str(tmp_path), "x.wav", "1.wav")  # x -> 1 e 1 -> 2
+
+    with pytest.raises(ValueError, match="nomes atuais da seleção"):
+        plan_renames(paths, "{n}")
+
+
+def test_plan_renames_rejects_existing_file_outside_selection(tmp_path):
+    paths = touch(str(tmp_path), "x.wav")
+    touch(str(tmp_path), "1.wav")
+
+    with pytest.raises(ValueError, match="já existe"):
+        plan_renames(paths, "{n}")
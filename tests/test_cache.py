@@ -0,0 +1,23 @@
+import numpy as np
+
+from studio_cache import SegmentCache, segment_key
+from studio_inference import INFERENCE_PROFILES
+
+
+def test_profile_tag_only_for_numerically_different_profiles():
+    tags = {name: profile.cache_tag() for name, profile in INFERENCE_PROFILES.items()}
+    assert tags == {"default": "", "fast": "", "int8": "torch+int8", "compiled": "compile",
+                    "onnx": "onnx", "onnx-int8": "onnx+int8"}
+
+
+def test_inference_profiles_do_not_share_cached_audio(tmp_path):
+    cache = SegmentCache(str(tmp_path), max_mb=1)
+    keys = {name: segment_key("Olá, mundo.", "p", "pf_dora", 1.0, profile.cache_tag())
+            for name, profile in INFERENCE_PROFILES.items()}
+    cache.put(keys["default"], np.ones(240, dtype=np.float32))
+
+    assert keys["default"] == segment_key("Olá,  mundo.", "p", "pf_dora", 1.0)  # chaves antigas continuam válidas
+    assert cache.get(keys["fast"]) is not None
+    for name in ("int8", "compiled", "onnx", "onnx-int8"):
+        assert cache.get(keys[name]) is None
+    assert len(set(keys.values())) == 5
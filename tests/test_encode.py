@@ -0,0 +1,27 @@
+import pytest
+
+from studio_encode import DEFAULT_MP3_BITRATE, ExportTarget, parse_export_targets
+
+
+def test_mp3_bitrate_is_normalized():
+    mp3, preview = parse_export_targets("mp3,mp3:64K")
+    assert mp3.bitrate == DEFAULT_MP3_BITRATE
+    assert preview.bitrate == "64k"
+    assert preview.suffix == "_64k"
+
+
+@pytest.mark.parametrize("spec", ["mp3:abc", "mp3:0k", "mp3:1000k", "mp3:-64k"])
+def test_invalid_mp3_bitrate_is_rejected(spec):
+    with pytest.raises(ValueError, match="mp3"):
+        parse_export_targets(spec)
+
+
+@pytest.mark.parametrize("spec", ["flac:192k", "wav:128k", "opus:64k", "ogg@48000:96k"])
+def test_bitrate_on_other_formats_is_rejected(spec):
+    with pytest.raises(ValueError, match="Bitrate só se aplica a MP3"):
+        parse_export_targets(spec)
+
+
+def test_lossless_targets_carry_no_bitrate():
+    assert ExportTarget("flac").bitrate is None
+    assert [target.describe() for target in parse_export_targets("archive")] == ["FLAC", "FLAC 48 kHz"]
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from studio_engine import SynthesisParams
+
+TEXT = "Primeira linha do teste.\nSegunda linha, um pouco mais longa."
+EFFECTS = SynthesisParams(lang_code="p", voice="pf_dora", gain_db=-6.0)
+
+
+def test_render_stream_from_cache_matches_first_render(stub_engine, tmp_path):
+    takes = []
+    for take in range(2):
+        chunks = []
+        stub_engine.render_stream(TEXT, str(tmp_path / f"take{take}.wav"), EFFECTS, on_chunk=chunks.append)
+        takes.append(np.concatenate(chunks))
+
+    assert stub_engine.last_stats.cache_hits == 2
+    assert stub_engine.pipelines.pipeline.calls == 2  # só a primeira renderização usou o modelo
+    np.testing.assert_allclose(takes[1], takes[0], atol=1e-6)
+    assert abs(np.abs(takes[0]).max() - 0.2 * 10 ** (-6 / 20)) < 0.01
+
+
+def test_render_from_cache_matches_first_render(stub_engine, tmp_path):
+    takes = []
+    for take in range(2):
+        path = stub_engine.render(TEXT, str(tmp_path / f"take{take}.wav"), EFFECTS)
+        takes.append(sf.read(path, dtype="float32")[0])
+
+    assert stub_engine.last_stats.cache_hits == 2
+    np.testing.assert_allclose(takes[1], takes[0], atol=1e-4)
+    assert abs(np.abs(takes[0]).max() - 0.2 * 10 ** (-6 / 20)) < 0.01
+
+
+def test_failed_render_stream_leaves_no_partial_file(stub_engine, tmp_path, monkeypatch):
+    pipeline = stub_engine.pipelines.pipeline
+    produce = pipeline.__class__.__call__
+
+    def fail_on_second_line(self, text, **kwargs):
+        if text.startswith("Segunda"):
+            raise RuntimeError("modelo falhou")
+        yield from produce(self, text, **kwargs)
+
+    monkeypatch.setattr(pipeline.__class__, "__call__", fail_on_second_line)
+    path = tmp_path / "partial.wav"
+
+    with pytest.raises(RuntimeError, match="modelo falhou"):
+        stub_engine.render_stream(TEXT, str(path), EFFECTS)
+
+    assert not path.exists()
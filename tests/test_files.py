@@ -0,0 +1,36 @@
+import numpy as np
+import soundfile as sf
+
+from studio_files import DirectoryIndex
+
+
+def write_tone(path, seconds=0.5, samplerate=24000, **kwargs):
+    t = np.arange(int(seconds * samplerate)) / samplerate
+    sf.write(path, 0.2 * np.sin(2 * np.pi * 440 * t), samplerate, **kwargs)
+
+
+def test_export_formats_are_indexed(tmp_path):
+    write_tone(tmp_path / "cap1.flac")
+    write_tone(tmp_path / "cap1.opus", format="OGG", subtype="OPUS")
+    (tmp_path / "cap1.wav.timing.json").write_text("{}")
+    index = DirectoryIndex(str(tmp_path))
+
+    index.add("cap1.flac")
+    index.add("cap1.opus")
+    index.add("cap1.wav.timing.json")
+
+    assert set(index.entries) == {"cap1.flac", "cap1.opus"}
+    assert abs(index.duration("cap1.flac") - 0.5) < 0.01
+    assert index.duration("cap1.opus") is not None
+
+
+def test_scan_finds_export_formats(tmp_path):
+    write_tone(tmp_path / "a.wav")
+    write_tone(tmp_path / "a_48k.flac", samplerate=48000)
+    write_tone(tmp_path / "a.ogg", format="OGG", subtype="VORBIS")
+    (tmp_path / "notes.txt").write_text("x")
+
+    added, removed, changed = DirectoryIndex(str(tmp_path)).scan()
+
+    assert added == {"a.wav", "a_48k.flac", "a.ogg"}
+    assert not removed and not changed
@@ -0,0 +1,43 @@
+import os
+import threading
+
+from studio_encode import EXPORT_PROFILES
+from studio_engine import SynthesisParams
+from studio_jobs import DONE, GenerationJob, JobScheduler
+
+
+class BlockingEngine:
+    """Stands in for SynthesisEngine: each render waits until the test releases it."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.last_stats = None
+
+    def render(self, text, filepath, params, targets=None, **kwargs):
+        self.release.wait(5)
+        return filepath
+
+
+def test_reserved_paths_cover_every_export_target(tmp_path):
+    engine = BlockingEngine()
+    scheduler = JobScheduler(engine)
+    try:
+        first = scheduler.submit(GenerationJob("a", str(tmp_path / "a.wav"), SynthesisParams()))
+        queued = scheduler.submit(GenerationJob("b", str(tmp_path / "b.wav"), SynthesisParams(),
+                                                targets=EXPORT_PROFILES["master+preview"]))
+
+        reserved = scheduler.reserved_paths()
+
+        names = {os.path.basename(path) for path in reserved}
+        assert names == {"a.wav", "b.wav", "b.mp3", "b_preview.mp3"}
+        engine.release.set()
+        for job in (first, queued):
+            for _ in range(100):
+                if job.finished:
+                    break
+                threading.Event().wait(0.05)
+            assert job.status == DONE
+        assert scheduler.reserved_paths() == set()
+    finally:
+        engine.release.set()
+        scheduler.shutdown()
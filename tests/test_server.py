@@ -0,0 +1,38 @@
+import asyncio
+import json
+import urllib.request
+
+import pytest
+
+from studio_server import SynthesisServer
+
+REQUEST = {"text": "Primeira linha do teste.\nSegunda linha, um pouco mais longa.",
+           "lang": "p", "voice": "pf_dora", "gain_db": -6}
+
+
+def post(port, payload):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}/synthesize", data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.status, response.read()
+
+
+async def twice(engine, payload):
+    """Starts the server on an ephemeral loopback port and sends the same request twice."""
+    server = SynthesisServer(engine)
+    await server.start("127.0.0.1", 0)
+    try:
+        loop = asyncio.get_running_loop()
+        return [await loop.run_in_executor(None, post, server.port, payload) for _ in range(2)]
+    finally:
+        await server.close()
+
+
+@pytest.mark.parametrize("fmt", ["pcm", "wav"])
+def test_repeated_request_returns_same_audio(stub_engine, fmt):
+    (status1, first), (status2, second) = asyncio.run(twice(stub_engine, {**REQUEST, "format": fmt}))
+
+    assert status1 == status2 == 200
+    assert len(first) > 1000
+    assert stub_engine.pipelines.pipeline.calls == 2  # o segundo pedido veio todo do cache
+    assert second == first
@@ -0,0 +1,44 @@
+import pytest
+
+from studio_text import MAX_PHONEMES, chunk_text, estimate_phonemes, split_sentences
+
+URL = "https://example.com/" + "a1b2c3d4e5" * 60
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text("Olá, mundo. Tudo bem?", "p") == ["Olá, mundo. Tudo bem?"]
+
+
+@pytest.mark.parametrize("budget", [50, 250, MAX_PHONEMES, 2000])
+def test_oversized_token_is_hard_split(budget):
+    text = f"Veja {URL} para mais detalhes."
+
+    chunks = chunk_text(text, "p", budget)
+
+    assert all(estimate_phonemes(chunk, "p") <= min(budget, MAX_PHONEMES) for chunk in chunks)
+    assert "".join(chunks).replace(" ", "") == text.replace(" ", "")
+
+
+def test_unspaced_run_without_clause_marks_is_hard_split():
+    run = "ภาษาไทยไม่มีการเว้นวรรคระหว่างคำ" * 30  # sem espaços nem pontuação
+
+    chunks = chunk_text(run, "a")
+
+    assert len(chunks) > 1
+    assert all(estimate_phonemes(chunk, "a") <= 250 for chunk in chunks)
+    assert "".join(chunks) == run
+
+
+def test_cjk_run_stays_within_budget():
+    run = "日本語の文章" * 100
+
+    chunks = chunk_text(run, "j", 120)
+
+    assert all(estimate_phonemes(chunk, "j") <= 120 for chunk in chunks)
+    assert "".join(chunks) == run
+
+
+def test_hindi_sentences_keep_decimals_whole():
+    text = "कीमत 3.5 रुपये है।यह सस्ता है. क्या आप 2.75 किलो लेंगे? हाँ!"
+
+    assert split_sentences(text, "h") == ["कीमत 3.5 रुपये है।", "यह सस्ता है.", "क्या आप 2.75 किलो लेंगे?", "हाँ!"]